@@ -0,0 +1,215 @@
+# assetstore.py — 画像の内容アドレス型ストア（同じ中身の画像をハードリンクで1つにまとめる）
+#
+#   python assetstore.py dedupe [--dry-run] [dir...]   # 重複をストアの blob へのハードリンクに置き換える
+#   python assetstore.py checkout                       # マニフェストにあって消えた画像を blob から戻す
+#   python assetstore.py report                         # 節約できている容量
+#   python assetstore.py gc                             # どこからも参照されない blob を消す
+#
+# 対象は build_slide/images、build_slide/project_assets/images と slideinfo.json の各授業の images/。
+# blob は .cache/assets/objects/<sha256 先頭2桁>/<sha256><拡張子>、マニフェストは
+# .cache/assets/manifest.json（論理名 = プロジェクト直下からの相対パス → sha256）。
+# ハードリンクなので画像をその場で上書き保存すると同じ中身の全ファイルが変わる点に注意
+# （たいていの画像エディタは別ファイルに書いて置き換えるので問題にならない）。
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import errno
+import json
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows では排他なし
+    fcntl = None
+
+import buildcache
+import slideinfo
+
+ROOT = Path(__file__).parent
+PROJECT = ROOT.parent
+STORE = ROOT / ".cache" / "assets"
+IMAGE_EXTS = frozenset({".png", ".jpg", ".jpeg", ".gif", ".pdf", ".eps", ".svg", ".webp"})
+
+def default_dirs() -> list[Path]:
+    dirs = [ROOT / "images", ROOT / "project_assets" / "images"]
+    for subj in slideinfo.slide_subjects():
+        for course in slideinfo.slide_courses(subj):
+            dirs.append(PROJECT / slideinfo.slidedir(subj, course) / "images")
+    return [d for d in dirs if d.is_dir()]
+
+def iter_images(dirs: list[Path]):
+    for d in dirs:
+        for p in sorted(d.rglob("*")):
+            if p.suffix.lower() in IMAGE_EXTS and p.is_file() and not p.is_symlink():
+                yield p
+
+def logical_name(p: Path) -> str:
+    try:
+        return p.resolve().relative_to(PROJECT.resolve()).as_posix()
+    except ValueError:
+        return p.resolve().as_posix()
+
+class AssetStore:
+    def __init__(self, store: Path = STORE):
+        self.store = store
+        self.objects = store / "objects"
+        self.manifest_path = store / "manifest.json"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        try:
+            self.manifest = json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            self.manifest = {"version": 1, "files": {}}
+        self.files: dict[str, dict] = self.manifest["files"]
+
+    def blob_path(self, sha: str, ext: str) -> Path:
+        return self.objects / sha[:2] / f"{sha}{ext.lower()}"
+
+    def digest(self, p: Path) -> str:
+        # サイズ・mtime・inode が前回と同じならハッシュし直さない
+        st = p.stat()
+        ent = self.files.get(logical_name(p))
+        if ent and (ent["size"], ent["mtime_ns"], ent["ino"]) == (st.st_size, st.st_mtime_ns, st.st_ino):
+            return ent["sha"]
+        return buildcache.sha256_file(p)
+
+    def record(self, p: Path, sha: str) -> None:
+        st = p.stat()
+        self.files[logical_name(p)] = {"sha": sha, "ext": p.suffix.lower(), "size": st.st_size,
+                                       "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+
+    def save(self) -> None:
+        tmp = self.manifest_path.with_suffix(f".tmp{os.getpid()}")
+        tmp.write_text(json.dumps(self.manifest, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
+
+    def lock(self):
+        f = open(self.store / "lock", "w")
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        return f
+
+    def _link_over(self, blob: Path, p: Path) -> None:
+        # p を blob へのハードリンクに置き換える（一時名にリンクしてから rename）
+        tmp = p.with_name(f".{p.name}.link{os.getpid()}")
+        tmp.unlink(missing_ok=True)
+        os.link(blob, tmp)
+        os.replace(tmp, p)
+
+    def dedupe(self, paths, dry_run: bool = False) -> dict:
+        stat = {"files": 0, "linked": 0, "saved": 0, "new_blobs": 0, "skipped": 0}
+        planned: set[str] = set()       # --dry-run で blob を作ったことにした sha
+        for p in paths:
+            stat["files"] += 1
+            sha = self.digest(p)
+            blob = self.blob_path(sha, p.suffix)
+            try:
+                if not blob.exists() and sha not in planned:
+                    # 最初に見つかったファイルをそのまま blob にする（コピーしない）
+                    if not dry_run:
+                        blob.parent.mkdir(exist_ok=True)
+                        os.link(p, blob)
+                    planned.add(sha)
+                    stat["new_blobs"] += 1
+                elif dry_run and not blob.exists() or not os.path.samefile(blob, p):
+                    stat["linked"] += 1
+                    stat["saved"] += p.stat().st_size
+                    if not dry_run:
+                        self._link_over(blob, p)
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                    raise
+                # 別ファイルシステムなどでハードリンクできない
+                print(f"⚠ リンクできません: {p} ({e.strerror})")
+                stat["skipped"] += 1
+            if not dry_run:
+                self.record(p, sha)
+        return stat
+
+    def checkout(self) -> int:
+        """マニフェストにあって実体の無いファイルを blob から戻す。"""
+        n = 0
+        for name, ent in self.files.items():
+            p = Path(name) if Path(name).is_absolute() else PROJECT / name
+            if p.exists():
+                continue
+            blob = self.blob_path(ent["sha"], ent["ext"])
+            if not blob.exists():
+                print(f"⚠ blob がありません: {name}")
+                continue
+            p.parent.mkdir(parents=True, exist_ok=True)
+            os.link(blob, p)
+            n += 1
+        return n
+
+    def report(self) -> dict:
+        logical = 0
+        inodes: dict[tuple[int, int], int] = {}
+        missing = 0
+        for name in self.files:
+            p = Path(name) if Path(name).is_absolute() else PROJECT / name
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                missing += 1
+                continue
+            logical += st.st_size
+            inodes[(st.st_dev, st.st_ino)] = st.st_size
+        physical = sum(inodes.values())
+        return {"files": len(self.files) - missing, "missing": missing, "blobs": len(inodes),
+                "logical": logical, "physical": physical, "saved": logical - physical}
+
+    def gc(self) -> tuple[int, int]:
+        """マニフェストから参照されず、ストア以外にリンクの無い blob を消す。"""
+        live = {ent["sha"] for ent in self.files.values()}
+        n = freed = 0
+        for blob in self.objects.glob("*/*"):
+            sha = blob.stem
+            st = blob.stat()
+            if sha not in live and st.st_nlink == 1:
+                blob.unlink()
+                n += 1
+                freed += st.st_size
+        return n, freed
+
+def _mb(n: int) -> str:
+    return f"{n / 1024 ** 2:.1f} MiB"
+
+def main():
+    ap = argparse.ArgumentParser(description="画像の内容アドレス型ストア")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("dedupe", help="重複画像をハードリンクにまとめる")
+    p.add_argument("dirs", nargs="*", help="対象ディレクトリ（省略時は既定の images 一式）")
+    p.add_argument("--dry-run", "-n", action="store_true", help="変更せずに節約量だけ表示")
+    sub.add_parser("checkout", help="消えた画像を blob から戻す")
+    sub.add_parser("report", help="節約できている容量を表示")
+    sub.add_parser("gc", help="参照されない blob を消す")
+    args = ap.parse_args()
+
+    st = AssetStore()
+    with st.lock():
+        if args.cmd == "dedupe":
+            dirs = [Path(d) for d in args.dirs] if args.dirs else default_dirs()
+            missing = [d for d in dirs if not d.is_dir()]
+            if missing:
+                print(f"❌ ディレクトリがありません: {', '.join(map(str, missing))}", file=sys.stderr)
+                sys.exit(1)
+            r = st.dedupe(iter_images(dirs), dry_run=args.dry_run)
+            if not args.dry_run:
+                st.save()
+            verb = "節約できる容量" if args.dry_run else "今回節約した容量"
+            print(f"{'🔎' if args.dry_run else '✅'} 画像 {r['files']} 件 / 新規 blob {r['new_blobs']} / "
+                  f"リンク化 {r['linked']} / スキップ {r['skipped']} / {verb}: {_mb(r['saved'])}")
+        elif args.cmd == "checkout":
+            print(f"✅ {st.checkout()} 件を戻しました")
+        elif args.cmd == "report":
+            r = st.report()
+            print(f"画像 {r['files']} 件（欠落 {r['missing']}） / 実体 {r['blobs']} 件")
+            print(f"論理サイズ {_mb(r['logical'])} / 実サイズ {_mb(r['physical'])} / "
+                  f"節約 {_mb(r['saved'])}")
+        elif args.cmd == "gc":
+            n, freed = st.gc()
+            print(f"✅ blob {n} 件を削除（{_mb(freed)}）")
+
+if __name__ == "__main__":
+    main()
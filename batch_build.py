@@ -0,0 +1,144 @@
+# batch_build.py — slideinfo.json の科目単位で全授業をプロセスプールで並列ビルド
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+import argparse
+import os
+import sys
+import time
+import traceback
+
+import profiler
+import scheduler
+import slideinfo
+import build_slides
+
+def enumerate_jobs(subjects: list[str], ho: bool, tech: bool) -> list[dict]:
+    root = Path(__file__).parent
+    jobs = []
+    for subj in subjects:
+        for course in slideinfo.slide_courses(subj):
+            app_dir = root.parent / slideinfo.slidedir(subj, course)
+            jobs.append({
+                "subject": subj, "course": course, "ho": ho, "tech": tech,
+                "variant": build_slides.variant_name(ho, tech),
+                "exists": (app_dir / "content.tex").exists(),
+            })
+    return jobs
+
+def run_job(job: dict, use_cache: bool, optimize: bool = False, profile: bool = False) -> dict:
+    """ワーカープロセスで1コースをビルドする。出力はジョブ専用のログへ。
+
+    profile が真なら profiler のスパンを結果の "trace" に入れて返す。
+    """
+    root = Path(__file__).parent
+    name = f"{job['subject']}-{job['course']}-{job['variant']}"
+    build_dir = build_slides.job_build_dir(root, name)
+    build_dir.mkdir(exist_ok=True)
+    log_path = build_dir / "build.log"
+    t0 = time.perf_counter()
+    ok, detail = False, ""
+    if profile:
+        profiler.reset()        # ワーカーは使い回されるので前のジョブの記録を捨てる
+        profiler.enable()
+    with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        try:
+            with profiler.span(name):
+                pdf = build_slides.build_course(
+                    job["subject"], job["course"], ho=job["ho"], tech=job["tech"],
+                    build_dir=build_dir, use_cache=use_cache, optimize=optimize)
+            ok, detail = True, str(pdf)
+        except SystemExit:
+            detail = "ビルド失敗"
+        except Exception as e:  # 想定外の例外もジョブ単位の失敗として扱う
+            traceback.print_exc()
+            detail = f"例外: {e!r}"
+    return {**job, "ok": ok, "detail": detail, "elapsed": time.perf_counter() - t0,
+            "log": str(log_path), "trace": profiler.events() if profile else []}
+
+def main():
+    ap = argparse.ArgumentParser(description="科目ごとの全授業スライドを並列ビルド")
+    ap.add_argument("subjects", nargs="*", help="科目コード（複数可）")
+    ap.add_argument("--all", action="store_true", help="slideinfo.json の全科目")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="並列数")
+    ap.add_argument("--ho", action="store_true", help="ハンドアウト（pause無効）")
+    ap.add_argument("--tech", action="store_true", help="教師モードON")
+    ap.add_argument("--no-cache", action="store_true", help="ビルドキャッシュを使わない")
+    ap.add_argument("--optimize", "-O", action="store_true",
+                    help="配置する PDF を各ワーカーで圧縮・線形化する（pdfopt）")
+    ap.add_argument("--profile", nargs="?", const="trace-batch.json", default=None, metavar="FILE",
+                    help="全ジョブの段階ごとの所要時間を Chrome トレース形式で書き出す")
+    ap.add_argument("--mem-budget", type=int, default=None, metavar="MB",
+                    help="同時に走らせるビルドの見積もりメモリの上限（既定: 空きメモリの 8 割）")
+    ap.add_argument("--index", action="store_true",
+                    help="ビルド後にサムネイルと科目ごとの index.html を更新する（thumbnails）")
+    ap.add_argument("--in-order", action="store_true",
+                    help="見積もりで並べ替えず slideinfo.json の順に開始する")
+    args = ap.parse_args()
+
+    subjects = slideinfo.slide_subjects() if args.all else args.subjects
+    if not subjects:
+        ap.error("科目コードか --all を指定してください")
+    unknown = [s for s in subjects if s not in slideinfo.slide_subjects()]
+    if unknown:
+        print(f"❌ slideinfo.json に存在しない科目: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+
+    jobs = enumerate_jobs(subjects, args.ho, args.tech)
+    skipped = [j for j in jobs if not j["exists"]]
+    jobs = [j for j in jobs if j["exists"]]
+    for j in skipped:
+        print(f"⏭ {j['subject']} {j['course']}: content.tex なし")
+    print(f"ビルド対象: {len(jobs)} 件 / 並列数: {args.jobs}")
+
+    # --- 見積もりと開始順 ---
+    scheduler.estimate(jobs, scheduler.load_history())
+    ordered = jobs if args.in_order else scheduler.order(jobs)
+    budget = args.mem_budget
+    if budget is None:
+        avail = scheduler.mem_available_mb()
+        budget = int(avail * 0.8) if avail else None
+    predicted = scheduler.simulate([j["cost"] for j in ordered], args.jobs)
+    print(f"予測: {predicted:.1f}s（{'slideinfo の順' if args.in_order else '長いものから'}"
+          + (f" / メモリ予算 {budget} MB" if budget else "") + "）")
+    for j in ordered[:5]:
+        print(f"   {j['subject']} {j['course']}: 見積もり {j['cost']:.1f}s（{j['source']}）")
+
+    t0 = time.perf_counter()
+    results = []
+    disp = scheduler.Dispatcher(ordered, args.jobs, budget)
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+        running = {}
+        while disp.pending or running:
+            for j in disp.take():
+                running[ex.submit(run_job, j, not args.no_cache, args.optimize,
+                                  args.profile is not None)] = j
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                disp.done(running.pop(fut))
+                r = fut.result()
+                results.append(r)
+                mark = "✅" if r["ok"] else "❌"
+                print(f"{mark} {r['subject']} {r['course']} [{r['variant']}] "
+                      f"{r['elapsed']:.1f}s {r['detail'] if r['ok'] else r['detail'] + ' → ' + r['log']}")
+
+    if args.profile is not None:
+        trace = [e for r in results for e in r["trace"]]
+        names = {pid: f"worker {k}" for k, pid in enumerate(sorted({e["pid"] for e in trace}), 1)}
+        profiler.export_chrome(Path(args.profile), trace, names)
+        print(profiler.summary(trace, level=1) + "（全ジョブの合計）")
+        print(f"📈 トレース: {args.profile}")
+
+    if args.index:
+        import thumbnails
+        thumbnails.refresh(subjects, args.jobs)
+
+    failed = [r for r in results if not r["ok"]]
+    actual = time.perf_counter() - t0
+    print(f"完了: 成功 {len(results) - len(failed)} / 失敗 {len(failed)} / "
+          f"スキップ {len(skipped)} （{actual:.1f}s / 予測 {predicted:.1f}s）")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+# bench_slides.py — ビルド処理のベンチマーク
+#
+#   python bench_slides.py fmt 2030302 07 -n 3   # 通常コンパイル vs フォーマット使用
+#   python bench_slides.py scan --frames 1000     # フレーム走査: 旧正規表現 vs framescan
+#   python bench_slides.py suite --json out.json  # 合成デッキ＋擬似 latexmk で各処理と全体を計測
+#   python bench_slides.py compare old.json new.json  # suite の結果をコミット間で比べる
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import datetime
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+import build_slides
+import fmtcache
+import framescan
+import slideinfo
+
+def timed(fn, *args, **kwargs) -> float:
+    t0 = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - t0
+
+def report(name: str, samples: list[float]) -> None:
+    if not samples:
+        print(f"{name:<16} (計測なし)")
+        return
+    print(f"{name:<16} n={len(samples)}  min={min(samples) * 1000:9.1f}ms  "
+          f"median={statistics.median(samples) * 1000:9.1f}ms  max={max(samples) * 1000:9.1f}ms")
+
+# ----------------- fmt: 通常 vs フォーマット -----------------
+def bench_fmt(subj: str, course: str, page: str, n: int) -> None:
+    c = build_slides.load_course(subj, course, page)
+    tex_text = build_slides.render_main_tex(c, ho=False, tech=False)
+    root = c["root"]
+
+    def fresh_dir(tag: str) -> Path:
+        # 毎回まっさらな作業ディレクトリで latexmk の再利用を避ける
+        d = build_slides.job_build_dir(root, f"bench-{tag}")
+        shutil.rmtree(d, ignore_errors=True)
+        d.mkdir()
+        (d / "main.tex").write_text(tex_text, encoding="utf-8")
+        return d
+
+    cold = []
+    for _ in range(n):
+        d = fresh_dir("cold")
+        cold.append(timed(build_slides.run_latexmk, d, d / "main.tex"))
+
+    d = fresh_dir("dump")
+    preamble, _ = fmtcache.split_preamble(tex_text)
+    stale = fmtcache.fmt_dir(root) / f"{fmtcache.format_key(preamble, root)}.fmt"
+    stale.unlink(missing_ok=True)
+    stale.with_suffix(".broken").unlink(missing_ok=True)
+    t0 = time.perf_counter()
+    fmt = fmtcache.ensure_format(root, d, tex_text)
+    dump = time.perf_counter() - t0
+
+    warm = []
+    if fmt:
+        for _ in range(n):
+            d = fresh_dir("fmt")
+            warm.append(timed(build_slides.run_latexmk, d, d / "main.tex", fmt=fmt))
+
+    print(f"--- {subj} {course} {page or '全体'} ---")
+    report("cold", cold)
+    report("fmt dump", [dump])
+    report("fmt", warm)
+    if cold and warm:
+        print(f"短縮率: {1 - statistics.median(warm) / statistics.median(cold):.0%}")
+
+# ----------------- scan: フレーム走査 -----------------
+# 置き換え前の build_slides.find_frame_positions（比較用）
+LEGACY_FRAME_RE = r'(\\begin{frame}(\[[^\]]*\])?[^}]*?}.*?\\end{frame})(\s*|\n|$)'
+
+def legacy_frame_positions(tex: str) -> list[tuple[int, int]]:
+    return [(m.start(1), m.end(1)) for m in re.finditer(LEGACY_FRAME_RE, tex, flags=re.DOTALL)]
+
+def synthetic_deck(frames: int, lines_per_frame: int = 12, code_every: int = 4,
+                   commented_every: int = 0, unclosed: int = 0, image_every: int = 0,
+                   images: int = 8) -> str:
+    r"""N フレームの content.tex 相当を生成する。
+
+    code_every 枚ごとに minted ブロック、commented_every 枚ごとにコメントアウトした
+    旧フレーム、末尾に \end{frame} の無い書きかけフレームを unclosed 枚入れる。
+    image_every 枚ごとに bench<k % images>.png を \includegraphics する。
+    """
+    out = ["% @@@--(SimpleDarkBlue)--@@@", ""]
+    for k in range(1, frames + 1):
+        fragile = k % code_every == 0
+        if commented_every and k % commented_every == 0:
+            out += [rf"% \begin{{frame}}{{旧版 {k}}}", "%   差し替え前", r"% \end{frame}"]
+        out.append(rf"\begin{{frame}}{'[fragile]' if fragile else ''}{{フレーム {k}}}")
+        out.append(rf"  \label{{f{k}}}")
+        out.append(r"  \begin{itemize}")
+        for j in range(lines_per_frame):
+            out.append(rf"    \item 項目 {k}-{j} \mypause % コメント {j}")
+        out.append(r"  \end{itemize}")
+        if image_every and k % image_every == 0:
+            out.append(rf"  \includegraphics[width=0.4\textwidth]{{bench{k % images}}}")
+        if fragile:
+            out += [r"\begin{minted}{c}", "int main(void) { return 0; } // %d", r"\end{minted}"]
+        out.append(r"\end{frame}")
+        out.append("")
+    for k in range(unclosed):
+        out += [rf"\begin{{frame}}{{書きかけ {k}}}", "  " + "本文 " * 200, ""]
+    out.append(r"\end{document}")
+    return "\n".join(out) + "\n"
+
+def one_line_deck(frames: int, escaped_pct: bool = False) -> str:
+    r"""N フレームを改行なしで1行に並べた content.tex 相当（行の長さに比例する処理を炙り出す）。
+
+    escaped_pct なら各フレームの本文に \% を入れる（コメントではないが行の走査が必要になる）。
+    """
+    pct = r" 50\%" if escaped_pct else ""
+    line = " ".join(rf"\begin{{frame}}{{フレーム {k}}} \label{{f{k}}} 本文 {k}{pct} \end{{frame}}"
+                    for k in range(1, frames + 1))
+    return line + "\n" + r"\end{document}" + "\n"
+
+def bench_scan(frames: int, n: int) -> None:
+    cases = {
+        "整形済み": synthetic_deck(frames),
+        "コメント・書きかけあり": synthetic_deck(frames, commented_every=10, unclosed=frames // 5),
+        "1行に連結": one_line_deck(frames),
+        "1行に連結・\\% あり": one_line_deck(frames, escaped_pct=True),
+    }
+    for name, tex in cases.items():
+        print(f"--- 合成デッキ[{name}]: {frames} フレーム / {len(tex) / 1024:.0f} KiB ---")
+        legacy = [timed(legacy_frame_positions, tex) for _ in range(n)]
+        scan = [timed(framescan.frame_positions, tex) for _ in range(n)]
+        table = [timed(framescan.scan_frames, tex) for _ in range(n)]
+        report("legacy regex", legacy)
+        report("framescan", scan)
+        report("framescan（見出し・ラベルまで）", table)
+        print(f"検出フレーム数: framescan={len(framescan.frame_positions(tex))} / "
+              f"legacy={len(legacy_frame_positions(tex))}")
+        print(f"速度比: {statistics.median(legacy) / statistics.median(scan):.1f}x")
+
+# ----------------- suite: 合成データでの一括計測 -----------------
+# 擬似 latexmk: パスごとに BENCH_LATEX_LATENCY 秒待ち、ログと PDF・.fls を書く
+STUB_LATEXMK = """#!/usr/bin/env python3
+import os, sys, time
+outdir, src = ".", None
+for a in sys.argv[1:]:
+    if a.startswith("-outdir="):
+        outdir = a.split("=", 1)[1]
+    elif not a.startswith("-"):
+        src = a
+lat = float(os.environ.get("BENCH_LATEX_LATENCY", "0.3"))
+stem = os.path.splitext(os.path.basename(src))[0]
+for n in (1, 2):
+    time.sleep(lat / 2)
+    print(f"Latexmk: Run number {n} of rule 'lualatex'", flush=True)
+    print("[1] [2] [3]", flush=True)
+with open(os.path.join(outdir, stem + ".pdf"), "wb") as f:
+    f.write(b"%PDF-1.4\\n% bench stub\\n" + open(src, "rb").read()[-512:] + b"\\n%%EOF\\n")
+with open(os.path.join(outdir, stem + ".fls"), "w") as f:
+    f.write(f"PWD {os.getcwd()}\\nINPUT {os.path.abspath(src)}\\n")
+"""
+def tiny_png() -> bytes:
+    """1x1 の PNG（画像参照のプリフライトを通すため）。"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b""))
+
+def stats(samples: list[float]) -> dict:
+    return {"n": len(samples), "min": min(samples), "median": statistics.median(samples),
+            "max": max(samples)}
+
+def make_sandbox(base: Path, subjects: int, courses: int, e2e_courses: int,
+                 frames: int, images: int) -> dict:
+    """base にプロジェクト一式（コード・テンプレート・合成 slideinfo.json・授業）を作る。"""
+    root = base / "build_slide"
+    root.mkdir(parents=True)
+    here = Path(__file__).parent
+    for pat in ("*.py", "*.sty"):
+        for f in here.glob(pat):
+            shutil.copy2(f, root / f.name)
+    shutil.copytree(here / "templates", root / "templates")
+
+    info = {}
+    for i in range(subjects):
+        subj = f"{9000000 + i}"
+        entry = {"dir": f"{subj}.ベンチ科目{i}"}
+        for c in range(1, courses + 1):
+            entry[f"{c:02d}"] = {"title": f"合成{c}", "count": 0,
+                                 "created_at": "2025-01-01 00:00:00", "update_at": "2025-01-01 00:00:00"}
+        info[subj] = entry
+    (root / "slideinfo.json").write_text(json.dumps(info, ensure_ascii=False, indent=4), encoding="utf-8")
+
+    subj = next(iter(info))
+    deck = synthetic_deck(frames, image_every=3, images=images)
+    png = tiny_png()
+    for c in range(1, e2e_courses + 1):
+        d = base / info[subj]["dir"] / f"{c:02d}"
+        (d / "images").mkdir(parents=True)
+        (d / "content.tex").write_text(deck, encoding="utf-8")
+        for k in range(images):
+            (d / "images" / f"bench{k}.png").write_bytes(png)
+
+    bindir = base / "bin"
+    bindir.mkdir()
+    (bindir / "latexmk").write_text(STUB_LATEXMK, encoding="utf-8")
+    (bindir / "latexmk").chmod(0o755)
+    return {"root": root, "bin": bindir, "subject": subj, "deck": deck,
+            "courses": [f"{c:02d}" for c in range(1, e2e_courses + 1)]}
+
+def bench_components(sb: dict, n: int) -> dict:
+    deck = sb["deck"]
+    total = len(build_slides.find_frame_positions(deck))
+    out = {}
+
+    def run(name, fn, *args, repeat=1):
+        samples = []
+        for _ in range(n):
+            t0 = time.perf_counter()
+            for _ in range(repeat):
+                fn(*args)
+            samples.append((time.perf_counter() - t0) / repeat)
+        out[name] = stats(samples)
+        report(name, samples)
+
+    run("parse_page_range", lambda: [build_slides.parse_page_range(s) for s in ("", "5", "3-7", "0")],
+        repeat=1000)
+    run("find_frame_positions", build_slides.find_frame_positions, deck)
+    run("extract_frames", build_slides.extract_frames, deck, total // 3, total // 2)
+
+    root = sb["root"]
+    course = {"root": root, "tagdir": "bench/01", "stitle": "01 合成", "suffix_tag": None,
+              "templ": (root / "templates" / "main_template_org1.txt").read_text(encoding="utf-8"),
+              "body": deck.rstrip()}
+    # 1回目は minted の色付けキャッシュを作るので別に測る
+    t0 = time.perf_counter()
+    build_slides.render_main_tex(course, ho=False, tech=False)
+    out["render_main_tex_cold"] = stats([time.perf_counter() - t0])
+    report("render (cold)", [out["render_main_tex_cold"]["min"]])
+    run("render_main_tex", build_slides.render_main_tex, course, False, False)
+
+    path = root / "slideinfo.json"
+    subj, c = sb["subject"], sb["courses"][0]
+    run("slideinfo_read", lambda: slideinfo.SlideInfo(path).data())
+    run("slideinfo_update", lambda: slideinfo.SlideInfo(path).update(subj, c))
+    return out
+
+def _run_cli(sb: dict, args: list[str], latency: float) -> float:
+    env = {**os.environ, "PATH": f"{sb['bin']}{os.pathsep}{os.environ.get('PATH', '')}",
+           "BENCH_LATEX_LATENCY": str(latency)}
+    t0 = time.perf_counter()
+    res = subprocess.run([sys.executable, *args], cwd=sb["root"], env=env,
+                         capture_output=True, text=True)
+    dt = time.perf_counter() - t0
+    if res.returncode != 0:
+        print(res.stdout[-2000:] + res.stderr[-2000:], file=sys.stderr)
+        print(f"❌ ベンチ対象のビルドが失敗しました: {' '.join(args)}", file=sys.stderr)
+        sys.exit(1)
+    return dt
+
+def bench_e2e(sb: dict, n: int, latency: float, jobs: int) -> dict:
+    subj, c = sb["subject"], sb["courses"][0]
+    bs = str(sb["root"] / "build_slides.py")
+    bb = str(sb["root"] / "batch_build.py")
+    base = [bs, subj, c, "--no-daemon", "--no-fmt"]
+    cases = {
+        "single": base + ["--no-cache"],
+        "single_cached": base,
+        "page": base + ["--no-cache", "--page", "3-5"],
+        "variants": base + ["--no-cache", "--variants", "pr,ho,tech"],
+        "batch_j1": [bb, subj, "--no-cache", "-j", "1"],
+        f"batch_j{jobs}": [bb, subj, "--no-cache", "-j", str(jobs)],
+    }
+    _run_cli(sb, base, latency)     # キャッシュ（single_cached 用）と色付けキャッシュを作っておく
+    out = {}
+    for name, args in cases.items():
+        samples = [_run_cli(sb, args, latency) for _ in range(n)]
+        out[name] = stats(samples)
+        report(name, samples)
+    # 擬似 latexmk の待ち時間を除いたビルダー自身のオーバーヘッド
+    out["single_overhead"] = {"median": out["single"]["median"] - latency}
+    print(f"単体ビルドのオーバーヘッド（latexmk の待ちを除く）: "
+          f"{out['single_overhead']['median'] * 1000:.0f}ms")
+    return out
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).parent,
+                              capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+
+def bench_suite(args) -> None:
+    params = {k: getattr(args, k) for k in ("frames", "subjects", "courses", "e2e_courses",
+                                            "images", "latency", "jobs", "n")}
+    result = {
+        "meta": {"rev": _git_rev(), "time": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "cpus": os.cpu_count(), "params": params},
+    }
+    base = Path(tempfile.mkdtemp(prefix="bench_slides-"))
+    try:
+        sb = make_sandbox(base, args.subjects, args.courses, args.e2e_courses, args.frames, args.images)
+        print(f"--- 部品: {args.frames} フレーム / 科目 {args.subjects} × 授業 {args.courses} ---")
+        result["components"] = bench_components(sb, args.n)
+        if not args.no_e2e:
+            print(f"--- 全体: 擬似 latexmk {args.latency}s / 授業 {args.e2e_courses} 件 ---")
+            result["e2e"] = bench_e2e(sb, args.n, args.latency, args.jobs)
+    finally:
+        if args.keep:
+            print(f"作業ディレクトリ: {base}")
+        else:
+            shutil.rmtree(base, ignore_errors=True)
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=1), encoding="utf-8")
+        print(f"✅ 結果: {args.json}")
+
+def bench_compare(old_path: str, new_path: str) -> None:
+    old, new = (json.loads(Path(p).read_text(encoding="utf-8")) for p in (old_path, new_path))
+    print(f"{old['meta'].get('rev') or old_path} → {new['meta'].get('rev') or new_path}")
+    for group in ("components", "e2e"):
+        for name, st in new.get(group, {}).items():
+            before = old.get(group, {}).get(name)
+            if not before or not before.get("median"):
+                continue
+            ratio = st["median"] / before["median"]
+            mark = "⚠" if ratio > 1.1 else "✅" if ratio < 0.9 else "  "
+            print(f"{mark} {group}.{name:<24} {before['median'] * 1000:10.3f}ms → "
+                  f"{st['median'] * 1000:10.3f}ms  ({ratio:.2f}x)")
+
+def main():
+    ap = argparse.ArgumentParser(description="build_slide ベンチマーク")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("fmt", help="通常コンパイルとフォーマット使用時の比較")
+    p.add_argument("items", nargs=2, help="科目コード と ディレクトリ名")
+    p.add_argument("--page", "-p", default="", help="フレーム番号範囲（例: 5 / 3-7）")
+    p.add_argument("-n", type=int, default=3, help="繰り返し回数")
+
+    p = sub.add_parser("scan", help="フレーム走査の比較（合成デッキ）")
+    p.add_argument("--frames", type=int, default=1000, help="フレーム数")
+    p.add_argument("-n", type=int, default=5, help="繰り返し回数")
+
+    p = sub.add_parser("suite", help="合成デッキ・合成 slideinfo・擬似 latexmk による一括計測")
+    p.add_argument("--frames", type=int, default=120, help="合成デッキのフレーム数")
+    p.add_argument("--subjects", type=int, default=40, help="合成 slideinfo の科目数")
+    p.add_argument("--courses", type=int, default=15, help="科目あたりの授業数")
+    p.add_argument("--e2e-courses", type=int, default=4, help="実際にビルドする授業数（バッチ計測用）")
+    p.add_argument("--images", type=int, default=8, help="授業あたりの画像数")
+    p.add_argument("--latency", type=float, default=0.3, help="擬似 latexmk の所要時間（秒）")
+    p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="バッチ計測の並列数")
+    p.add_argument("-n", type=int, default=3, help="繰り返し回数")
+    p.add_argument("--no-e2e", action="store_true", help="部品の計測だけ行う")
+    p.add_argument("--json", help="結果を JSON で書き出すパス")
+    p.add_argument("--keep", action="store_true", help="作業ディレクトリを消さない")
+
+    p = sub.add_parser("compare", help="suite の JSON を2つ比べる")
+    p.add_argument("old")
+    p.add_argument("new")
+
+    args = ap.parse_args()
+    if args.cmd == "fmt":
+        bench_fmt(*args.items, args.page, args.n)
+    elif args.cmd == "scan":
+        bench_scan(args.frames, args.n)
+    elif args.cmd == "suite":
+        bench_suite(args)
+    elif args.cmd == "compare":
+        bench_compare(args.old, args.new)
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import shutil
 import re
 import argparse
 import slideinfo
+import framescan
 
 def parse_page_range(range_str: str) -> tuple[int, int]:
     """ページ範囲の文字列を解析して (fp, tp) を返す。無効なら (-1, -1)。"""
@@ -112,11 +113,9 @@ def replace_space_with_underscore(text):
 
 # 文字列位置を取得
 def find_frame_positions(s):
-###    pattern = r'\\begin{frame}.*?\\end{frame}'
-    # 正規表現で \begin{frame} 〜 \end{frame} を含むブロック + 直後の改行も含める
-    pattern = r'(\\begin{frame}.*?\\end{frame})(\n|$)'
-    matches = list(re.finditer(pattern, s, flags=re.DOTALL))
-    return [(m.start(), m.end()) for m in matches]
+    # framescan で \begin{frame} 〜 \end{frame} を走査し、直後の改行も含める
+    return [(st, en + 1 if s[en:en + 1] == "\n" else en)
+            for st, en in framescan.frame_positions(s)]
 
 def themechk(fs):
     # 正規表現で抽出
@@ -1,5 +1,6 @@
 from pathlib import Path
 import slideinfo
+import framescan
 import subprocess
 import argparse
 import re
@@ -77,11 +78,9 @@ print(f"生徒・先生モード: {techflg}")
 
 # 文字列位置を取得
 def find_frame_positions(s):
-###    pattern = r'\\begin{frame}.*?\\end{frame}'
-    # 正規表現で \begin{frame} 〜 \end{frame} を含むブロック + 直後の改行も含める
-    pattern = r'(\\begin{frame}.*?\\end{frame})(\n|$)'
-    matches = list(re.finditer(pattern, s, flags=re.DOTALL))
-    return [(m.start(), m.end()) for m in matches]
+    # framescan で \begin{frame} 〜 \end{frame} を走査し、直後の改行も含める
+    return [(st, en + 1 if s[en:en + 1] == "\n" else en)
+            for st, en in framescan.frame_positions(s)]
 
 def themechk(fs):
     # 正規表現で抽出
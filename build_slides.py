@@ -1,13 +1,32 @@
 # build_slides.py — 両テーマ latexmk 統一・範囲抽出ビルド 完全版
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import subprocess
 import argparse
+import os
 import re
 import shutil
+import signal
 import sys
+import threading
+import time
 
 import slideinfo  # slidedir(), slidetitle(), slideinfoupdate()
+import buildcache
+import framescan
+import fmtcache
+import frameindex
+import buildjournal
+import texlog
+import highlight
+import graphicsref
+import imageopt
+import overlays
+import pdfopt
+import pdftools
+import profiler
+import publish
 
 # ----------------- ユーティリティ -----------------
 def parse_page_range(range_str: str) -> tuple[int, int]:
@@ -30,9 +49,8 @@ def parse_page_range(range_str: str) -> tuple[int, int]:
         return (1, 1) if n == 0 else (n, n)
 
 def find_frame_positions(tex: str) -> list[tuple[int, int]]:
-    # \begin{frame}[...]{...} ... \end{frame} を素朴に抽出（入れ子想定なし）
-    pattern = r'(\\begin{frame}(\[[^\]]*\])?[^}]*?}.*?\\end{frame})(\s*|\n|$)'
-    return [(m.start(1), m.end(1)) for m in re.finditer(pattern, tex, flags=re.DOTALL)]
+    # \begin{frame}[...]{...} ... \end{frame} を1パスで走査（コメント・verbatim 系を考慮、入れ子想定なし）
+    return framescan.frame_positions(tex)
 
 def extract_frames(tex: str, fp: int, tp: int) -> str:
     pos = find_frame_positions(tex)
@@ -58,43 +76,153 @@ def theme_from_first_line(first_line: str) -> str:
 def safe_tex_path(p: str | Path) -> str:
     return str(p).replace("\\", "/")
 
-def run_latexmk(build_dir: Path, main_tex: Path, timeout_s: int = 180) -> None:
+def _kill_tree(proc: subprocess.Popen) -> None:
+    # latexmk が起動した lualatex ごと止める
+    if proc.poll() is not None:
+        return
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+
+def run_latexmk(build_dir: Path, main_tex: Path, timeout_s: int = 180,
+                fmt: Path | None = None, to_content=None, shell_escape: bool = True) -> int:
+    """latexmk を実行し、LaTeX エンジンを走らせた回数を返す。失敗時は sys.exit(1)。
+
+    出力は1行ずつ読み、パス番号と出力中のページを表示する。最初の致命的エラーを
+    見つけた時点でプロセスを止める。to_content は main.tex の行番号を content.tex の
+    行番号に読み替える関数（texlog.line_mapper）。minted を highlight で置き換え済みなら
+    shell_escape=False で -shell-escape を付けない。
+    """
     cmd = [
-        "latexmk", "-lualatex", "-shell-escape",
+        "latexmk", "-lualatex", "-recorder",
         "-interaction=nonstopmode", "-file-line-error",
         "-halt-on-error",
         f"-outdir={safe_tex_path(build_dir)}",
         safe_tex_path(main_tex),
     ]
+    if shell_escape:
+        cmd.insert(2, "-shell-escape")
+    if fmt:
+        # プリアンブルをダンプ済みフォーマットから開始する
+        cmd.insert(2, f"-lualatex=lualatex %O -fmt={safe_tex_path(fmt)} %S")
+    return _run_tex(cmd, build_dir, main_tex, timeout_s, to_content)
+
+def run_lualatex_once(build_dir: Path, main_tex: Path, timeout_s: int = 60,
+                      fmt: Path | None = None, to_content=None, shell_escape: bool = True) -> int:
+    """lualatex を latexmk なしで1回だけ走らせる（--draft 用。目次・総ページ数は前回の .aux のまま）。"""
+    cmd = ["lualatex", "-interaction=nonstopmode", "-file-line-error", "-halt-on-error", main_tex.name]
+    if shell_escape:
+        cmd.insert(1, "-shell-escape")
+    if fmt:
+        cmd.insert(1, f"-fmt={safe_tex_path(fmt)}")
+    return _run_tex(cmd, build_dir, main_tex, timeout_s, to_content, single=True)
+
+def _run_tex(cmd: list[str], build_dir: Path, main_tex: Path, timeout_s: int,
+             to_content, single: bool = False) -> int:
+    """cmd（latexmk か lualatex）を実行して出力を監視する。single なら全体を1パスとして扱う。"""
     print("RUN:", " ".join(cmd))
+    proc = subprocess.Popen(
+        cmd, cwd=build_dir, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+        text=True, encoding="utf-8", errors="replace", bufsize=1,
+        start_new_session=(os.name == "posix"),
+    )
+    timed_out = threading.Event()
+
+    def on_timeout():
+        timed_out.set()
+        _kill_tree(proc)
+    timer = threading.Timer(timeout_s, on_timeout)
+    timer.daemon = True
+    timer.start()
+
+    mon = texlog.LatexmkMonitor()
+    # sys.stdout は isatty を持たないファイル風オブジェクトに差し替えられていることがある
+    live = getattr(sys.stdout, "isatty", lambda: False)()
+    # 実行中のパス（番号, time.time(), perf_counter()）
+    pass_start = (1, time.time(), time.perf_counter()) if single else None
+
+    def close_pass():
+        if pass_start:
+            n, wall, t = pass_start
+            profiler.record(f"latexmk pass {n}", wall, time.perf_counter() - t, cat="subprocess")
     try:
-        res = subprocess.run(
-            cmd, cwd=build_dir, capture_output=True, text=True, timeout=timeout_s
-        )
-    except subprocess.TimeoutExpired:
+        for line in proc.stdout:
+            ev = mon.feed(line.rstrip("\n"))
+            if ev == "pass":
+                close_pass()
+                pass_start = (mon.passes, time.time(), time.perf_counter())
+                if live:
+                    print()
+                print(f"… {main_tex.name}: pass {mon.passes}", end="" if live else "\n", flush=True)
+            elif ev == "page" and live:
+                print(f"\r… {main_tex.name}: pass {mon.passes} / page {mon.page}", end="", flush=True)
+            elif ev == "error":
+                _kill_tree(proc)    # 1件目の致命的エラーで打ち切る
+                break
+        mon.finish()
+    finally:
+        timer.cancel()
+        proc.stdout.close()
+        rc = proc.wait()
+        # passes は次のパスで増えるので、最後のパスはここで閉じる
+        close_pass()
+    if live and mon.passes:
+        print()
+
+    if timed_out.is_set():
         print(f"❌ タイムアウトしました（{timeout_s}秒）", file=sys.stderr)
         sys.exit(1)
+    if mon.failed or rc != 0:
+        if mon.diagnostics:
+            report = "\n".join(texlog.format_diagnostic(d, to_content) for d in mon.diagnostics)
+        else:
+            report = "--- LOG ---\n" + "\n".join(mon.tail[-40:])
+        print("❌ LaTeX コンパイル失敗\n" + report, file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ LaTeX コンパイル成功（{mon.passes or 1} パス" + (f", {mon.page} ページ）" if mon.page else "）"))
+    return mon.passes or 1
+
+# ----------------- ビルド本体 -----------------
+# バリアント名 → (ho, tech)
+VARIANTS = {"pr": (False, False), "ho": (True, False), "tech": (False, True)}
+
+DRAFT_DPI = 96      # --draft の画像と PNG の解像度
+# テンプレートの \begin{document} 直後のタイトルフレーム（--draft では省く）
+_TITLE_FRAME = re.compile(r"(\\begin\{document\}\s*)\\begin\{frame\}\[plain,noframenumbering\].*?\\end\{frame\}",
+                          re.DOTALL)
+
+def variant_name(ho: bool, tech: bool) -> str:
+    if tech:
+        return "tech"
+    return "ho" if ho else "pr"
+
+def job_build_dir(root: Path, name: str) -> Path:
+    # テンプレートの ../teacherframe 等が解決できるよう build/ と同じ階層に作る
+    return root / f"build-{name}"
 
-    if res.returncode != 0:
-        lines = []
-        for ln in (res.stdout.splitlines() + res.stderr.splitlines()):
-            if ln.startswith("! ") or "error" in ln.lower():
-                lines.append(ln)
-        tail = "\n".join(lines[-80:]) or res.stdout[-3000:]
-        print("❌ LaTeX コンパイル失敗\n--- LOG ---\n" + tail, file=sys.stderr)
+def check_graphics(issues: list[graphicsref.Issue], line_map: list[tuple[int, int]]) -> None:
+    """画像参照の問題を content.tex の行番号つきで表示し、見つからない画像があれば止める。"""
+    for i in issues:
+        where = f"content.tex:{graphicsref.content_line(i.line, line_map)}"
+        if i.kind == "ambiguous":
+            print(f"⚠ {where}: 画像 '{i.name}' の候補が複数あります → {i.candidates[0]} を使用"
+                  f"（ほか: {', '.join(i.candidates[1:])}）")
+    missing = [i for i in issues if i.kind == "missing"]
+    if missing:
+        for i in missing:
+            print(f"❌ content.tex:{graphicsref.content_line(i.line, line_map)}: "
+                  f"画像が見つかりません: {i.name}", file=sys.stderr)
         sys.exit(1)
-    print("✅ LaTeX コンパイル成功")
 
-# ----------------- メイン -----------------
-def main():
-    ap = argparse.ArgumentParser(description="Beamer スライド部分抽出 & latexmk ビルド")
-    ap.add_argument("items", nargs=2, help="科目コード と ディレクトリ名")
-    ap.add_argument("--page", "-p", default="", help="フレーム番号範囲（例: 5 / 3-7）")
-    ap.add_argument("--ho", action="store_true", help="ハンドアウト（pause無効）")
-    ap.add_argument("--tech", action="store_true", help="教師モードON")
-    args = ap.parse_args()
+def load_course(subj_code: str, tdir_name: str, page: str = "", draft: bool = False) -> dict:
+    """content.tex・テンプレート・slideinfo を1回だけ読み、ビルドに必要な情報をまとめる。
 
-    subj_code, tdir_name = args.items
+    draft が真なら画像を DRAFT_DPI まで縮小したもの（キャッシュ）に差し替える。
+    """
     tagdir = slideinfo.slidedir(subj_code, tdir_name)
     if not tagdir:
         print("❌ 対象ディレクトリが解決できません", file=sys.stderr)
@@ -107,16 +235,25 @@ def main():
         print(f"❌ content.tex が見つかりません: {content_path}", file=sys.stderr)
         sys.exit(1)
 
+    with profiler.span("read content.tex"):
+        data = content_path.read_bytes()
+        text2 = data.decode("utf-8")
+    index = None
     try:
-        fp, tp = parse_page_range(args.page)
+        if page and not re.fullmatch(r"[0-9-]+", page):
+            # label:xxx..label:yyy / タイトルの一部 は索引から解決する
+            index = frameindex.load_index(content_path, data)
+            fp, tp = frameindex.resolve_page_spec(page, index)
+        else:
+            fp, tp = parse_page_range(page)
     except argparse.ArgumentTypeError as e:
         print("❌", e, file=sys.stderr)
         sys.exit(1)
 
-    text2 = content_path.read_text(encoding="utf-8")
-    ctheme = theme_from_first_line(text2.splitlines()[0] if text2 else "")
+    with profiler.span("theme"):
+        ctheme = theme_from_first_line(text2[:text2.find("\n")] if "\n" in text2 else text2)
     print(f"対象ディレクトリ: {tagdir}")
-    print(f"ページ範囲: {f'{fp}～{tp}' if fp!=-1 else '指定なし'} / ハンドアウト: {args.ho} / 教師モード: {args.tech}")
+    print(f"ページ範囲: {f'{fp}～{tp}' if fp!=-1 else '指定なし'}")
     print(f"beamerテーマ: {ctheme}")
 
     templ_map = {"SimpleDarkBlue": "main_template_org1.txt",
@@ -126,72 +263,440 @@ def main():
         print(f"❌ テンプレートが見つかりません: {templ_file}", file=sys.stderr)
         sys.exit(1)
 
-    templ = templ_file.read_text(encoding="utf-8")
-    sdir_tex = safe_tex_path(tagdir)
-    stitle = f"{tdir_name} {slideinfo.slidetitle(subj_code, tdir_name)}"
-
-    tex_head = (templ
-                .replace("@@sdir@@", sdir_tex)
-                .replace("@@stitle@@", stitle))
-    tex_head = tex_head.replace("%@@pausemode@@",
-                                r"\mypausemodefalse" if args.ho else r"\mypausemodetrue")
-    tex_head = tex_head.replace("%@@teachermode@@",
-                                r"\teachermodetrue" if args.tech else r"\teachermodefalse")
+    with profiler.span("read template"):
+        templ = templ_file.read_text(encoding="utf-8")
+    title = slideinfo.slidetitle(subj_code, tdir_name)
+    stitle = f"{tdir_name} {title}"
 
     # --- フレーム部分抽出 ---
+    with profiler.span("extract"):
+        body, line_map, suffix_tag = _course_body(content_path, data, text2, index, fp, tp)
+
+    # --- 画像参照のプリフライト（LuaLaTeX の前に解決・書き換え） ---
+    with profiler.span("graphics"):
+        head = templ.replace("@@sdir@@", safe_tex_path(tagdir))
+        if draft and imageopt.Image is not None:
+            opt = imageopt.Optimizer(root, head, root / "build", DRAFT_DPI)
+        else:
+            opt = imageopt.Optimizer(root, head, root / "build") if imageopt.enabled() else None
+        body, issues = graphicsref.rewrite(body, head, root / "build", derive=opt and opt.derive)
+        check_graphics(issues, line_map)
+        if opt:
+            # 縮小に失敗した画像は元画像に戻す
+            for derived, orig in opt.finish().items():
+                body = body.replace(derived, orig)
+
+    return {
+        "subject": subj_code, "course": tdir_name, "page": page,
+        "root": root, "tagdir": tagdir, "app_dir": app_dir,
+        "theme": ctheme, "templ": templ, "title": title, "stitle": stitle,
+        "body": body, "suffix_tag": suffix_tag,
+        "line_map": line_map,     # 本文の行 → content.tex の行（エラー表示用）
+    }
+
+def _course_body(content_path: Path, data: bytes, text2: str, index, fp: int, tp: int):
+    """ビルドする本文・行対応表・出力名の接尾辞。"""
     if fp != -1:
-        part = extract_frames(text2, fp, tp)
+        if index is None:
+            index = frameindex.load_index(content_path, data)
+        part = frameindex.extract(data, index, fp, tp)
+        line_map = frameindex.line_segments(data, index, fp, tp)
         if not part.strip():
             print("⚠ 指定範囲に一致する frame がありません。全体をビルドします。")
             part = text2
+            line_map = [(1, 1)]
         body = part.rstrip()
         suffix_tag = "_test"
     else:
         body = text2.rstrip()
+        line_map = [(1, 1)]
         suffix_tag = None
+    return body, line_map, suffix_tag
 
-    # --- build/main.tex 生成 ---
-    build_dir = root / "build"
+def defer_course_lines(templ: str) -> str:
+    """プリアンブルの @@...@@ を含む行（授業・モードごとに変わる行）を END_OF_DUMP の後ろへ移す。
+
+    フォーマットにはその手前までがダンプされるので、テンプレートごとに1つのフォーマットで済む。
+    波括弧が行内で閉じていない行は移さない（そのままダンプされ、フォーマットが分かれるだけ）。
+    """
+    i = templ.find(fmtcache.BEGIN_DOCUMENT)
+    if i < 0 or fmtcache.END_OF_DUMP in templ[:i]:
+        return templ
+    keep, moved = [], []
+    for line in templ[:i].splitlines(keepends=True):
+        if "@@" in line and line.count("{") == line.count("}"):
+            moved.append(line if line.endswith("\n") else line + "\n")
+        else:
+            keep.append(line)
+    if not moved:
+        return templ
+    return "".join(keep) + fmtcache.END_OF_DUMP + "\n" + "".join(moved) + "\n" + templ[i:]
+
+def render_main_tex(course: dict, ho: bool, tech: bool, prerender: bool = True,
+                    draft: bool = False, page_labels: bool = False) -> str:
+    """main.tex 全文。prerender が真なら minted ブロックを色付け済みの \\input に置き換える。
+
+    draft が真ならテンプレートのタイトルフレームを省く。page_labels が真なら
+    ハンドアウトの切り出し用にフレーム・オーバーレイ番号のページラベルを入れる。
+    """
+    with profiler.span("template"):
+        tex_head = (defer_course_lines(course["templ"])
+                    .replace("@@sdir@@", safe_tex_path(course["tagdir"]))
+                    .replace("@@stitle@@", course["stitle"]))
+        pausemode = r"\mypausemodefalse" if ho else r"\mypausemodetrue"
+        if page_labels:
+            pausemode += "\n" + overlays.PAGE_LABELS
+        tex_head = tex_head.replace("%@@pausemode@@", pausemode)
+        tex_head = tex_head.replace("%@@teachermode@@",
+                                    r"\teachermodetrue" if tech else r"\teachermodefalse")
+        if draft:
+            tex_head = _TITLE_FRAME.sub(r"\1", tex_head, count=1)
+
+        body = course["body"]
+        out_lines = [tex_head, "", body]
+        if not body.endswith(r"\end{document}"):
+            out_lines.append(r"\end{document}")
+        text = "\n".join(out_lines) + "\n"
+    if not prerender:
+        return text
+    with profiler.span("highlight"):
+        return highlight.prerender(text, course["root"])
+
+def output_stem(course: dict, ho: bool, tech: bool) -> str:
+    stem = f"{course['course']}_{course['title']}"
+    if course["suffix_tag"]:
+        stem += course["suffix_tag"]
+    else:
+        if tech:
+            stem += "_tech"
+        elif not ho:
+            stem += "_pr"
+    return stem
+
+def compile_tex(course: dict, tex_text: str, build_dir: Path, flags: dict,
+                use_cache: bool = True, use_fmt: bool = True,
+                phases: buildjournal.Phases | None = None) -> Path:
+    """main.tex を書き出して latexmk（またはキャッシュ）で PDF を得る。"""
+    ph = phases or buildjournal.Phases()
+    root = course["root"]
     build_dir.mkdir(exist_ok=True)
     main_tex = build_dir / "main.tex"
+    with profiler.span("write main.tex"):
+        main_tex.write_text(tex_text, encoding="utf-8")
 
-    out_lines = [tex_head, "", body]
-    if not body.endswith(r"\end{document}"):
-        out_lines.append(r"\end{document}")
-    main_tex.write_text("\n".join(out_lines) + "\n", encoding="utf-8")
-
-    #--main.texのコピー---------------------------------------
-    shutil.copy(build_dir / "main.tex", app_dir/"main.tex")
-    print("main.texをコピーしました")
+    cache = buildcache.BuildCache(root / ".cache" / "pdf") if use_cache else None
+    with ph.phase("cache"):
+        pdf_path = cache.lookup(tex_text, flags) if cache else None
+    if pdf_path:
+        print("♻ キャッシュヒット: latexmk をスキップします")
+        return pdf_path
 
-    # --- latexmk 実行（両テーマ共通） ---
-    run_latexmk(build_dir, main_tex, timeout_s=180)
+    with ph.phase("fmt"):
+        fmt = fmtcache.ensure_format(root, build_dir, tex_text) if use_fmt else None
+    to_content = texlog.line_mapper(tex_text, course["body"], course.get("line_map", []))
+    shell = highlight.needs_shell_escape(tex_text)
+    with ph.phase("latexmk"):
+        if fmt:
+            try:
+                ph.add_passes(run_latexmk(build_dir, main_tex, timeout_s=180, fmt=fmt,
+                                          to_content=to_content, shell_escape=shell))
+            except SystemExit:
+                print("⚠ フォーマット使用時に失敗。通常ビルドで再試行します。", file=sys.stderr)
+                ph.add_passes(run_latexmk(build_dir, main_tex, timeout_s=180,
+                                          to_content=to_content, shell_escape=shell))
+                fmtcache.mark_broken(fmt)   # 通常ビルドは通ったのでフォーマット側の問題
+        else:
+            ph.add_passes(run_latexmk(build_dir, main_tex, timeout_s=180,
+                                      to_content=to_content, shell_escape=shell))
 
     pdf_path = build_dir / "main.pdf"
     if not pdf_path.exists():
         print("❌ main.pdf が見つかりません", file=sys.stderr)
         sys.exit(1)
+    if cache:
+        with ph.phase("cache"):
+            inputs = buildcache.read_fls_inputs(build_dir / "main.fls", root.parent, build_dir)
+            # キャッシュ内の PDF は書き換えられないので、配置はそこからハードリンクできる
+            pdf_path = cache.store(tex_text, flags, pdf_path, inputs)
+    return pdf_path
 
-    # --- 出力名決定 & 配置 ---
-    title = slideinfo.slidetitle(subj_code, tdir_name)
-    stem = f"{tdir_name}_{title}"
-    if suffix_tag:
-        stem += suffix_tag
-    else:
-        if args.tech:
-            stem += "_tech"
-        elif not args.ho:
-            stem += "_pr"
-    final_pdf = app_dir / f"{stem}.pdf"
-    shutil.copy2(pdf_path, final_pdf)
-    print("✅ 出力:", final_pdf)
+def build_course(subj_code: str, tdir_name: str, page: str = "",
+                 ho: bool = False, tech: bool = False,
+                 build_dir: Path | None = None, use_cache: bool = True,
+                 update_info: bool = True, use_fmt: bool = True,
+                 optimize: bool = False) -> Path:
+    """1コース分をビルドして配置した PDF のパスを返す。失敗時は sys.exit(1)。
+
+    update_info が真ならビルド結果を buildjournal に1件追記する。
+    optimize が真なら配置する前に pdfopt で配布用に最適化する。
+    """
+    flags = {"ho": ho, "tech": tech, "page": page}
+    with buildjournal.track(subj_code, tdir_name, variant_name(ho, tech), flags,
+                            enabled=update_info) as ph:
+        with ph.phase("load"):
+            course = load_course(subj_code, tdir_name, page)
+        print(f"ハンドアウト: {ho} / 教師モード: {tech}")
+        app_dir = course["app_dir"]
+
+        # --- build/main.tex 生成 ---
+        if build_dir is None:
+            build_dir = course["root"] / "build"
+        with ph.phase("render"):
+            tex_text = render_main_tex(course, ho, tech)
+        pdf_path = compile_tex(course, tex_text, build_dir, flags, use_cache, use_fmt, ph)
+        if optimize:
+            with ph.phase("optimize"):
+                pdf_path = pdfopt.optimize(pdf_path, course["root"])
+
+        with ph.phase("publish"):
+            pub = publish.Publisher(app_dir)
+            #--main.texの配置---------------------------------------
+            with profiler.span("copy main.tex"):
+                how = pub.put(build_dir / "main.tex", "main.tex")
+            print("main.texを配置しました" + publish.describe(how))
+
+            # --- 出力名決定 & 配置 ---
+            final_pdf = app_dir / f"{output_stem(course, ho, tech)}.pdf"
+            with profiler.span("copy pdf"):
+                how = pub.put(pdf_path, final_pdf.name)
+            print("✅ 出力:", final_pdf, publish.describe(how))
+        ph.pdf_size = final_pdf.stat().st_size
+
+        # 必要なら掃除（buildを残すならコメントアウト）
+        # for ext in ["aux","log","nav","out","snm","toc","vrb","fls","fdb_latexmk"]:
+        #     for p in build_dir.glob(f"*.{ext}"):
+        #         p.unlink(missing_ok=True)
+    return final_pdf
+
+def build_draft(subj_code: str, tdir_name: str, page: str = "",
+                ho: bool = False, tech: bool = False,
+                use_fmt: bool = True, update_info: bool = True) -> list[Path]:
+    """lualatex 1パスだけの下書きビルド。指定フレームの PNG を作ってそのパスを返す。
+
+    タイトルフレームは省き、画像は縮小版、minted は highlight のキャッシュを使う。
+    PDF はキャッシュにも授業ディレクトリにも置かない。
+    """
+    flags = {"ho": ho, "tech": tech, "page": page, "draft": True}
+    with buildjournal.track(subj_code, tdir_name, variant_name(ho, tech), flags,
+                            enabled=update_info) as ph:
+        with ph.phase("load"):
+            course = load_course(subj_code, tdir_name, page, draft=True)
+        root = course["root"]
+        build_dir = job_build_dir(root, f"{subj_code}-{tdir_name}-{variant_name(ho, tech)}-draft")
+        build_dir.mkdir(exist_ok=True)
+        with ph.phase("render"):
+            tex_text = render_main_tex(course, ho, tech, draft=True)
+        main_tex = build_dir / "main.tex"
+        main_tex.write_text(tex_text, encoding="utf-8")
+
+        with ph.phase("fmt"):
+            fmt = fmtcache.ensure_format(root, build_dir, tex_text) if use_fmt else None
+        to_content = texlog.line_mapper(tex_text, course["body"], course.get("line_map", []))
+        shell = highlight.needs_shell_escape(tex_text)
+        with ph.phase("lualatex"):
+            if fmt:
+                try:
+                    ph.add_passes(run_lualatex_once(build_dir, main_tex, fmt=fmt,
+                                                    to_content=to_content, shell_escape=shell))
+                except SystemExit:
+                    print("⚠ フォーマット使用時に失敗。通常ビルドで再試行します。", file=sys.stderr)
+                    ph.add_passes(run_lualatex_once(build_dir, main_tex,
+                                                    to_content=to_content, shell_escape=shell))
+                    fmtcache.mark_broken(fmt)
+            else:
+                ph.add_passes(run_lualatex_once(build_dir, main_tex,
+                                                to_content=to_content, shell_escape=shell))
+        pdf_path = build_dir / "main.pdf"
+        if not pdf_path.exists():
+            print("❌ main.pdf が見つかりません", file=sys.stderr)
+            sys.exit(1)
+        ph.pdf_size = pdf_path.stat().st_size
+
+        with ph.phase("png"):
+            pngs = pdftools.to_png(pdf_path, build_dir / "preview", output_stem(course, ho, tech), DRAFT_DPI)
+        for p in pngs:
+            print("✅ プレビュー:", p)
+    return pngs
+
+def parse_variants(spec: str) -> list[str]:
+    names = [v.strip() for v in spec.split(",") if v.strip()]
+    bad = [v for v in names if v not in VARIANTS]
+    if bad or not names:
+        raise argparse.ArgumentTypeError(
+            f"バリアントは {','.join(VARIANTS)} から指定してください: {spec}")
+    return list(dict.fromkeys(names))
+
+def build_variants(subj_code: str, tdir_name: str, variants: list[str], page: str = "",
+                   use_cache: bool = True, update_info: bool = True,
+                   use_fmt: bool = True, optimize: bool = False,
+                   derive: bool = True) -> dict[str, Path]:
+    """content.tex を1回だけ読み、複数バリアントを別ディレクトリで並行コンパイルする。
 
-    # 必要なら掃除（buildを残すならコメントアウト）
-    # for ext in ["aux","log","nav","out","snm","toc","vrb","fls","fdb_latexmk"]:
-    #     for p in build_dir.glob(f"*.{ext}"):
-    #         p.unlink(missing_ok=True)
+    buildjournal にはバリアントをまとめて1件として記録する（段階時間は各スレッドの合計）。
+    derive が真で pr と ho を両方作るときは、できれば ho をコンパイルせず pr から切り出す。
+    main.tex は実際にコンパイルしたバリアントのうち先頭のものを配置する。
+    """
+    with buildjournal.track(subj_code, tdir_name, ",".join(variants), {"page": page},
+                            enabled=update_info) as ph:
+        with ph.phase("load"):
+            course = load_course(subj_code, tdir_name, page)
+        app_dir = course["app_dir"]
+        print(f"バリアント: {', '.join(variants)}")
 
-    slideinfo.slideinfoupdate(subj_code, tdir_name)
+        # ho は pr の各フレームの最後のオーバーレイと同じなら切り出す
+        compiled = list(variants)
+        if derive and "pr" in variants and "ho" in variants:
+            reason = overlays.mode_dependent(course["body"])
+            if not reason and not shutil.which("qpdf"):
+                reason = "qpdf が見つかりません"
+            if reason:
+                print(f"ハンドアウト: 別にコンパイルします（{reason}）")
+            else:
+                print("ハンドアウト: pr から切り出します")
+                compiled.remove("ho")
+
+        derived = "ho" in variants and "ho" not in compiled
+
+        jobs = {}
+        with ph.phase("render"):
+            for v in variants:
+                ho, tech = VARIANTS[v]
+                jobs[v] = {
+                    "ho": ho, "tech": tech,
+                    # 切り出すときだけ pr にフレーム・オーバーレイ番号のページラベルを入れる
+                    "tex": render_main_tex(course, ho, tech, page_labels=derived and v == "pr"),
+                    "build_dir": job_build_dir(course["root"], f"{subj_code}-{tdir_name}-{v}"),
+                    "flags": {"ho": ho, "tech": tech, "page": page},
+                }
+
+        # latexmk はサブプロセスなのでスレッドで十分並列になる
+        pdfs, failed = {}, []
+        with ThreadPoolExecutor(max_workers=len(compiled)) as ex:
+            futs = {v: ex.submit(profiler.carry(compile_tex), course, jobs[v]["tex"], jobs[v]["build_dir"],
+                                 jobs[v]["flags"], use_cache, use_fmt, ph)
+                    for v in compiled}
+            for v, fut in futs.items():
+                try:
+                    pdfs[v] = fut.result()
+                except SystemExit:
+                    failed.append(v)
+        if failed:
+            print(f"❌ 失敗したバリアント: {', '.join(failed)}", file=sys.stderr)
+            sys.exit(1)
+        if derived:
+            with ph.phase("derive"):
+                ho_pdf = overlays.derive_handout(pdfs["pr"], course["root"])
+            if ho_pdf is None:
+                j = jobs["ho"]
+                ho_pdf = compile_tex(course, j["tex"], j["build_dir"], j["flags"], use_cache, use_fmt, ph)
+                compiled.append("ho")
+            with ph.phase("derive"):
+                pdfs["pr"] = overlays.strip_labels(pdfs["pr"], course["root"])
+            pdfs = {v: ho_pdf if v == "ho" else pdfs[v] for v in variants}
+        if optimize:
+            with ph.phase("optimize"), ThreadPoolExecutor(max_workers=len(pdfs)) as ex:
+                # qpdf / gs はサブプロセスなのでスレッドで並列になる
+                pdfs = dict(zip(pdfs, ex.map(profiler.carry(lambda p: pdfopt.optimize(p, course["root"])),
+                                             pdfs.values())))
+
+        with ph.phase("publish"):
+            pub = publish.Publisher(app_dir)
+            #--main.texの配置（実際にコンパイルした先頭バリアントのもの）-------------------
+            first = next(v for v in variants if v in compiled)
+            with profiler.span("copy main.tex"):
+                how = pub.put(jobs[first]["build_dir"] / "main.tex", "main.tex")
+            print("main.texを配置しました" + publish.describe(how))
+
+            outputs = {}
+            for v, pdf_path in pdfs.items():
+                stem = output_stem(course, jobs[v]["ho"], jobs[v]["tech"])
+                if course["suffix_tag"] and len(variants) > 1:
+                    stem += f"_{v}"   # 範囲指定時は _test が衝突するので区別する
+                final_pdf = app_dir / f"{stem}.pdf"
+                with profiler.span("copy pdf", variant=v):
+                    how = pub.put(pdf_path, final_pdf.name)
+                print(f"✅ 出力[{v}]:", final_pdf, publish.describe(how))
+                outputs[v] = final_pdf
+        ph.pdf_size = sum(p.stat().st_size for p in outputs.values())
+    return outputs
+
+# ----------------- メイン -----------------
+def main():
+    ap = argparse.ArgumentParser(description="Beamer スライド部分抽出 & latexmk ビルド")
+    ap.add_argument("items", nargs=2, help="科目コード と ディレクトリ名")
+    ap.add_argument("--page", "-p", default="", help="フレーム範囲（例: 5 / 3-7 / label:intro..label:summary / タイトルの一部）")
+    ap.add_argument("--ho", action="store_true", help="ハンドアウト（pause無効）")
+    ap.add_argument("--tech", action="store_true", help="教師モードON")
+    ap.add_argument("--variants", type=parse_variants, default=None,
+                    help="複数バリアントを同時ビルド（例: pr,ho,tech）")
+    ap.add_argument("--no-derive", action="store_true",
+                    help="--variants で pr と ho を両方作るとき、ho も pr から切り出さずにコンパイルする")
+    ap.add_argument("--no-cache", action="store_true", help="ビルドキャッシュを使わない")
+    ap.add_argument("--no-fmt", action="store_true", help="プリアンブルのフォーマットキャッシュを使わない")
+    ap.add_argument("--incremental", "-i", action="store_true",
+                    help="フレーム単位でキャッシュし、変更したフレームだけコンパイル")
+    ap.add_argument("--watch", "-w", action="store_true",
+                    help="content.tex・images/・templates/ を監視し、保存のたびに編集箇所のフレームを再ビルド")
+    ap.add_argument("--no-daemon", action="store_true",
+                    help="buildd が起動していてもこのプロセスでビルドする")
+    ap.add_argument("--profile", nargs="?", const="", default=None, metavar="FILE",
+                    help="段階ごとの所要時間を Chrome トレース形式で書き出す（既定: trace-<科目>-<授業>.json）")
+    ap.add_argument("--draft", action="store_true",
+                    help="lualatex 1パス・タイトルなし・縮小画像で指定フレームの PNG だけを作る（確認用）")
+    ap.add_argument("--optimize", "-O", action="store_true",
+                    help="配置する PDF を qpdf で圧縮・線形化する（BUILD_SLIDES_PDF_GS=1 で gs も使う）")
+    args = ap.parse_args()
+
+    subj_code, tdir_name = args.items
+    if args.watch:
+        if args.variants or args.incremental or args.profile is not None:
+            ap.error("--watch は --variants/--incremental/--profile と同時に指定できません")
+        import watch
+        # 中断は子プロセスごと止めて行うので、ビルドは buildd に任せない
+        extra = ["--no-daemon"] + [f for f, on in (("--ho", args.ho), ("--tech", args.tech),
+                                   ("--no-cache", args.no_cache), ("--no-fmt", args.no_fmt),
+                                   ("--draft", args.draft)) if on]
+        watch.watch(subj_code, tdir_name, page=args.page, extra_args=extra)
+        return
+    if args.profile is not None:
+        # 記録はこのプロセス内で取るので buildd には任せない
+        path = Path(args.profile or f"trace-{subj_code}-{tdir_name}.json")
+        with profiler.session(path, f"build {subj_code} {tdir_name}"):
+            _run(ap, args, use_daemon=False)
+        return
+    _run(ap, args, use_daemon=not args.no_daemon)
+
+def _run(ap: argparse.ArgumentParser, args: argparse.Namespace, use_daemon: bool) -> None:
+    subj_code, tdir_name = args.items
+    if args.draft:
+        if args.variants or args.incremental or args.optimize:
+            ap.error("--draft は --variants/--incremental/--optimize と同時に指定できません")
+        build_draft(subj_code, tdir_name, page=args.page, ho=args.ho, tech=args.tech,
+                    use_fmt=not args.no_fmt)
+        return
+    if args.incremental:
+        if args.page or args.variants or args.optimize:
+            ap.error("--incremental は --page/--variants/--optimize と同時に指定できません")
+        import incremental  # incremental は build_slides を import するのでここで読む
+        incremental.build_incremental(subj_code, tdir_name, ho=args.ho, tech=args.tech,
+                                      use_fmt=not args.no_fmt)
+        return
+    if args.variants:
+        if args.ho or args.tech:
+            ap.error("--variants と --ho/--tech は同時に指定できません")
+        build_variants(subj_code, tdir_name, args.variants, page=args.page,
+                       use_cache=not args.no_cache, use_fmt=not args.no_fmt,
+                       optimize=args.optimize, derive=not args.no_derive)
+        return
+    if use_daemon:
+        import buildd
+        code = buildd.client_build(subj_code, tdir_name, args.page, args.ho, args.tech,
+                                   use_cache=not args.no_cache, use_fmt=not args.no_fmt,
+                                   optimize=args.optimize)
+        if code is not None:
+            sys.exit(code)
+    build_course(subj_code, tdir_name, page=args.page, ho=args.ho, tech=args.tech,
+                 use_cache=not args.no_cache, use_fmt=not args.no_fmt, optimize=args.optimize)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
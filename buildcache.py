@@ -0,0 +1,211 @@
+# buildcache.py — main.tex・ビルドフラグ・latexmk が記録した入力ファイルで PDF をキャッシュ
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows では排他なし
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3   # キャッシュ上限（既定 2GiB）
+INDEX_NAME = "index.json"
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def read_fls_inputs(fls_path: Path, project_root: Path, build_dir: Path) -> list[Path]:
+    """latexmk(-recorder) の .fls から、プロジェクト配下の入力ファイルだけを返す。"""
+    if not fls_path.exists():
+        return []
+    project_root = project_root.resolve()
+    build_dir = build_dir.resolve()
+    pwd = build_dir
+    found: dict[str, Path] = {}
+    for ln in fls_path.read_text(encoding="utf-8", errors="replace").splitlines():
+        if ln.startswith("PWD "):
+            pwd = Path(ln[4:].strip())
+            continue
+        if not ln.startswith("INPUT "):
+            continue
+        p = Path(ln[6:].strip())
+        if not p.is_absolute():
+            p = pwd / p
+        try:
+            p = p.resolve()
+        except OSError:
+            continue
+        # TeX 配布物（texmf）やビルド中間ファイルは対象外
+        if not p.is_file() or not p.is_relative_to(project_root) or p.is_relative_to(build_dir):
+            continue
+        found[str(p)] = p
+    return [found[k] for k in sorted(found)]
+
+class BuildCache:
+    """PDF をコンテンツアドレスで保存し、サイズ上限を超えたら LRU で追い出す。
+
+    index.json の entries は「main.tex＋フラグ」のハッシュごとに、前回ビルドで
+    latexmk が読んだ入力ファイルとそのハッシュを保持する。lookup では入力ファイルの
+    現在のハッシュが一致したときだけヒットとする。
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / INDEX_NAME
+        self._index = self._load_index()
+        self._touched: set[str] = set()   # このインスタンスで更新・削除したエントリ
+        self._lock = threading.RLock()     # 同一インスタンスをスレッド間で共有する場合用
+
+    # ----------------- index -----------------
+    def _load_index(self) -> dict:
+        try:
+            idx = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            idx = {}
+        idx.setdefault("entries", {})
+        idx.setdefault("stat", {})
+        return idx
+
+    def _tmp_path(self, path: Path) -> Path:
+        return path.with_suffix(f".tmp{os.getpid()}-{threading.get_ident()}")
+
+    def _save_index(self) -> None:
+        # 並列ビルドが同時に書いても他プロセスのエントリを消さないよう、
+        # ディスク上の最新 index に自分が触ったエントリだけを反映する
+        with open(self.cache_dir / "index.lock", "w") as lockf:
+            if fcntl:
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+            self._merge_and_write()
+
+    def _merge_and_write(self) -> None:
+        disk = self._load_index()
+        for base in self._touched:
+            if base in self._index["entries"]:
+                disk["entries"][base] = self._index["entries"][base]
+            else:
+                disk["entries"].pop(base, None)
+        disk["stat"].update(self._index["stat"])
+        self._index = disk
+        self._touched.clear()
+        tmp = self._tmp_path(self.index_path)
+        tmp.write_text(json.dumps(self._index, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.index_path)
+
+    def _digest(self, path: Path) -> str | None:
+        # サイズと mtime が前回と同じならハッシュを再計算しない
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        memo = self._index["stat"].get(str(path))
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            return memo[2]
+        digest = sha256_file(path)
+        self._index["stat"][str(path)] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    # ----------------- キー -----------------
+    @staticmethod
+    def base_key(tex_text: str, flags: dict) -> str:
+        payload = json.dumps(flags, sort_keys=True, ensure_ascii=False) + "\n" + tex_text
+        return sha256_bytes(payload.encode("utf-8"))
+
+    @staticmethod
+    def full_key(base: str, deps: dict[str, str]) -> str:
+        lines = [base] + [f"{p}\t{d}" for p, d in sorted(deps.items())]
+        return sha256_bytes("\n".join(lines).encode("utf-8"))
+
+    # ----------------- API -----------------
+    def lookup(self, tex_text: str, flags: dict) -> Path | None:
+        with self._lock:
+            return self._lookup(tex_text, flags)
+
+    def store(self, tex_text: str, flags: dict, pdf_path: Path, inputs: list[Path]) -> Path:
+        with self._lock:
+            return self._store(tex_text, flags, pdf_path, inputs)
+
+    def _lookup(self, tex_text: str, flags: dict) -> Path | None:
+        base = self.base_key(tex_text, flags)
+        ent = self._index["entries"].get(base)
+        if not ent:
+            return None
+        blob = self.cache_dir / ent["pdf"]
+        if not blob.exists():
+            del self._index["entries"][base]
+            self._touched.add(base)
+            self._save_index()
+            return None
+        for p, d in ent["deps"].items():
+            if self._digest(Path(p)) != d:
+                return None
+        ent["used"] = time.time()
+        self._touched.add(base)
+        self._save_index()
+        return blob
+
+    def _store(self, tex_text: str, flags: dict, pdf_path: Path, inputs: list[Path]) -> Path:
+        base = self.base_key(tex_text, flags)
+        deps = {}
+        for p in inputs:
+            d = self._digest(p)
+            if d is not None:
+                deps[str(p)] = d
+        key = self.full_key(base, deps)
+        blob = self.cache_dir / f"{key}.pdf"
+        if not blob.exists():
+            tmp = self._tmp_path(blob)
+            shutil.copy2(pdf_path, tmp)
+            os.replace(tmp, blob)
+        old = self._index["entries"].get(base)
+        self._index["entries"][base] = {
+            "pdf": blob.name, "deps": deps,
+            "size": blob.stat().st_size, "used": time.time(),
+        }
+        self._touched.add(base)
+        if old and old["pdf"] != blob.name:
+            self._drop_blob_if_unused(old["pdf"])
+        self._evict()
+        self._save_index()
+        return blob
+
+    def total_bytes(self) -> int:
+        return sum(e["size"] for e in self._unique_blobs().values())
+
+    # ----------------- 追い出し -----------------
+    def _unique_blobs(self) -> dict[str, dict]:
+        blobs: dict[str, dict] = {}
+        for ent in self._index["entries"].values():
+            cur = blobs.get(ent["pdf"])
+            if cur is None or ent["used"] > cur["used"]:
+                blobs[ent["pdf"]] = ent
+        return blobs
+
+    def _drop_blob_if_unused(self, name: str) -> None:
+        if all(e["pdf"] != name for e in self._index["entries"].values()):
+            (self.cache_dir / name).unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        blobs = self._unique_blobs()
+        total = sum(e["size"] for e in blobs.values())
+        for name, ent in sorted(blobs.items(), key=lambda kv: kv[1]["used"]):
+            if total <= self.max_bytes:
+                break
+            for base in [b for b, e in self._index["entries"].items() if e["pdf"] == name]:
+                del self._index["entries"][base]
+                self._touched.add(base)
+            (self.cache_dir / name).unlink(missing_ok=True)
+            total -= ent["size"]
@@ -0,0 +1,344 @@
+# buildd.py — 常駐ビルドサーバ（Unix ソケット、使えない環境では localhost の TCP）
+#
+#   python buildd.py start [-j 4]   # フォアグラウンドで起動
+#   python buildd.py status / stop
+#
+# 1行 JSON のリクエストを受け、ビルドの進捗を1行 JSON のイベントで返し続ける。
+#   → {"op": "build", "subject", "course", "ho", "tech", "page", "use_cache", "use_fmt"}
+#   ← {"event": "queued"|"joined"|"log"|"done", ...}
+# ワーカープロセスは import 済み・slideinfo 読み込み済みのまま使い回す（LuaLaTeX 側の
+# 起動コストは fmtcache のフォーマットで削る）。同じ内容のビルドが実行中なら新しく
+# 投入せず、そのビルドの出力を後から来たクライアントにも流す。
+# build_slides.py はサーバが動いていれば自動でクライアントとして振る舞う。
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout, redirect_stderr
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import socket
+import socketserver
+import sys
+import threading
+import time
+import traceback
+
+import build_slides
+import slideinfo
+
+ROOT = Path(__file__).parent
+RUN_DIR = ROOT / ".cache"
+SOCK_PATH = RUN_DIR / "buildd.sock"
+PORT_PATH = RUN_DIR / "buildd.port"     # TCP で待ち受けたときのポート番号
+USE_UNIX = hasattr(socket, "AF_UNIX")
+
+# ----------------- ワーカープロセス側 -----------------
+_events = None          # ワーカー → サーバのイベントキュー
+_info_stat = None
+
+class _LineWriter:
+    """print の出力を行単位でイベントキューに流す。"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.buf = ""
+
+    def write(self, s: str) -> int:
+        self.buf += s
+        while "\n" in self.buf:
+            line, self.buf = self.buf.split("\n", 1)
+            _events.put((self.key, line))
+        return len(s)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+def _worker_init(events) -> None:
+    global _events
+    _events = events
+
+def _warm() -> None:
+    slideinfo.repository().data()
+
+def _refresh_slideinfo() -> None:
+    # 常駐中に slideinfo.json が編集されたら読み直す
+    global _info_stat
+    try:
+        st = slideinfo.JSON_PATH.stat()
+    except FileNotFoundError:
+        return
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _info_stat is not None and stamp != _info_stat:
+        slideinfo.repository().reload()
+    _info_stat = stamp
+
+def _run(key: str, job: dict) -> dict:
+    _refresh_slideinfo()
+    # 作業ディレクトリはジョブの内容全体で決める（同じ内容のビルドは合流するので同時には走らない）。
+    # batch_build の build-{科目}-{コース}-{バリアント} とも重ならないよう -d<ハッシュ> を付ける
+    name = (f"{job['subject']}-{job['course']}-{build_slides.variant_name(job['ho'], job['tech'])}"
+            f"-d{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}")
+    build_dir = build_slides.job_build_dir(ROOT, name)
+    w = _LineWriter(key)
+    t0 = time.perf_counter()
+    ok, detail = False, ""
+    with redirect_stdout(w), redirect_stderr(w):
+        try:
+            pdf = build_slides.build_course(
+                job["subject"], job["course"], page=job["page"], ho=job["ho"], tech=job["tech"],
+                build_dir=build_dir, use_cache=job["use_cache"], use_fmt=job["use_fmt"],
+                optimize=job.get("optimize", False))
+            ok, detail = True, str(pdf)
+        except SystemExit:
+            detail = "ビルド失敗"
+        except Exception as e:  # 想定外の例外もジョブの失敗として返す
+            traceback.print_exc()
+            detail = f"例外: {e!r}"
+    if w.buf:
+        _events.put((key, w.buf))
+    _events.put((key, None))    # 出力の終わり（結果とは別経路なので順序合わせに使う）
+    return {"ok": ok, "detail": detail, "elapsed": round(time.perf_counter() - t0, 3)}
+
+# ----------------- サーバ側 -----------------
+def job_key(job: dict) -> str:
+    return json.dumps([job.get(k) for k in ("subject", "course", "ho", "tech", "page",
+                                            "use_cache", "use_fmt", "optimize")], ensure_ascii=False)
+
+class BuildServer:
+    def __init__(self, jobs: int):
+        ctx = multiprocessing.get_context()
+        self.events = ctx.Queue()
+        self.pool = ProcessPoolExecutor(max_workers=jobs, mp_context=ctx,
+                                        initializer=_worker_init, initargs=(self.events,))
+        for f in [self.pool.submit(_warm) for _ in range(jobs)]:
+            f.result()
+        self.jobs = jobs
+        self.mu = threading.Lock()
+        self.inflight: dict[str, list[queue.Queue]] = {}   # ジョブ → 購読中クライアント
+        self.logs: dict[str, list[str]] = {}                # 途中から来たクライアントに再送する出力
+        self.results: dict[str, dict] = {}                  # 出力の終わりを待っている結果
+        self.drained: set[str] = set()                      # 出力を配り終えたジョブ
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self) -> None:
+        # ワーカーの出力行を購読者に配る
+        while True:
+            key, line = self.events.get()
+            if line is None:
+                with self.mu:
+                    self.drained.add(key)
+                self._complete(key)
+                continue
+            with self.mu:
+                self.logs.setdefault(key, []).append(line)
+                subs = list(self.inflight.get(key, ()))
+            for q in subs:
+                q.put({"event": "log", "line": line})
+
+    def submit(self, job: dict) -> queue.Queue:
+        key = job_key(job)
+        q: queue.Queue = queue.Queue()
+        with self.mu:
+            if key in self.inflight:
+                self.inflight[key].append(q)
+                q.put({"event": "joined"})
+                for line in self.logs.get(key, ()):
+                    q.put({"event": "log", "line": line})
+                return q
+            self.inflight[key] = [q]
+        q.put({"event": "queued"})
+        fut = self.pool.submit(_run, key, job)
+        fut.add_done_callback(lambda f: self._finish(key, f))
+        return q
+
+    def _finish(self, key: str, fut) -> None:
+        try:
+            res = fut.result()
+        except Exception as e:  # ワーカーが落ちた場合は出力の終わりも来ない
+            res = {"ok": False, "detail": f"ワーカー異常: {e!r}", "elapsed": 0}
+            with self.mu:
+                self.drained.add(key)
+        with self.mu:
+            self.results[key] = res
+        self._complete(key)
+
+    def _complete(self, key: str) -> None:
+        # 結果と出力の終わりが両方そろったら done を送る
+        with self.mu:
+            if key not in self.results or key not in self.drained:
+                return
+            res = self.results.pop(key)
+            self.drained.discard(key)
+            subs = self.inflight.pop(key, [])
+            self.logs.pop(key, None)
+        for q in subs:
+            q.put({"event": "done", **res})
+
+    def shutdown(self) -> None:
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+def _make_handler(server: BuildServer, stop: threading.Event):
+    class Handler(socketserver.StreamRequestHandler):
+        def send(self, msg: dict) -> None:
+            self.wfile.write((json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+        def handle(self) -> None:
+            line = self.rfile.readline()
+            if not line:
+                return      # 起動確認の接続
+            try:
+                req = json.loads(line)
+            except ValueError:
+                self.send({"event": "error", "detail": "リクエストが JSON ではありません"})
+                return
+            op = req.get("op")
+            if op == "ping":
+                self.send({"event": "pong", "pid": os.getpid(), "jobs": server.jobs,
+                           "inflight": len(server.inflight)})
+            elif op == "stop":
+                self.send({"event": "bye"})
+                stop.set()
+            elif op == "build":
+                job = {"subject": str(req["subject"]), "course": str(req["course"]),
+                       "ho": bool(req.get("ho")), "tech": bool(req.get("tech")),
+                       "page": str(req.get("page", "")),
+                       "use_cache": bool(req.get("use_cache", True)),
+                       "use_fmt": bool(req.get("use_fmt", True)),
+                       "optimize": bool(req.get("optimize"))}
+                q = server.submit(job)
+                while True:
+                    msg = q.get()
+                    try:
+                        self.send(msg)
+                    except OSError:
+                        return      # クライアントが切断してもビルドは続ける
+                    if msg["event"] == "done":
+                        return
+            else:
+                self.send({"event": "error", "detail": f"不明な op: {op}"})
+    return Handler
+
+def serve(jobs: int) -> None:
+    RUN_DIR.mkdir(exist_ok=True)
+    if ping():
+        print("❌ buildd はすでに起動しています", file=sys.stderr)
+        sys.exit(1)
+    server = BuildServer(jobs)
+    stop = threading.Event()
+    handler = _make_handler(server, stop)
+    if USE_UNIX:
+        SOCK_PATH.unlink(missing_ok=True)
+        srv = socketserver.ThreadingUnixStreamServer(str(SOCK_PATH), handler)
+        where = str(SOCK_PATH)
+    else:
+        srv = socketserver.ThreadingTCPServer(("127.0.0.1", 0), handler)
+        PORT_PATH.write_text(str(srv.server_address[1]))
+        where = f"127.0.0.1:{srv.server_address[1]}"
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    print(f"✅ buildd 起動: {where} / ワーカー {jobs}")
+    try:
+        stop.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        srv.shutdown()
+        srv.server_close()
+        server.shutdown()
+        if USE_UNIX:
+            SOCK_PATH.unlink(missing_ok=True)
+        else:
+            PORT_PATH.unlink(missing_ok=True)
+        print("buildd を停止しました")
+
+# ----------------- クライアント -----------------
+def connect(timeout: float = 1.0) -> socket.socket | None:
+    """起動中のサーバに接続する。いなければ None。"""
+    try:
+        if USE_UNIX:
+            if not SOCK_PATH.exists():
+                return None
+            s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            s.settimeout(timeout)
+            s.connect(str(SOCK_PATH))
+        else:
+            if not PORT_PATH.exists():
+                return None
+            s = socket.create_connection(("127.0.0.1", int(PORT_PATH.read_text())), timeout)
+    except (OSError, ValueError):
+        return None
+    s.settimeout(None)
+    return s
+
+def request(msg: dict):
+    """リクエストを送り、返ってくるイベントを順に返す。サーバがいなければ何も返さない。"""
+    s = connect()
+    if s is None:
+        return
+    with s, s.makefile("rb") as f:
+        s.sendall((json.dumps(msg, ensure_ascii=False) + "\n").encode("utf-8"))
+        for line in f:
+            yield json.loads(line)
+
+def ping() -> dict | None:
+    return next(request({"op": "ping"}), None)
+
+def client_build(subj_code: str, tdir_name: str, page: str, ho: bool, tech: bool,
+                 use_cache: bool, use_fmt: bool, optimize: bool = False) -> int | None:
+    """サーバにビルドを依頼して出力を表示する。終了コードを返し、サーバがいなければ None。"""
+    if connect(timeout=0.2) is None:
+        return None
+    msg = {"op": "build", "subject": subj_code, "course": tdir_name, "page": page,
+           "ho": ho, "tech": tech, "use_cache": use_cache, "use_fmt": use_fmt,
+           "optimize": optimize}
+    for ev in request(msg):
+        kind = ev["event"]
+        if kind == "queued":
+            print("🛰 buildd にビルドを依頼しました")
+        elif kind == "joined":
+            print("🛰 同じビルドが実行中のため、その結果を待ちます")
+        elif kind == "log":
+            print(ev["line"])
+        elif kind == "done":
+            if not ev["ok"]:
+                print(f"❌ {ev['detail']}", file=sys.stderr)
+            return 0 if ev["ok"] else 1
+        elif kind == "error":
+            print(f"❌ {ev['detail']}", file=sys.stderr)
+            return 1
+    print("❌ buildd との接続が切れました", file=sys.stderr)
+    return 1
+
+def main():
+    ap = argparse.ArgumentParser(description="常駐ビルドサーバ")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("start", help="フォアグラウンドで起動")
+    p.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="ワーカー数")
+    sub.add_parser("status", help="起動状態を表示")
+    sub.add_parser("stop", help="停止")
+    args = ap.parse_args()
+
+    if args.cmd == "start":
+        serve(max(1, args.jobs))
+    elif args.cmd == "status":
+        st = ping()
+        if not st:
+            print("buildd は起動していません")
+            sys.exit(1)
+        print(f"buildd 起動中: pid={st['pid']} ワーカー={st['jobs']} 実行中={st['inflight']}")
+    elif args.cmd == "stop":
+        if next(request({"op": "stop"}), None) is None:
+            print("buildd は起動していません")
+            sys.exit(1)
+        print("停止を依頼しました")
+
+if __name__ == "__main__":
+    main()
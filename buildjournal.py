@@ -0,0 +1,196 @@
+# buildjournal.py — 追記専用のビルドジャーナル（buildlog.jsonl）
+#
+# ビルドごとに1行の JSON を追記する。slideinfo.json は書き換えない。
+#   {"ts", "subject", "course", "variant", "flags", "phases": {段階: 秒}, "total",
+#    "passes": latexmk の実行回数, "pdf_size", "outcome": "ok"|"fail", ["frames": {番号: 秒}]}
+#
+#   python buildjournal.py stats [科目...] [--top 10]   # p50/p95/max と遅い授業・フレーム
+#   python buildjournal.py sync                        # 未反映の配置ビルドを slideinfo の count に反映
+from __future__ import annotations
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+import profiler
+import slideinfo
+
+JOURNAL_PATH = Path(__file__).parent / "buildlog.jsonl"
+SYNCED_PATH = JOURNAL_PATH.with_name(JOURNAL_PATH.name + ".synced")   # sync 済みのバイト位置
+
+class Phases:
+    """1回のビルドの段階別所要時間などを集める（スレッドから同時に足してよい）。"""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases: dict[str, float] = {}
+        self.frames: dict[int, float] = {}
+        self.passes = 0
+        self.pdf_size = 0
+        self._mu = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        t = time.perf_counter()
+        try:
+            with profiler.span(name):
+                yield
+        finally:
+            self.add(name, time.perf_counter() - t)
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._mu:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def add_passes(self, n: int) -> None:
+        with self._mu:
+            self.passes += n
+
+    def total(self) -> float:
+        return time.perf_counter() - self.t0
+
+def append(rec: dict, path: Path = JOURNAL_PATH) -> None:
+    # O_APPEND で1行を1回の write で書く（並列ビルドでも行が混ざらない）
+    line = (json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+@contextmanager
+def track(subject: str, course: str, variant: str, flags: dict, enabled: bool = True):
+    """with ブロックのビルドを1件として記録する。sys.exit などで抜けたら outcome=fail。"""
+    ph = Phases()
+    outcome = "fail"
+    try:
+        yield ph
+        outcome = "ok"
+    finally:
+        if enabled:
+            rec = {
+                "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "subject": subject, "course": course, "variant": variant, "flags": flags,
+                "phases": {k: round(v, 3) for k, v in ph.phases.items()},
+                "total": round(ph.total(), 3), "passes": ph.passes,
+                "pdf_size": ph.pdf_size, "outcome": outcome,
+            }
+            if ph.frames:
+                rec["frames"] = {str(k): round(v, 3) for k, v in sorted(ph.frames.items())}
+            try:
+                with profiler.span("journal"):
+                    append(rec)
+            except OSError as e:
+                print(f"⚠ ビルドジャーナルに書けません: {e}")
+
+def read_records(path: Path = JOURNAL_PATH, start: int = 0) -> tuple[list[dict], int]:
+    """start バイト目以降の記録と、読み終えた位置を返す（書きかけの最終行は読まない）。"""
+    if not path.exists():
+        return [], start
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read()
+    end = data.rfind(b"\n") + 1
+    recs = []
+    for ln in data[:end].splitlines():
+        try:
+            recs.append(json.loads(ln))
+        except ValueError:
+            continue
+    return recs, start + end
+
+# ----------------- stats -----------------
+def percentile(sorted_vals: list[float], p: float) -> float:
+    # 最近傍順位法
+    k = max(0, math.ceil(p / 100 * len(sorted_vals)) - 1)
+    return sorted_vals[k]
+
+def summarize(recs: list[dict]) -> dict:
+    v = sorted(r["total"] for r in recs)
+    return {"n": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95), "max": v[-1]}
+
+def stats(subjects: list[str], top: int) -> None:
+    recs, _ = read_records()
+    if subjects:
+        recs = [r for r in recs if r["subject"] in subjects]
+    ok = [r for r in recs if r["outcome"] == "ok"]
+    if not ok:
+        print("記録がありません")
+        return
+    failed = len(recs) - len(ok)
+
+    by_subject, by_course = defaultdict(list), defaultdict(list)
+    for r in ok:
+        by_subject[r["subject"]].append(r)
+        by_course[(r["subject"], r["course"])].append(r)
+
+    print(f"ビルド記録: 成功 {len(ok)} / 失敗 {failed}")
+    print(f"{'科目':<10}{'授業':<6}{'件数':>6}{'p50':>9}{'p95':>9}{'max':>9}")
+    for subj in sorted(by_subject):
+        s = summarize(by_subject[subj])
+        print(f"{subj:<10}{'*':<6}{s['n']:>6}{s['p50']:>8.1f}s{s['p95']:>8.1f}s{s['max']:>8.1f}s")
+        for (sj, c) in sorted(k for k in by_course if k[0] == subj):
+            s = summarize(by_course[(sj, c)])
+            print(f"{'':<10}{c:<6}{s['n']:>6}{s['p50']:>8.1f}s{s['p95']:>8.1f}s{s['max']:>8.1f}s")
+
+    print(f"\n--- 遅い授業（p50 順、上位 {top}） ---")
+    ranked = sorted(by_course.items(), key=lambda kv: summarize(kv[1])["p50"], reverse=True)
+    for (subj, c), rs in ranked[:top]:
+        s = summarize(rs)
+        phases = defaultdict(float)
+        for r in rs:
+            for k, t in r["phases"].items():
+                phases[k] += t / len(rs)
+        detail = " ".join(f"{k}={t:.1f}s" for k, t in sorted(phases.items(), key=lambda kv: -kv[1]))
+        print(f"{subj} {c}  p50={s['p50']:.1f}s  {detail}")
+
+    frames = {}
+    for r in ok:
+        for n, t in r.get("frames", {}).items():
+            key = (r["subject"], r["course"], int(n))
+            frames[key] = max(frames.get(key, 0.0), t)
+    if frames:
+        print(f"\n--- 遅いフレーム（--incremental の記録、上位 {top}） ---")
+        for (subj, c, n), t in sorted(frames.items(), key=lambda kv: -kv[1])[:top]:
+            print(f"{subj} {c} frame {n}: {t:.1f}s")
+
+# ----------------- sync -----------------
+def is_published(rec: dict) -> bool:
+    """授業全体をビルドして配置した成功記録か（--draft・--page のビルドは数えない）。"""
+    flags = rec.get("flags") or {}
+    return rec["outcome"] == "ok" and not flags.get("draft") and not flags.get("page")
+
+def sync() -> None:
+    """前回の sync 以降の配置ビルドを slideinfo の count / created_at / update_at に反映する。"""
+    try:
+        start = int(SYNCED_PATH.read_text())
+    except (FileNotFoundError, ValueError):
+        start = 0
+    recs, end = read_records(start=start)
+    items = [(r["subject"], r["course"], r["ts"]) for r in recs if is_published(r)]
+    if items:
+        slideinfo.repository().update_many(items)
+    SYNCED_PATH.write_text(str(end))
+    print(f"✅ {len(items)} 件を slideinfo に反映しました")
+
+def main():
+    ap = argparse.ArgumentParser(description="ビルドジャーナルの集計")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("stats", help="ビルド時間の p50/p95/max と遅い授業・フレーム")
+    p.add_argument("subjects", nargs="*", help="科目コード（省略時は全科目）")
+    p.add_argument("--top", type=int, default=10, help="遅い順に表示する件数")
+    sub.add_parser("sync", help="配置ビルドの回数・日時を slideinfo に反映")
+    args = ap.parse_args()
+    if args.cmd == "stats":
+        stats(args.subjects, args.top)
+    elif args.cmd == "sync":
+        sync()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+# fmtcache.py — \begin{document} より前のプリアンブルを LuaLaTeX フォーマットにダンプしてキャッシュ
+#
+# mylatexformat.ltx でプリアンブルを .fmt に固め、以降のビルドは
+#   lualatex -fmt=<key>.fmt main.tex
+# で開始する（フォーマット読み込み時、main.tex のプリアンブルは読み飛ばされる）。
+# luatexja など Lua 側の状態はダンプできない場合があるので、フォーマット使用時に
+# 失敗して通常ビルドが成功したキーは broken として記録し、以後は使わない。
+# プリアンブル中の \csname endofdump\endcsname（mylatexformat の \endofdump。フォーマットなしでも
+# \relax になる）より後ろはダンプせず毎回読むので、授業ごとに変わる行（タイトル・ディレクトリ・
+# モード切替）をそこに置けばテンプレートごとに1つのフォーマットで済む。
+# .fmt は1つ数十 MB になるので、合計が上限を超えたら使われていない順に消す。
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+BEGIN_DOCUMENT = r"\begin{document}"
+END_OF_DUMP = r"\csname endofdump\endcsname"
+DEFAULT_MAX_BYTES = 1024 ** 3      # .fmt の合計の上限（既定 1GiB）
+IN_USE_S = 3600                    # これより最近使ったフォーマットは上限を超えても消さない
+
+def split_preamble(tex_text: str) -> tuple[str, str]:
+    i = tex_text.find(BEGIN_DOCUMENT)
+    if i < 0:
+        return "", tex_text
+    return tex_text[:i], tex_text[i:]
+
+def dump_part(preamble: str) -> str:
+    """プリアンブルのうちフォーマットにダンプする部分（END_OF_DUMP より前）。"""
+    i = preamble.find(END_OF_DUMP)
+    return preamble if i < 0 else preamble[:i]
+
+def _engine_stamp() -> str:
+    # TeX Live 更新でフォーマットの互換性が切れるので、エンジン本体の mtime もキーに含める
+    exe = shutil.which("lualatex")
+    if not exe:
+        return "no-lualatex"
+    try:
+        return f"{exe}:{os.stat(exe).st_mtime_ns}"
+    except OSError:
+        return exe
+
+def format_key(preamble: str, root: Path) -> str:
+    h = hashlib.sha256()
+    h.update(dump_part(preamble).encode("utf-8"))
+    sty = root / "teacherframe.sty"
+    if sty.exists():
+        h.update(sty.read_bytes())
+    h.update(_engine_stamp().encode("utf-8"))
+    return h.hexdigest()[:32]
+
+def fmt_dir(root: Path) -> Path:
+    return root / ".cache" / "fmt"
+
+def mark_broken(fmt: Path) -> None:
+    fmt.with_suffix(".broken").touch()
+
+def evict(root: Path, max_bytes: int = DEFAULT_MAX_BYTES, keep: Path | None = None) -> None:
+    """.fmt の合計が max_bytes を超えていたら、最後に使った時刻（mtime）の古い順に消す。"""
+    fmts = []
+    for p in fmt_dir(root).glob("*.fmt"):
+        try:
+            fmts.append((p.stat().st_mtime, p.stat().st_size, p))
+        except FileNotFoundError:
+            continue
+    total = sum(size for _, size, _ in fmts)
+    now = time.time()
+    for mtime, size, p in sorted(fmts):
+        if total <= max_bytes:
+            break
+        # 他のビルドが読み込もうとしているかもしれないものは残す
+        if p == keep or now - mtime < IN_USE_S:
+            continue
+        p.unlink(missing_ok=True)
+        total -= size
+
+def ensure_format(root: Path, build_dir: Path, tex_text: str, timeout_s: int = 180) -> Path | None:
+    """プリアンブルに対応する .fmt を返す。作れない・使えない場合は None。"""
+    preamble, _ = split_preamble(tex_text)
+    if not preamble:
+        return None
+    d = fmt_dir(root)
+    d.mkdir(parents=True, exist_ok=True)
+    key = format_key(preamble, root)
+    fmt = d / f"{key}.fmt"
+    if fmt.with_suffix(".broken").exists():
+        return None
+    if fmt.exists():
+        try:
+            os.utime(fmt)       # 追い出しの順番用に使った時刻を記録する
+        except OSError:
+            pass
+        return fmt
+
+    # プリアンブル中の相対パス（../teacherframe 等）を解決するため build_dir で実行する
+    src = build_dir / f"fmt-{key}.tex"
+    src.write_text(dump_part(preamble) + BEGIN_DOCUMENT + "\n\\end{document}\n", encoding="utf-8")
+    jobname = f"{key}.tmp{os.getpid()}"
+    cmd = [
+        "lualatex", "-ini", "-shell-escape", "-interaction=nonstopmode",
+        f"-jobname={jobname}", f"-output-directory={d.as_posix()}",
+        "&lualatex", "mylatexformat.ltx", src.name,
+    ]
+    print("FMT:", " ".join(cmd))
+    try:
+        res = subprocess.run(cmd, cwd=build_dir, capture_output=True, text=True, timeout=timeout_s)
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        print(f"⚠ フォーマット作成に失敗しました: {e}", file=sys.stderr)
+        return None
+    made = d / f"{jobname}.fmt"
+    if res.returncode != 0 or not made.exists():
+        print("⚠ フォーマット作成に失敗しました。通常ビルドを行います。", file=sys.stderr)
+        made.unlink(missing_ok=True)
+        mark_broken(fmt)
+        return None
+    os.replace(made, fmt)
+    (d / f"{jobname}.log").unlink(missing_ok=True)
+    evict(root, keep=fmt)
+    print("✅ フォーマット作成:", fmt.name)
+    return fmt
@@ -0,0 +1,122 @@
+# frameindex.py — content.tex のフレーム索引（授業ディレクトリの .frameindex.json）
+#
+# フレームごとに 番号・ラベル・タイトル・バイト範囲 を保存し、content.tex の
+# mtime/サイズが変わったときだけハッシュを確かめて再走査する。
+# --page にはフレーム番号のほか次の指定ができる:
+#   label:intro            ラベル intro のフレーム
+#   label:intro..label:summary / 3..label:summary   範囲
+#   title:配列 / 配列      タイトルに「配列」を含む最初のフレーム
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+
+import framescan
+
+INDEX_NAME = ".frameindex.json"
+INDEX_VERSION = 1
+
+def index_path(content_path: Path) -> Path:
+    return content_path.with_name(INDEX_NAME)
+
+def build_index(data: bytes) -> dict:
+    """content.tex のバイト列からフレーム索引を作る（オフセットはバイト単位）。"""
+    text = data.decode("utf-8")
+    frames = []
+    pos_char, pos_byte = 0, 0
+
+    def to_byte(c: int) -> int:
+        nonlocal pos_char, pos_byte
+        pos_byte += len(text[pos_char:c].encode("utf-8"))
+        pos_char = c
+        return pos_byte
+
+    n = 0
+    for f in framescan.scan_frames(text):
+        if f.again:
+            continue
+        n += 1
+        frames.append({"n": n, "label": f.label, "title": f.title,
+                       "start": to_byte(f.start), "end": to_byte(f.end)})
+    return {"version": INDEX_VERSION, "sha256": hashlib.sha256(data).hexdigest(),
+            "frames": frames}
+
+def _save(path: Path, idx: dict) -> None:
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(json.dumps(idx, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+def load_index(content_path: Path, data: bytes | None = None) -> dict:
+    """索引を返す。content.tex が変わっていれば作り直して保存する。"""
+    path = index_path(content_path)
+    st = content_path.stat()
+    try:
+        idx = json.loads(path.read_text(encoding="utf-8"))
+        if idx.get("version") != INDEX_VERSION:
+            idx = None
+    except (FileNotFoundError, ValueError):
+        idx = None
+
+    if idx and idx.get("mtime_ns") == st.st_mtime_ns and idx.get("size") == st.st_size:
+        return _with_lookup(idx)
+
+    if data is None:
+        data = content_path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if not idx or idx.get("sha256") != digest:
+        idx = build_index(data)
+    idx["mtime_ns"], idx["size"] = st.st_mtime_ns, st.st_size
+    try:
+        _save(path, idx)
+    except OSError:
+        pass    # 書けないディレクトリでも索引はメモリ上で使える
+    return _with_lookup(idx)
+
+def _with_lookup(idx: dict) -> dict:
+    # ラベル → 番号 の辞書（保存はしない）
+    idx["by_label"] = {f["label"]: f["n"] for f in idx["frames"] if f["label"]}
+    return idx
+
+def _resolve_one(term: str, idx: dict) -> int:
+    term = term.strip()
+    if term.isdigit():
+        return max(1, int(term))
+    if term.startswith("label:"):
+        label = term[6:].strip()
+        if label not in idx["by_label"]:
+            raise argparse.ArgumentTypeError(f"ラベルが見つかりません: {label}")
+        return idx["by_label"][label]
+    key = term[6:] if term.startswith("title:") else term
+    key = key.strip().lower()
+    for f in idx["frames"]:
+        if key and key in f["title"].lower():
+            return f["n"]
+    raise argparse.ArgumentTypeError(f"タイトルに一致するフレームがありません: {key}")
+
+def resolve_page_spec(spec: str, idx: dict) -> tuple[int, int]:
+    """ラベル・タイトル・番号による範囲指定を (fp, tp) に解決する。"""
+    if ".." in spec:
+        a, b = spec.split("..", 1)
+        fp, tp = _resolve_one(a, idx), _resolve_one(b, idx)
+    else:
+        fp = tp = _resolve_one(spec, idx)
+    if tp < fp:
+        tp = fp
+    return fp, tp
+
+def extract(data: bytes, idx: dict, fp: int, tp: int) -> str:
+    """索引のバイト範囲から fp～tp 番のフレームを切り出す。"""
+    parts = [data[f["start"]:f["end"]] for f in idx["frames"] if fp <= f["n"] <= tp]
+    return b"\n\n".join(parts).decode("utf-8")
+
+def line_segments(data: bytes, idx: dict, fp: int, tp: int) -> list[tuple[int, int]]:
+    """extract() の結果の各フレームが始まる行と、content.tex での行の対応（1 始まり）。"""
+    segs = []
+    body_line = 1
+    for f in idx["frames"]:
+        if fp <= f["n"] <= tp:
+            segs.append((body_line, data.count(b"\n", 0, f["start"]) + 1))
+            body_line += data.count(b"\n", f["start"], f["end"]) + 2   # 区切りの空行
+    return segs
@@ -0,0 +1,389 @@
+# framescan.py — \begin{frame} ～ \end{frame} を1パスで走査するフレームスキャナ
+#
+# 正規表現（DOTALL の最短一致）の代わりに、TeX のコメント・verbatim 系環境・
+# フレームのオプションを理解しながら先頭から順に1回だけ読む。
+#   - % 以降の行末まではコメントとして無視（\% は除く）
+#   - minted / verbatim / lstlisting などの中身は \end{<同じ環境>} まで読み飛ばす
+#   - \begin{frame}[opts]<overlay>{title}{subtitle} を解析
+#   - \againframe{label} は本文を持たないフレームとして記録
+from __future__ import annotations
+from bisect import bisect_right, insort
+from itertools import accumulate, repeat
+from operator import add
+from typing import NamedTuple
+import re
+
+VERBATIM_ENVS = frozenset({
+    "verbatim", "verbatim*", "Verbatim", "Verbatim*", "BVerbatim", "LVerbatim",
+    "minted", "lstlisting", "comment", "filecontents", "filecontents*",
+})
+
+class Frame(NamedTuple):
+    start: int              # \begin{frame} の先頭（\againframe の場合はその先頭）
+    end: int                # \end{frame} の直後
+    title: str
+    label: str
+    fragile: bool
+    options: str            # [...] の中身
+    again: bool = False     # \againframe
+
+BEGIN_FRAME = r"\begin{frame}"
+END_FRAME = r"\end{frame}"
+AGAIN_FRAME = r"\againframe"
+
+_VENVS = "|".join(re.escape(e) for e in sorted(VERBATIM_ENVS, key=len, reverse=True))
+_VERB_BEGIN = re.compile(rf"\\begin[ \t]*\{{({_VENVS})\}}")
+# \begin{frame} 直後の単純な見出し（[opts] と {title} に入れ子がない場合）
+_HDR = re.compile(r"(?:[ \t]*<[^>\n]*>)?(?:[ \t]*\[([^\[\]{}\n]*)\])?(?:[ \t]*<[^>\n]*>)?"
+                  r"[ \t]*\n?[ \t]*\{([^{}\\%\n]*)\}")
+_LINE_HAZARD = re.compile(r"%|\\verb")
+_LONG_LINE = 1024           # これより長い行はコメントの範囲を覚えておく
+# 行内のコメント（% から行末）と \verb の引数（閉じ忘れは行末まで）。\\ と \% は読み飛ばすだけ
+_COMMENT_TOKEN = re.compile(r"(?P<esc>\\[\\%])|%.*|\\verb(?![^\W\d_])\*?(?:(?P<d>.).*?(?:(?P=d)|$)|$)",
+                            re.MULTILINE)
+_SIMPLE_ARG = re.compile(r"[ \t]*\{([^{}\\%\n]*)\}")
+
+def _run(p: str, stops: str) -> str:
+    r"""コメント・\verb・verbatim 系環境を読み飛ばしながら、stops の語の \ の手前まで進む正規表現。
+
+    各要素は先頭の文字で決まり、\verb と verbatim 系環境は先読み＋後方参照で後戻りさせないので、
+    照合に失敗しても長さに比例する時間で済む。p は名前付きグループの接頭辞。
+    """
+    verb = (rf"(?=(?P<{p}v>\\verb(?![^\W\d_])\*?(?:(?P<{p}d>[^\n])(?:(?!(?P={p}d))[^\n])*"
+            rf"(?:(?P={p}d)|(?=\n|\Z))|(?=\n|\Z))))(?P={p}v)")
+    venv = (rf"(?=(?P<{p}e>\\begin[ \t]*\{{(?P<{p}n>{_VENVS})\}}[\s\S]*?\\end\{{(?P={p}n)\}}))"
+            rf"(?P={p}e)")
+    special = "|".join([
+        r"%[^\n]*(?=\n|\Z)",
+        # \\ の直後が stops なら、str.find で探していた頃と同じく2つ目の \ から語とみなす
+        rf"\\\\(?!{stops})",
+        r"\\%",
+        verb,
+        venv,
+        rf"\\(?!{stops}|verb(?![^\W\d_])|%|\\(?!{stops}))",
+    ])
+    return rf"[^\\%]*(?:(?:{special})[^\\%]*)*"
+
+_VENV_BEGIN = rf"begin[ \t]*\{{(?:{_VENVS})\}}"
+# 前のフレームの後ろから次のフレームの \end{frame} までを1回の照合で読む。
+# 見出しが単純でない・本文の最初の \label の引数が単純でない・閉じていない verbatim 系環境や
+# \againframe がある、などの場合はフレームの部分が合わず、そこから1フレームだけ候補ごとに調べる
+_FAST = re.compile(
+    _run("g", rf"begin\{{frame\}}|againframe|{_VENV_BEGIN}")
+    + r"(?:(?P<b>\\begin\{frame\})"
+    r"(?:[ \t]*<[^>\n%\\]*>)?(?:[ \t]*\[(?P<opts>[^\[\]{}\n%\\]*)\])?(?:[ \t]*<[^>\n%\\]*>)?"
+    r"[ \t]*\n?[ \t]*\{(?P<title>[^{}\\%\n]*)\}"
+    + _run("b", rf"begin\{{frame\}}|end\{{frame\}}|label(?![^\W\d_])|{_VENV_BEGIN}")
+    + r"(?:\\label[ \t]*\{(?P<label>[^{}\\%\n]*)\}"
+    + _run("a", rf"begin\{{frame\}}|end\{{frame\}}|{_VENV_BEGIN}")
+    + r")?\\end\{frame\})?")
+
+def _comment_checker(tex: str):
+    r"""pos が行内のコメント（エスケープされていない % 以降）か \verb の中にあるかを返す関数。
+
+    候補のある行を読んでその行の範囲を求める。長い行は覚えておいて読み直さないので、
+    1行にフレームが並んでいても線形時間。
+    """
+    long_lines: dict[int, tuple[int, int, list[int], list[int]]] = {}   # 行頭 → 行の範囲
+    heads: list[int] = []       # long_lines の行頭（昇順）
+    last = (0, -1, [], [])      # 直前に読んだ行（行頭, 行末, 範囲の開始, 範囲の終了）
+
+    def in_comment(pos: int) -> bool:
+        nonlocal last
+        ls, le, starts, ends = last
+        if not ls <= pos <= le:
+            k = bisect_right(heads, pos) - 1
+            if k >= 0 and pos <= long_lines[heads[k]][1]:
+                last = long_lines[heads[k]]
+            else:
+                ls = tex.rfind("\n", 0, pos) + 1
+                le = tex.find("\n", pos)
+                le = len(tex) if le < 0 else le
+                starts, ends = [], []
+                if _LINE_HAZARD.search(tex, ls, le):
+                    for m in _COMMENT_TOKEN.finditer(tex, ls, le):
+                        if not m.group("esc"):
+                            starts.append(m.start() + 1)
+                            ends.append(m.end())
+                last = (ls, le, starts, ends)
+                if le - ls > _LONG_LINE:
+                    insort(heads, ls)
+                    long_lines[ls] = last
+            ls, le, starts, ends = last
+        if not starts:
+            return False
+        j = bisect_right(starts, pos) - 1
+        return j >= 0 and pos < ends[j]
+
+    return in_comment
+
+def _verbatim_spans(tex: str, in_comment) -> list[tuple[int, int]]:
+    r"""verbatim 系環境の (開始, 終了) を出現順に返す。中の \end{frame} や % は無視される。"""
+    spans = []
+    i = 0
+    while True:
+        m = _VERB_BEGIN.search(tex, i)
+        if not m:
+            return spans
+        if in_comment(m.start()):
+            i = m.end()
+            continue
+        close = tex.find(f"\\end{{{m.group(1)}}}", m.end())
+        end = len(tex) if close < 0 else close + len(m.group(1)) + 6
+        spans.append((m.start(), end))
+        i = end
+
+def _skip_ws(tex: str, i: int, n: int | None = None) -> int:
+    n = len(tex) if n is None else n
+    while i < n:
+        c = tex[i]
+        if c in " \t\r\n":
+            i += 1
+        elif c == "%":
+            j = tex.find("\n", i, n)
+            i = n if j < 0 else j + 1
+        else:
+            break
+    return i
+
+def _group(tex: str, i: int, open_ch: str, close_ch: str, n: int | None = None) -> tuple[str, int] | None:
+    """tex[i] が open_ch ならその引数の中身と直後の位置を返す。{} の入れ子とコメントを考慮。"""
+    n = len(tex) if n is None else n
+    if i >= n or tex[i] != open_ch:
+        return None
+    depth = 1 if open_ch == "{" else 0
+    j = i + 1
+    while j < n:
+        c = tex[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "%":
+            k = tex.find("\n", j, n)
+            j = n if k < 0 else k + 1
+            continue
+        if c == "{":
+            depth += 1
+        elif c == "}":
+            depth -= 1
+            if open_ch == "{" and depth == 0:
+                return tex[i + 1:j], j + 1
+        elif c == close_ch and depth == 0:
+            return tex[i + 1:j], j + 1
+        j += 1
+    return None
+
+def _frame_args(tex: str, i: int, n: int) -> tuple[str, str, int]:
+    r"""\begin{frame} 直後の [opts] <overlay> {title} を n より手前で読み、(opts, title, 本文開始位置)。"""
+    opts = ""
+    title = ""
+    j = _skip_ws(tex, i, n)
+    if j < n and tex[j] == "<":
+        k = tex.find(">", j, n)
+        if k > 0:
+            j = _skip_ws(tex, k + 1, n)
+    g = _group(tex, j, "[", "]", n)
+    if g:
+        opts, j = g
+        i = j
+        j = _skip_ws(tex, j, n)
+    if j < n and tex[j] == "<":
+        k = tex.find(">", j, n)
+        if k > 0:
+            i = k + 1
+            j = _skip_ws(tex, i, n)
+    g = _group(tex, j, "{", "}", n)
+    if g:
+        title, i = g
+    return opts, title.strip(), i
+
+def _option_label(opts: str) -> str:
+    m = re.search(r"(?:^|,)\s*label\s*=\s*([^,\]]+)", opts)
+    return m.group(1).strip() if m else ""
+
+def _is_fragile(opts: str) -> bool:
+    return any(o.strip().split("=")[0] == "fragile" for o in opts.split(","))
+
+def _find_field(tex: str, name: str, start: int, end: int, dead) -> str:
+    # 本文中で最初の（コメント・verbatim 外の）\name{...} の中身
+    cs = "\\" + name
+    k = tex.find(cs, start, end)
+    while k >= 0:
+        after = k + len(cs)
+        if not tex[after:after + 1].isalpha() and not dead(k):
+            m = _SIMPLE_ARG.match(tex, after)
+            if m:
+                return m.group(1).strip()
+            g = _group(tex, _skip_ws(tex, after), "{", "}")
+            if g:
+                return g[0].strip()
+        k = tex.find(cs, after, end)
+    return ""
+
+def _againframe(tex: str, at: int, i: int) -> Frame | None:
+    # \againframe<overlay>[opts]{label}
+    n = len(tex)
+    k = _skip_ws(tex, i)
+    if k < n and tex[k] == "<":
+        e = tex.find(">", k)
+        k = _skip_ws(tex, e + 1) if e > 0 else k
+    opts = ""
+    g = _group(tex, k, "[", "]")
+    if g:
+        opts, k = g
+        k = _skip_ws(tex, k)
+    g = _group(tex, k, "{", "}")
+    if not g:
+        return None
+    return Frame(at, g[1], "", g[0].strip(), False, opts, again=True)
+
+def scan_frames(tex: str) -> list[Frame]:
+    r"""tex 中のフレームを出現順に返す。入れ子のフレームは想定しない。
+
+    区切りがどれも生きていれば _layout の位置から各フレームを読む。そうでなければ、ふつうの
+    フレームは _FAST の1回の照合で読み、合わないところだけ \begin{frame} / \end{frame} を
+    str.find で探して候補ごとにコメント・\verb・verbatim 系環境の中でないかを確かめる。
+    閉じ忘れたフレームは次の \begin{frame} で打ち切るので全体で線形時間。
+    """
+    has_again = AGAIN_FRAME in tex
+    layout = None if has_again else _layout(tex)
+    if layout is not None:
+        starts, ends, spans = layout
+        dead = _dead_checker(spans, _comment_checker(tex))
+        return [_read_frame(tex, b, e, dead) for b, e in zip(starts, ends)]
+
+    n = len(tex)
+    frames: list[Frame] = []
+    dead = None
+    i = 0
+    while True:
+        m = _FAST.match(tex, i)
+        b = m.start("b")
+        if b >= 0:
+            title = m.group("title").strip()
+            if title:
+                opts = m.group("opts") or ""
+                label = _option_label(opts) if opts else ""
+                if not label:
+                    label = (m.group("label") or "").strip()
+                frames.append(Frame(b, m.end(), title, label, bool(opts) and _is_fragile(opts), opts))
+                i = m.end()
+                continue
+            at = b      # タイトルが \frametitle にあるフレームは候補ごとに調べる
+        else:
+            at = m.end()
+            if at >= n:
+                return frames
+        if dead is None:
+            in_comment = _comment_checker(tex)
+            dead = _dead_checker(_verbatim_spans(tex, in_comment), in_comment)
+        i = _scan_one(tex, at, dead, has_again, frames)
+        if i < 0:
+            return frames
+
+def _layout(tex: str) -> tuple[list[int], list[int], list[tuple[int, int]]] | None:
+    r"""\begin{frame} と \end{frame} がどれもコメント・verbatim 系環境の外にあって交互に並ぶなら
+    (各フレームの開始, 終了, verbatim 系環境の範囲)、そうでなければ None（\verb があるときも）。
+
+    区切りの位置と区切りのある行の % は str.split・str.find と累積和で求めるので、フレームごとに
+    Python の処理を回さない。
+    """
+    if "\\verb" in tex:
+        return None
+    parts = tex.split(BEGIN_FRAME)
+    n = len(parts) - 1
+    close = list(map(str.find, parts, repeat(END_FRAME)))      # 各フレームの \end{frame}（parts 内の位置）
+    if tex.count(END_FRAME) != n or -1 in close[1:]:
+        return None
+    pct = tex.count("%")
+    if pct and (pct != tex.count("\\%") or "\\\\%" in tex):
+        # エスケープされていない % があるなら、区切りの手前（同じ行）に % がないこと
+        line = map(add, map(str.rfind, parts[1:], repeat("\n"), repeat(0), close[1:]), repeat(1))
+        if max(map(str.find, parts[1:], repeat("%"), line, close[1:]), default=-1) >= 0:
+            return None
+        line = list(map(max, map(add, map(str.rfind, parts, repeat("\n")), repeat(1)),
+                        map(add, close, repeat(len(END_FRAME)))))
+        line[0] = parts[0].rfind("\n") + 1
+        if max(map(str.find, parts[:-1], repeat("%"), line), default=-1) >= 0:
+            return None
+    spans = []
+    if tex.count("\\begin") != n:
+        spans = _verbatim_spans(tex, _comment_checker(tex))
+        if any(tex.find(BEGIN_FRAME, s, e) >= 0 or tex.find(END_FRAME, s, e) >= 0 for s, e in spans):
+            return None
+    w = len(BEGIN_FRAME)
+    heads = list(accumulate(map(w.__add__, map(len, parts[:-1]))))     # 各 \begin{frame} の直後
+    starts = list(map(w.__rsub__, heads))
+    ends = list(map(add, heads, map(len(END_FRAME).__add__, close[1:])))
+    return starts, ends, spans
+
+def _dead_checker(spans: list[tuple[int, int]], in_comment):
+    starts = [s for s, _ in spans]
+
+    def dead(pos: int) -> bool:
+        if spans:
+            k = bisect_right(starts, pos) - 1
+            if k >= 0 and pos < spans[k][1]:
+                return True
+        return in_comment(pos)
+
+    return dead
+
+def _read_frame(tex: str, b: int, end: int, dead) -> Frame:
+    # b の \begin{frame} から end（\end{frame} の直後）までのフレームの見出しと \label を読む
+    h = b + len(BEGIN_FRAME)
+    e = end - len(END_FRAME)
+    m = _HDR.match(tex, h, e)
+    if m:
+        opts, title, body_at = m.group(1) or "", m.group(2).strip(), m.end()
+    else:
+        opts, title, body_at = _frame_args(tex, h, e)
+    if not title:
+        title = _find_field(tex, "frametitle", body_at, e, dead)
+    label = _option_label(opts) if opts else ""
+    if not label:
+        label = _find_field(tex, "label", body_at, e, dead)
+    return Frame(b, end, title, label, bool(opts) and _is_fragile(opts), opts)
+
+def _scan_one(tex: str, i: int, dead, has_again: bool, frames: list[Frame]) -> int:
+    # i 以降の次のフレームを候補ごとに調べて読み、続きの位置を返す（もう無ければ -1）
+    n = len(tex)
+    b = _next_live(tex, BEGIN_FRAME, i, n, dead)
+    if has_again:
+        _scan_again(tex, i, n if b < 0 else b, dead, frames)
+    if b < 0:
+        return -1
+    # 対応する \end{frame} は次の生きた \begin{frame} より手前でだけ探す（なければ閉じ忘れ）。
+    # 見出しはその \end{frame} より手前で読む
+    h = b + len(BEGIN_FRAME)
+    nb = _next_live(tex, BEGIN_FRAME, h, n, dead)
+    limit = n if nb < 0 else nb
+    e = _next_live(tex, END_FRAME, h, limit, dead)
+    if e < 0:
+        return limit
+    end = e + len(END_FRAME)
+    frames.append(_read_frame(tex, b, end, dead))
+    return end
+
+def _next_live(tex: str, word: str, start: int, end: int, dead) -> int:
+    k = tex.find(word, start, end)
+    while k >= 0 and dead(k):
+        k = tex.find(word, k + len(word), end)
+    return k
+
+def _scan_again(tex: str, start: int, end: int, dead, frames: list[Frame]) -> None:
+    # フレームの外側にある \againframe を拾う
+    k = tex.find(AGAIN_FRAME, start, end)
+    while k >= 0:
+        if not tex[k + len(AGAIN_FRAME):k + len(AGAIN_FRAME) + 1].isalpha() and not dead(k):
+            f = _againframe(tex, k, k + len(AGAIN_FRAME))
+            if f:
+                frames.append(f)
+        k = tex.find(AGAIN_FRAME, k + len(AGAIN_FRAME), end)
+
+def frame_positions(tex: str) -> list[tuple[int, int]]:
+    """従来の find_frame_positions 互換: 本文を持つフレームの (start, end)。"""
+    layout = _layout(tex)
+    if layout is not None:
+        return list(zip(layout[0], layout[1]))
+    return [(f.start, f.end) for f in scan_frames(tex) if not f.again]
@@ -0,0 +1,128 @@
+# graphicsref.py — \includegraphics の参照を LuaLaTeX の前に解決する（画像のプリフライト）
+#
+# テンプレートの \graphicspath（images/・授業の images/・project_assets/images/）を
+# 1回だけ解釈し、ディレクトリ一覧（mtime が変わるまでプロセス内でキャッシュ）と
+# 突き合わせて各参照を具体的なパスに書き換える。TeX 側で毎回3か所を探させずに済み、
+# 見つからない画像は長いコンパイルの後ではなくビルド開始前にわかる。
+# 拡張子を省いた参照は graphicx と同じ順（拡張子ごとに全ディレクトリ）で探し、
+# まる.png と まる.jpg のように候補が複数あるものは警告する。
+from __future__ import annotations
+from bisect import bisect_right
+from pathlib import Path
+from typing import NamedTuple
+import os
+import re
+
+# luatex（pdftex.def）の \DeclareGraphicsExtensions と同じ順
+EXTS = (".pdf", ".png", ".jpg", ".mps", ".jpeg", ".jbig2", ".jb2",
+        ".PDF", ".PNG", ".JPG", ".JPEG", ".JBIG2", ".JB2")
+
+_GRAPHICSPATH = re.compile(r"\\graphicspath\s*\{((?:\s*\{[^}]*\})*)\s*\}")
+_INCLUDE = re.compile(r"(\\includegraphics\s*\*?\s*(?:\[[^\]]*\]\s*){0,2}\{)([^{}]*)(\})")
+# 中身を TeX として読まない環境（コード例の \includegraphics は書き換えない）
+_VERBATIM = re.compile(r"\\begin\{(minted|verbatim|Verbatim|lstlisting|comment)\*?\}.*?\\end\{\1\*?\}",
+                       re.DOTALL)
+
+class Issue(NamedTuple):
+    line: int           # 本文中の行（1 始まり）
+    name: str
+    kind: str           # "missing" / "ambiguous"
+    candidates: tuple[str, ...]
+
+_listings: dict[Path, tuple[int, dict[str, int]]] = {}
+
+def listing(d: Path) -> dict[str, int]:
+    """ディレクトリ内のファイル名 → サイズ（mtime が同じ間は読み直さない）。"""
+    try:
+        mtime = d.stat().st_mtime_ns
+    except OSError:
+        return {}
+    hit = _listings.get(d)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    files = {}
+    with os.scandir(d) as it:
+        for e in it:
+            try:
+                if e.is_file():
+                    files[e.name] = e.stat().st_size
+            except OSError:
+                pass
+    _listings[d] = (mtime, files)
+    return files
+
+def search_path(tex_head: str) -> list[str]:
+    """テンプレートの \\graphicspath のディレクトリ（書かれたままの文字列）。"""
+    for m in _GRAPHICSPATH.finditer(tex_head):
+        ls = tex_head.rfind("\n", 0, m.start()) + 1
+        if "%" not in tex_head[ls:m.start()]:
+            return re.findall(r"\{([^}]*)\}", m.group(1))
+    return []
+
+def resolve(name: str, dirs: list[tuple[str, Path]]) -> list[str]:
+    """参照名の候補（TeX に渡すパス）を graphicx が選ぶ順に返す。先頭が実際に使われる。"""
+    rel = Path(name)
+    # 拡張子つきでそのファイルがあればそれ、無ければ拡張子を補って探す（graphicx と同じ）
+    for exts in ((("",) if rel.suffix else ()), EXTS):
+        found = []
+        for ext in exts:
+            fname = rel.name + ext
+            for prefix, d in dirs:
+                if fname in listing(d / rel.parent):
+                    found.append(prefix + (rel.parent / fname).as_posix())
+        if found:
+            return found
+    return []
+
+def _distinct(cands: list[str], build_dir: Path) -> bool:
+    # 拡張子違い、または同名でも中身（サイズ）が違うものがあれば曖昧
+    if len({Path(c).suffix for c in cands}) > 1:
+        return True
+    sizes = set()
+    for c in cands:
+        p = Path(os.path.normpath(build_dir / c))
+        sizes.add(listing(p.parent).get(p.name))
+    return len(sizes) > 1
+
+def rewrite(body: str, tex_head: str, build_dir: Path, derive=None) -> tuple[str, list[Issue]]:
+    """本文の \\includegraphics を具体的なパスに書き換え、問題のある参照を返す。
+
+    build_dir は main.tex を置くディレクトリ（\\graphicspath はここからの相対パス）。
+    derive(オプション, パス) が文字列を返せばそのパスに差し替える（imageopt の縮小画像）。
+    書き換えは1行の中で収まるので行数は変わらない。
+    """
+    dirs = []
+    for entry in search_path(tex_head):
+        d = Path(os.path.normpath(build_dir / entry))
+        dirs.append((entry if entry.endswith("/") or not entry else entry + "/", d))
+    skip = [m.span() for m in _VERBATIM.finditer(body)]
+    issues: list[Issue] = []
+
+    def sub(m: re.Match) -> str:
+        ls = body.rfind("\n", 0, m.start()) + 1
+        if re.search(r"(?<!\\)%", body[ls:m.start()]) or any(a <= m.start() < b for a, b in skip):
+            return m.group(0)
+        name = m.group(2).strip()
+        if not name or "\\" in name or "#" in name or os.path.isabs(name):
+            return m.group(0)       # マクロ入り・絶対パスは TeX に任せる
+        if (build_dir / name).is_file():
+            return m.group(0)       # ビルドディレクトリ直下（\graphicspath より先に見つかる）
+        cands = resolve(name, dirs)
+        line = body.count("\n", 0, m.start()) + 1
+        if not cands:
+            issues.append(Issue(line, name, "missing", ()))
+            return m.group(0)
+        if len(cands) > 1 and _distinct(cands, build_dir):
+            issues.append(Issue(line, name, "ambiguous", tuple(cands)))
+        path = cands[0]
+        if derive:
+            path = derive(",".join(re.findall(r"\[([^\]]*)\]", m.group(1))), path) or path
+        return m.group(1) + path + m.group(3)
+
+    return _INCLUDE.sub(sub, body), issues
+
+def content_line(line: int, segments: list[tuple[int, int]]) -> int:
+    """本文の行 → content.tex の行（segments は frameindex.line_segments の形式）。"""
+    starts = [s for s, _ in segments]
+    k = max(0, bisect_right(starts, line) - 1)
+    return segments[k][1] + (line - segments[k][0])
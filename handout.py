@@ -0,0 +1,223 @@
+# handout.py — ビルド済みの PDF を N-up の配布資料に面付けする（content.tex は再コンパイルしない）
+#
+#   python handout.py 2021901 [07 08 ...] [--layout 4up,3up-notes] [--source auto|ho|pr] [-j N]
+#
+# 授業ディレクトリにある {授業}_{タイトル}.pdf（ハンドアウト、無ければ _pr）を元に、
+# graphicx で各ページを並べただけの小さな文書を lualatex で1パス組み、
+# {授業}_{タイトル}_{レイアウト}.pdf として配置する。
+# レイアウトは LAYOUTS の名前か「列x行[+notes][+landscape]」（例: 2x3, 1x3+notes）。
+# +notes はスライドを左に寄せ、右側にメモ用の罫線を引く。
+# 結果は元 PDF の sha256 とレイアウトごとに .cache/handout/ に置き、元が変わらなければ組み直さない。
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import argparse
+import hashlib
+import math
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import buildcache
+import pdftools
+import publish
+import slideinfo
+
+VERSION = 1         # 面付けの内容を変えたら上げる（キャッシュキーに入る）
+
+# 名前 → 列数・行数・メモ欄・横向き（用紙は A4）
+LAYOUTS = {
+    "2up":       {"cols": 1, "rows": 2, "notes": False, "landscape": False},
+    "4up":       {"cols": 2, "rows": 2, "notes": False, "landscape": False},
+    "6up":       {"cols": 2, "rows": 3, "notes": False, "landscape": False},
+    "2up-notes": {"cols": 1, "rows": 2, "notes": True,  "landscape": False},
+    "3up-notes": {"cols": 1, "rows": 3, "notes": True,  "landscape": False},
+}
+
+A4 = (210.0, 297.0)     # mm
+MARGIN = 10.0
+GAP = 6.0
+FOOTER = 6.0
+NOTE_SHARE = 0.55       # メモ欄つきのとき、セル幅のうちスライドに使う割合
+LINE_PITCH = 8.0        # メモ欄の罫線の間隔
+
+_SPEC = re.compile(r"(\d)x(\d)((?:\+notes|\+landscape)*)")
+
+def parse_layout(spec: str) -> dict:
+    """レイアウト名か「列x行[+notes][+landscape]」を辞書にする（"name" にファイル名用の表記）。"""
+    if spec in LAYOUTS:
+        return {"name": spec, **LAYOUTS[spec]}
+    m = _SPEC.fullmatch(spec)
+    if not m or int(m[1]) < 1 or int(m[2]) < 1:
+        raise argparse.ArgumentTypeError(
+            f"レイアウトは {', '.join(LAYOUTS)} か 列x行[+notes][+landscape] で指定してください: {spec}")
+    return {"name": spec, "cols": int(m[1]), "rows": int(m[2]),
+            "notes": "+notes" in m[3], "landscape": "+landscape" in m[3]}
+
+def parse_layouts(spec: str) -> list[dict]:
+    names = list(dict.fromkeys(s.strip() for s in spec.split(",") if s.strip()))
+    if not names:
+        raise argparse.ArgumentTypeError("レイアウトを指定してください")
+    return [parse_layout(s) for s in names]
+
+def cache_dir(root: Path) -> Path:
+    return root / ".cache" / "handout"
+
+def page_count(pdf: Path) -> int:
+    qpdf = pdftools.require("qpdf")
+    res = pdftools.run_tool([qpdf, "--show-npages", str(pdf)])
+    try:
+        return int(res.stdout.split()[0])
+    except (IndexError, ValueError):
+        print(f"❌ ページ数を読めません: {pdf}", file=sys.stderr)
+        sys.exit(1)
+
+def _mm(v: float) -> str:
+    return f"{v:.2f}"
+
+def impose_tex(layout: dict, pages: int, src_name: str = "src.pdf") -> str:
+    """pages ページの src_name を layout で並べる LaTeX 文書。"""
+    pw, ph = (A4[1], A4[0]) if layout["landscape"] else A4
+    cols, rows = layout["cols"], layout["rows"]
+    cw = (pw - 2 * MARGIN - (cols - 1) * GAP) / cols
+    ch = (ph - 2 * MARGIN - FOOTER - (rows - 1) * GAP) / rows
+    sw = cw * NOTE_SHARE if layout["notes"] else cw
+    per = cols * rows
+    sheets = math.ceil(pages / per)
+
+    out = [r"\documentclass{article}",
+           rf"\usepackage[paperwidth={_mm(pw)}mm,paperheight={_mm(ph)}mm,margin=0mm]{{geometry}}",
+           r"\usepackage{graphicx}",
+           r"\usepackage{xcolor}",
+           r"\pagestyle{empty}",
+           r"\setlength{\parindent}{0pt}",
+           r"\setlength{\topskip}{0pt}",
+           r"\setlength{\unitlength}{1mm}",
+           r"\setlength{\fboxsep}{0pt}",
+           r"\setlength{\fboxrule}{0.2pt}",
+           r"\begin{document}"]
+    # 大きさ 0 の picture をページ左上に置き、下向きを負の y で描く
+    for s in range(sheets):
+        out.append(r"\begin{picture}(0,0)")
+        for k in range(per):
+            n = s * per + k + 1
+            if n > pages:
+                break
+            x = MARGIN + (k % cols) * (cw + GAP)
+            y = MARGIN + (k // cols) * (ch + GAP)
+            # メモ欄つきはセルの上端に揃え、なしは中央に置く
+            pos = "[tl]" if layout["notes"] else ""
+            out.append(rf"\put({_mm(x)},{_mm(-(y + ch))}){{\makebox({_mm(sw)},{_mm(ch)}){pos}{{"
+                       rf"\fbox{{\includegraphics[page={n},width={_mm(sw)}mm,height={_mm(ch)}mm,"
+                       rf"keepaspectratio]{{{src_name}}}}}}}}}")
+            if layout["notes"]:
+                lx = x + sw + GAP
+                nlines = int(ch // LINE_PITCH)
+                out.append(rf"{{\color{{black!35}}\linethickness{{0.3pt}}"
+                           rf"\multiput({_mm(lx)},{_mm(-(y + LINE_PITCH))})(0,{_mm(-LINE_PITCH)}){{{nlines}}}"
+                           rf"{{\line(1,0){{{_mm(x + cw - lx)}}}}}}}")
+        out.append(rf"\put({_mm(pw / 2)},{_mm(-(ph - MARGIN / 2 - FOOTER / 2))})"
+                   rf"{{\makebox(0,0){{\footnotesize {s + 1} / {sheets}}}}}")
+        out.append(r"\end{picture}")
+        out.append(r"\newpage")
+    out.append(r"\end{document}")
+    return "\n".join(out) + "\n"
+
+def impose(src: Path, layout: dict, root: Path) -> Path:
+    """src を layout で面付けした PDF（キャッシュ内のパス）を返す。失敗時は sys.exit(1)。"""
+    d = cache_dir(root)
+    d.mkdir(parents=True, exist_ok=True)
+    key = hashlib.sha256(f"{buildcache.sha256_file(src)}|{sorted(layout.items())}|v{VERSION}"
+                         .encode("utf-8")).hexdigest()[:32]
+    out = d / f"{key}.pdf"
+    if out.exists():
+        print(f"♻ 面付け済み: {src.name} [{layout['name']}]")
+        return out
+
+    lualatex = pdftools.require("lualatex")
+    work = Path(tempfile.mkdtemp(prefix="work-", dir=d))
+    try:
+        # 日本語のファイル名を TeX に渡さないよう、作業ディレクトリに src.pdf として置く
+        try:
+            os.link(src, work / "src.pdf")
+        except OSError:
+            shutil.copyfile(src, work / "src.pdf")
+        (work / "handout.tex").write_text(impose_tex(layout, page_count(src)), encoding="utf-8")
+        try:
+            res = subprocess.run([lualatex, "-interaction=nonstopmode", "-halt-on-error", "handout.tex"],
+                                 cwd=work, capture_output=True, text=True, timeout=120)
+        except subprocess.TimeoutExpired:
+            print(f"❌ 面付けがタイムアウトしました: {src.name} [{layout['name']}]", file=sys.stderr)
+            sys.exit(1)
+        pdf = work / "handout.pdf"
+        if res.returncode != 0 or not pdf.exists():
+            print(f"❌ 面付け失敗: {src.name} [{layout['name']}]\n{res.stdout[-3000:]}", file=sys.stderr)
+            sys.exit(1)
+        os.replace(pdf, out)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+    print(f"📄 面付け: {src.name} [{layout['name']}]")
+    return out
+
+def source_pdf(subject: str, course: str, source: str) -> Path | None:
+    """面付けの元にする配置済み PDF（auto はハンドアウト、無ければ _pr）。"""
+    import build_slides
+    app_dir = Path(__file__).parent.parent / slideinfo.slidedir(subject, course)
+    info = {"course": course, "title": slideinfo.slidetitle(subject, course), "suffix_tag": None}
+    cands = {"ho": True, "pr": False} if source == "auto" else {source: source == "ho"}
+    for ho in cands.values():
+        p = app_dir / f"{build_slides.output_stem(info, ho, False)}.pdf"
+        if p.exists():
+            return p
+    return None
+
+def handout_course(subject: str, course: str, layouts: list[dict], source: str = "auto") -> list[Path]:
+    """1授業分の配布資料を layouts ごとに作って配置する。元の PDF が無ければ空。"""
+    src = source_pdf(subject, course, source)
+    if src is None:
+        print(f"⏭ {subject} {course}: 元の PDF がありません（先にビルドしてください）")
+        return []
+    root = Path(__file__).parent
+    pub = publish.Publisher(src.parent)
+    outputs = []
+    for layout in layouts:
+        pdf = impose(src, layout, root)
+        name = f"{src.stem}_{layout['name']}.pdf"
+        how = pub.put(pdf, name)
+        print(f"✅ 出力: {src.parent / name} {publish.describe(how)}")
+        outputs.append(src.parent / name)
+    return outputs
+
+def main():
+    ap = argparse.ArgumentParser(description="ビルド済みスライドの N-up 配布資料")
+    ap.add_argument("subject", help="科目コード")
+    ap.add_argument("courses", nargs="*", help="授業（省略時は科目の全授業）")
+    ap.add_argument("--layout", "-l", type=parse_layouts, default=parse_layouts("4up"),
+                    help=f"レイアウト（カンマ区切りで複数可）: {', '.join(LAYOUTS)} または 列x行[+notes][+landscape]")
+    ap.add_argument("--source", choices=["auto", "ho", "pr"], default="auto",
+                    help="元にする PDF（auto: ハンドアウト、無ければ _pr）")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="並列数")
+    args = ap.parse_args()
+
+    if args.subject not in slideinfo.slide_subjects():
+        print(f"❌ slideinfo.json に存在しない科目: {args.subject}", file=sys.stderr)
+        sys.exit(1)
+    courses = args.courses or slideinfo.slide_courses(args.subject)
+
+    # lualatex・qpdf はサブプロセスなのでスレッドで十分並列になる
+    done, failed = 0, []
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+        futs = {c: ex.submit(handout_course, args.subject, c, args.layout, args.source) for c in courses}
+        for c, fut in futs.items():
+            try:
+                done += len(fut.result())
+            except SystemExit:
+                failed.append(c)
+    print(f"完了: {done} 件" + (f" / 失敗: {', '.join(failed)}" if failed else ""))
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# highlight.py — minted ブロックを Python 側で Pygments にかけて差し込む前処理
+#
+# \begin{minted}[opts]{lang} ... \end{minted} と \inputminted[opts]{lang}{file} を探し、
+# Pygments の LatexFormatter で色付けした Verbatim（fvextra）を .cache/pyg/<hash>.tex に
+# 置いて \input に置き換える。キャッシュはコード・言語・オプション・Pygments の版で
+# 決まるので授業・バリアントをまたいで共有され、変わっていないコードは再処理しない。
+# 本文に minted の使用が残らなければ \usepackage{minted} を fvextra に差し替え、
+# \setminted は \fvset にする。これで -shell-escape が不要になる。
+# 置き換えは行数を保つ（texlog の行番号読み替えがずれないように）。
+# Pygments が無い環境や BUILD_SLIDES_MINTED=1 のときは何もしない（従来どおり minted）。
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import hashlib
+import json
+import os
+import re
+import textwrap
+
+try:
+    import pygments
+    from pygments.formatters import LatexFormatter
+    from pygments.lexers import get_lexer_by_name
+    from pygments.util import ClassNotFound
+except ImportError:  # Pygments が無ければ minted のまま
+    pygments = None
+
+POOL_MIN = 8        # 未キャッシュがこれ以上あればプロセスプールで並列に色付けする
+
+_BLOCK = re.compile(r"\\begin\{minted\}[ \t]*(?:\[([^\]]*)\])?[ \t]*\{([^}]*)\}(.*?)\\end\{minted\}",
+                    re.DOTALL)
+_INPUT = re.compile(r"\\inputminted[ \t]*(?:\[([^\]]*)\])?[ \t]*\{([^}]*)\}[ \t]*\{([^}]*)\}")
+_USEPKG = re.compile(r"^([ \t]*)\\usepackage(?:\[[^\]]*\])?\{minted\}", re.MULTILINE)
+_SETMINTED = re.compile(r"\\setminted[ \t]*\{((?:[^{}]|\{[^{}]*\})*)\}")
+_CODEDIR = re.compile(r"\\newcommand\{\\codedir\}\{([^}]*)\}")
+# 置き換えられなかった minted の機能（残っていれば minted と -shell-escape を残す）
+_MINTED_LEFT = re.compile(r"\\(?:begin\{minted\}|inputminted|mintinline|mint\b|newmint\w*|"
+                          r"usemintedstyle|setminted)")
+_SHELL = re.compile(r"\\usepackage(?:\[[^\]]*\])?\{minted\}|\\write18|\\ShellEscape|\\immediate\\write18")
+
+# fvextra の Verbatim にそのまま渡せる minted オプション
+VERB_KEYS = frozenset({
+    "frame", "framesep", "framerule", "rulecolor", "fontsize", "fontfamily", "fontseries",
+    "fontshape", "baselinestretch", "breaklines", "breakanywhere", "breakafter",
+    "breakbefore", "breaksymbolleft", "breaksymbolright", "breakindent", "numbers",
+    "numbersep", "firstnumber", "stepnumber", "xleftmargin", "xrightmargin", "gobble",
+    "tabsize", "obeytabs", "showspaces", "showtabs", "label", "labelposition",
+    "firstline", "lastline", "resetmargins", "samepage", "numberblanklines",
+})
+
+def enabled() -> bool:
+    return pygments is not None and os.environ.get("BUILD_SLIDES_MINTED") != "1"
+
+def cache_dir(root: Path) -> Path:
+    return root / ".cache" / "pyg"
+
+def _split_opts(s: str) -> dict[str, str]:
+    opts = {}
+    depth, cur = 0, ""
+    s = re.sub(r"(?<!\\)%[^\n]*", "", s or "")     # オプション中のコメント
+    for ch in s + ",":
+        if ch == "," and depth == 0:
+            k, _, v = cur.partition("=")
+            if k.strip():
+                opts[k.strip()] = v.strip() if _ else "true"
+            cur = ""
+            continue
+        depth += (ch == "{") - (ch == "}")
+        cur += ch
+    return opts
+
+def _job(code: str, lang: str, opts: dict[str, str]) -> dict:
+    """色付け1件分の指定（キャッシュキーはこの内容で決まる）。"""
+    if opts.get("autogobble") == "true":
+        code = textwrap.dedent(code)
+    verb = []
+    for k, v in opts.items():
+        if k == "linenos":
+            verb.append("numbers=left" if v == "true" else "numbers=none")
+        elif k in VERB_KEYS:
+            verb.append(k if v == "true" else f"{k}={v}")
+    fmt = {"style": opts.get("style", "default")}
+    if opts.get("mathescape") == "true":
+        fmt["mathescape"] = True
+    if "escapeinside" in opts:
+        fmt["escapeinside"] = opts["escapeinside"].strip("{}")
+    return {"code": code, "lang": lang.strip(), "verb": ",".join(verb), "fmt": fmt}
+
+def job_key(job: dict) -> str:
+    raw = json.dumps([pygments.__version__, job], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+def render(job: dict) -> str:
+    try:
+        lexer = get_lexer_by_name(job["lang"], stripnl=False, ensurenl=True)
+    except ClassNotFound:
+        lexer = get_lexer_by_name("text", stripnl=False, ensurenl=True)
+    f = LatexFormatter(verboptions=job["verb"], **job["fmt"])
+    return pygments.highlight(job["code"], lexer, f)
+
+def _store(path: Path, text: str) -> None:
+    tmp = path.with_suffix(f".tmp{os.getpid()}")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+def _render_to(job: dict, path: str) -> None:
+    _store(Path(path), render(job))
+
+def style_file(root: Path, style: str) -> str:
+    """\\PY マクロ定義（スタイルごと）を用意して build ディレクトリからの相対パスを返す。"""
+    d = cache_dir(root)
+    name = f"style-{style}-{pygments.__version__}.tex"
+    if not (d / name).exists():
+        d.mkdir(parents=True, exist_ok=True)
+        _store(d / name, LatexFormatter(style=style).get_style_defs())
+    return f"../.cache/pyg/{name}"
+
+def _in_comment(tex: str, pos: int) -> bool:
+    ls = tex.rfind("\n", 0, pos) + 1
+    return re.search(r"(?<!\\)%", tex[ls:pos]) is not None
+
+def _resolve_input(name: str, codedir: str, root: Path) -> Path | None:
+    # build ディレクトリ基準で探し、無ければ授業ディレクトリの親（プロジェクト直下）基準でも探す
+    # （テンプレートの \codedir は "../<sdir>/" なので後者で見つかる）
+    name = re.sub(r"\\codedir(?:\{\})?\s*", lambda _: codedir, name.strip())
+    if "\\" in name:
+        return None
+    for base in (root / "build", root.parent / "build"):
+        p = (base / name).resolve()
+        if p.is_file():
+            return p
+    return None
+
+def prerender(tex: str, root: Path) -> str:
+    """main.tex 全文を受け取り、minted ブロックを色付け済みの \\input に置き換えた全文を返す。"""
+    if not enabled() or "minted" not in tex:
+        return tex
+    m = _CODEDIR.search(tex)
+    codedir = m.group(1) if m else ""
+    global_opts = {}
+    for sm in _SETMINTED.finditer(tex):
+        global_opts.update(_split_opts(sm.group(1)))
+
+    d = cache_dir(root)
+    d.mkdir(parents=True, exist_ok=True)
+    todo: dict[str, dict] = {}
+    styles = set()
+
+    def place(job: dict) -> str:
+        key = job_key(job)
+        styles.add(job["fmt"]["style"])
+        if not (d / f"{key}.tex").exists():
+            todo[key] = job
+        return rf"\input{{../.cache/pyg/{key}.tex}}"
+
+    def sub_block(m: re.Match) -> str:
+        if _in_comment(m.string, m.start()):
+            return m.group(0)
+        code = m.group(3)
+        if code.startswith("\n"):
+            code = code[1:]
+        opts = {**global_opts, **_split_opts(m.group(1))}
+        pad = "%\n" * m.group(0).count("\n")
+        return pad + place(_job(code, m.group(2), opts))
+
+    def sub_input(m: re.Match) -> str:
+        if _in_comment(m.string, m.start()):
+            return m.group(0)
+        src = _resolve_input(m.group(3), codedir, root)
+        if src is None:
+            return m.group(0)       # 解決できないパスは minted に任せる
+        code = src.read_text(encoding="utf-8", errors="replace")
+        opts = {**global_opts, **_split_opts(m.group(1))}
+        return place(_job(code, m.group(2), opts))
+
+    out = _BLOCK.sub(sub_block, tex)
+    out = _INPUT.sub(sub_input, out)
+
+    # 未キャッシュ分だけ色付けする
+    if len(todo) >= POOL_MIN:
+        with ProcessPoolExecutor(max_workers=min(len(todo), os.cpu_count() or 1)) as ex:
+            list(ex.map(_render_to, todo.values(), [str(d / f"{k}.tex") for k in todo]))
+    else:
+        for k, job in todo.items():
+            _render_to(job, str(d / f"{k}.tex"))
+
+    # minted を使う記述が残っていなければパッケージを差し替える
+    probe = _USEPKG.sub("", _SETMINTED.sub("", out))
+    if not any(not _in_comment(probe, m.start()) for m in _MINTED_LEFT.finditer(probe)):
+        defs = "".join(rf"\input{{{style_file(root, s)}}}" for s in sorted(styles or {"default"}))
+        out = _USEPKG.sub(lambda m: m.group(1) + r"\usepackage{fvextra}" + defs, out, count=1)
+        out = _USEPKG.sub("", out)
+        out = _SETMINTED.sub(_fvset, out)
+    return out
+
+def _fvset(m: re.Match) -> str:
+    # \setminted{...} → \fvset{...}（Verbatim が知らないキーは落とし、行数は保つ）
+    keep = [f"{k}={v}" if v != "true" else k for k, v in _split_opts(m.group(1)).items()
+            if k in VERB_KEYS]
+    return r"\fvset{" + ",".join(keep) + "\n" * m.group(1).count("\n") + "}"
+
+def needs_shell_escape(tex: str) -> bool:
+    """コメント外に minted の読み込みや \\write18 が残っているか。"""
+    return any(not _in_comment(tex, m.start()) for m in _SHELL.finditer(tex))
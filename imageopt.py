@@ -0,0 +1,157 @@
+# imageopt.py — スライドに表示される大きさに合わせて画像を縮小・再圧縮する
+#
+# \includegraphics の width= / height=（cm・mm・pt・\textwidth の何倍 など）から表示サイズを
+# 求め、BUILD_SLIDES_IMAGE_DPI（既定 300dpi）を超える解像度の PNG/JPEG だけを縮小した
+# 派生画像を .cache/img/<元画像の sha256>-<幅>x<高さ>.<拡張子> に作り、main.tex から
+# そちらを参照させる。派生画像は元画像の中身と目標サイズで決まるので使い回される。
+# 大きさの指定が無い・scale= だけの参照は縮小すると表示サイズが変わるので触らない。
+# Pillow が無い環境や BUILD_SLIDES_IMAGE_DPI=0 のときは何もしない。
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import math
+import os
+import re
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow が無ければ元画像のまま
+    Image = None
+
+import buildcache
+
+POOL_MIN = 4            # 未作成の派生画像がこれ以上あればプロセスプールで作る
+SHRINK_BELOW = 0.9      # 縮小率がこれ未満のときだけ派生画像を作る
+RASTER = frozenset({".png", ".jpg", ".jpeg"})
+
+# beamer の aspectratio → 用紙サイズ (mm)
+PAPER_MM = {"169": (160, 90), "1610": (160, 100), "149": (140, 90), "141": (148.5, 105),
+            "54": (125, 100), "43": (128, 96), "32": (135, 90)}
+MARGIN_MM = 10          # beamer の左右・上下の余白（おおよそ）
+
+UNIT_IN = {"in": 1.0, "cm": 1 / 2.54, "mm": 1 / 25.4, "pt": 1 / 72.27, "bp": 1 / 72,
+           "pc": 12 / 72.27, "dd": 1238 / 1157 / 72.27, "cc": 12 * 1238 / 1157 / 72.27}
+_LEN = re.compile(r"^\s*([0-9]*\.?[0-9]*)\s*(?:(in|cm|mm|pt|bp|pc|dd|cc)|\\(\w+))\s*$")
+
+def dpi() -> int:
+    try:
+        return int(os.environ.get("BUILD_SLIDES_IMAGE_DPI", "300"))
+    except ValueError:
+        return 300
+
+def enabled() -> bool:
+    return Image is not None and dpi() > 0
+
+def cache_dir(root: Path) -> Path:
+    return root / ".cache" / "img"
+
+def page_lengths(tex_head: str) -> dict[str, float]:
+    """\\textwidth などの長さ（インチ）。テンプレートの aspectratio から求める。"""
+    m = re.search(r"\\documentclass\[[^\]]*aspectratio=(\d+)", tex_head)
+    w, h = PAPER_MM.get(m.group(1) if m else "43", PAPER_MM["43"])
+    inch = 1 / 25.4
+    tw, th = (w - 2 * MARGIN_MM) * inch, (h - 2 * MARGIN_MM) * inch
+    return {"paperwidth": w * inch, "paperheight": h * inch, "textwidth": tw,
+            "linewidth": tw, "columnwidth": tw, "hsize": tw, "textheight": th}
+
+def length_in(value: str, lengths: dict[str, float]) -> float | None:
+    """'3cm'・'0.8\\textwidth' などをインチにする。解釈できなければ None。"""
+    m = _LEN.match(value.strip().strip("{}"))
+    if not m:
+        return None
+    factor = float(m.group(1)) if m.group(1) not in ("", ".") else 1.0
+    if m.group(2):
+        return factor * UNIT_IN[m.group(2)]
+    base = lengths.get(m.group(3))
+    return factor * base if base else None
+
+def display_size(opts: str, lengths: dict[str, float]) -> tuple[float | None, float | None]:
+    """\\includegraphics のオプションから表示の幅・高さ（インチ）を求める。"""
+    w = h = None
+    for item in opts.split(","):
+        k, _, v = item.partition("=")
+        k = k.strip()
+        if k == "width":
+            w = length_in(v, lengths)
+        elif k == "height":
+            h = length_in(v, lengths)
+    return w, h
+
+_hashes: dict[tuple[str, int, int], str] = {}
+
+def _source_hash(p: Path) -> str:
+    st = p.stat()
+    key = (str(p), st.st_size, st.st_mtime_ns)
+    if key not in _hashes:
+        _hashes[key] = buildcache.sha256_file(p)
+    return _hashes[key]
+
+def _make(src: str, dst: str, size: tuple[int, int]) -> bool:
+    """src を size 以内に縮小して dst に書く（プロセスプールからも呼ばれる）。"""
+    try:
+        with Image.open(src) as img:
+            img.load()
+            out = img.resize(size, Image.LANCZOS)
+            tmp = f"{dst}.tmp{os.getpid()}"
+            if Path(dst).suffix == ".png":
+                out.save(tmp, "PNG", optimize=True)
+            else:
+                if out.mode not in ("RGB", "L"):
+                    out = out.convert("RGB")
+                out.save(tmp, "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(tmp, dst)
+        return True
+    except OSError as e:
+        print(f"⚠ 画像を縮小できません: {src} ({e})")
+        return False
+
+class Optimizer:
+    """graphicsref.rewrite の derive に渡し、縮小が必要な画像を派生画像に差し替える。"""
+
+    def __init__(self, root: Path, tex_head: str, build_dir: Path, dpi_: int | None = None):
+        self.dir = cache_dir(root)
+        self.rel = os.path.relpath(self.dir, build_dir).replace(os.sep, "/")
+        self.build_dir = build_dir
+        self.lengths = page_lengths(tex_head)
+        self.dpi = dpi_ or dpi()
+        self.todo: dict[str, tuple[str, str, str, tuple[int, int]]] = {}
+
+    def derive(self, opts: str, path: str) -> str | None:
+        src = Path(os.path.normpath(self.build_dir / path))
+        ext = src.suffix.lower()
+        if ext not in RASTER:
+            return None
+        w_in, h_in = display_size(opts, self.lengths)
+        if w_in is None and h_in is None:
+            return None
+        try:
+            with Image.open(src) as img:
+                W, H = img.size
+        except OSError:
+            return None
+        scale = min(s for s in ((w_in * self.dpi / W) if w_in else None,
+                                (h_in * self.dpi / H) if h_in else None) if s is not None)
+        if scale >= SHRINK_BELOW:
+            return None
+        size = (max(1, math.ceil(W * scale)), max(1, math.ceil(H * scale)))
+        name = f"{_source_hash(src)[:32]}-{size[0]}x{size[1]}{'.png' if ext == '.png' else '.jpg'}"
+        dst = self.dir / name
+        if not dst.exists():
+            self.todo[f"{self.rel}/{name}"] = (path, str(src), str(dst), size)
+        return f"{self.rel}/{name}"
+
+    def finish(self) -> dict[str, str]:
+        """未作成の派生画像を作る。作れなかったものは {派生画像のパス: 元のパス} で返す。"""
+        if not self.todo:
+            return {}
+        self.dir.mkdir(parents=True, exist_ok=True)
+        jobs = list(self.todo.items())
+        self.todo = {}
+        args = [j[1:] for _, j in jobs]
+        if len(jobs) >= POOL_MIN:
+            with ProcessPoolExecutor(max_workers=min(len(jobs), os.cpu_count() or 1)) as ex:
+                ok = list(ex.map(_make, *zip(*args)))
+        else:
+            ok = [_make(*a) for a in args]
+        print(f"🖼 画像を {sum(ok)} 件縮小しました（{self.dpi}dpi 相当）")
+        return {rel: j[0] for (rel, j), good in zip(jobs, ok) if not good}
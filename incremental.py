@@ -0,0 +1,166 @@
+# incremental.py — フレーム単位のインクリメンタルビルド
+#
+# content.tex をフレームごとの単位（プリアンブル＋カウンタ補正＋フレーム本文）に分け、
+# 単位ごとに PDF をキャッシュする。キャッシュキーは単位の .tex 全文（＝プリアンブル、
+# フレーム本文、フレーム番号・総数の補正値）と latexmk が読んだ入力ファイルのハッシュ。
+# 編集したフレームだけ LuaLaTeX にかけ、最後に qpdf で1冊に連結する。
+#
+# 制約: フレーム番号は「k 番目の \begin{frame} は番号 k」とみなして補正する。
+# フレーム間の記述（\section や \teacherframe など）は直後のフレームの単位に含める。
+# フレームをまたぐ相互参照やナビゲーションは各単位内でしか解決されない。
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import os
+import sys
+import time
+
+import build_slides
+import buildcache
+import buildjournal
+import fmtcache
+import highlight
+import pdftools
+import publish
+
+END_DOCUMENT = r"\end{document}"
+
+def split_units(body: str) -> list[str]:
+    """本文を [フレーム1(直前の記述込み), フレーム2, ...] に分ける。"""
+    if body.rstrip().endswith(END_DOCUMENT):
+        body = body.rstrip()[: -len(END_DOCUMENT)]
+    pos = build_slides.find_frame_positions(body)
+    if not pos:
+        return []
+    units = []
+    prev = 0
+    for s, e in pos:
+        units.append(body[prev:e])
+        prev = e
+    tail = body[prev:].strip()
+    if tail:
+        units[-1] += "\n" + tail
+    return units
+
+def counter_fixup(number: int, total: int) -> str:
+    # 単体コンパイルでもフレーム番号と総数が通しビルドと同じになるよう補正する
+    return "\n".join([
+        rf"\setcounter{{framenumber}}{{{number - 1}}}",
+        r"\makeatletter",
+        rf"\@ifundefined{{c@myframenum}}{{}}{{\setcounter{{myframenum}}{{{number - 1}}}}}",
+        rf"\def\inserttotalframenumber{{{total}}}",
+        r"\makeatother",
+    ])
+
+def unit_sources(course: dict, ho: bool, tech: bool) -> list[str]:
+    """[タイトル単位, フレーム1単位, ...] の .tex 全文を返す。"""
+    # minted の置き換えは単位ごとに行う（ヘッダだけで済ませると本文の minted が残る）
+    head_only = build_slides.render_main_tex({**course, "body": ""}, ho, tech, prerender=False)
+    preamble, doc_part = fmtcache.split_preamble(head_only)
+    doc_head = doc_part.rstrip()
+    if doc_head.endswith(END_DOCUMENT):
+        doc_head = doc_head[: -len(END_DOCUMENT)].rstrip()
+
+    frames = split_units(course["body"])
+    total = len(frames)
+    units = [f"{preamble}{doc_head}\n{END_DOCUMENT}\n"]
+    for k, frame in enumerate(frames, 1):
+        units.append("\n".join([
+            preamble + fmtcache.BEGIN_DOCUMENT,
+            counter_fixup(k, total),
+            frame.strip(),
+            END_DOCUMENT,
+        ]) + "\n")
+    return [highlight.prerender(u, course["root"]) for u in units]
+
+def build_incremental(subj_code: str, tdir_name: str, ho: bool = False, tech: bool = False,
+                      use_fmt: bool = True, update_info: bool = True) -> Path:
+    variant = build_slides.variant_name(ho, tech)
+    flags = {"ho": ho, "tech": tech, "incremental": True}
+    with buildjournal.track(subj_code, tdir_name, variant, flags, enabled=update_info) as ph:
+        return _build_incremental(subj_code, tdir_name, ho, tech, use_fmt, ph)
+
+def _build_incremental(subj_code: str, tdir_name: str, ho: bool, tech: bool,
+                       use_fmt: bool, ph: buildjournal.Phases) -> Path:
+    with ph.phase("load"):
+        course = build_slides.load_course(subj_code, tdir_name)
+    print(f"ハンドアウト: {ho} / 教師モード: {tech} / インクリメンタル")
+    root, app_dir = course["root"], course["app_dir"]
+    variant = build_slides.variant_name(ho, tech)
+    build_dir = build_slides.job_build_dir(root, f"{subj_code}-{tdir_name}-{variant}-inc")
+    build_dir.mkdir(exist_ok=True)
+
+    with ph.phase("render"):
+        units = unit_sources(course, ho, tech)
+    if len(units) < 2:
+        print("❌ frame が見つかりません", file=sys.stderr)
+        sys.exit(1)
+
+    cache = buildcache.BuildCache(root / ".cache" / "frames")
+    flags = {"unit": "frame"}
+    pdfs: list[Path | None] = []
+    todo = []
+    with ph.phase("cache"):
+        for i, src in enumerate(units):
+            hit = cache.lookup(src, flags)
+            pdfs.append(hit)
+            if not hit:
+                todo.append(i)
+    print(f"フレーム単位: {len(units) - 1} 枚（タイトル除く） / 再コンパイル: {len(todo)}")
+
+    with ph.phase("fmt"):
+        fmt = fmtcache.ensure_format(root, build_dir, units[0]) if (use_fmt and todo) else None
+
+    def compile_unit(i: int) -> Path:
+        t0 = time.perf_counter()
+        name = f"unit-{i:03d}"
+        tex = build_dir / f"{name}.tex"
+        tex.write_text(units[i], encoding="utf-8")
+        shell = highlight.needs_shell_escape(units[i])
+        if fmt:
+            try:
+                ph.add_passes(build_slides.run_latexmk(build_dir, tex, timeout_s=180, fmt=fmt,
+                                                       shell_escape=shell))
+            except SystemExit:
+                print(f"⚠ {name}: フォーマット使用時に失敗。通常ビルドで再試行します。", file=sys.stderr)
+                ph.add_passes(build_slides.run_latexmk(build_dir, tex, timeout_s=180, shell_escape=shell))
+                fmtcache.mark_broken(fmt)   # 通常ビルドは通ったのでフォーマット側の問題
+        else:
+            ph.add_passes(build_slides.run_latexmk(build_dir, tex, timeout_s=180, shell_escape=shell))
+        pdf = build_dir / f"{name}.pdf"
+        if not pdf.exists():
+            print(f"❌ {pdf.name} が見つかりません", file=sys.stderr)
+            sys.exit(1)
+        inputs = buildcache.read_fls_inputs(build_dir / f"{name}.fls", root.parent, build_dir)
+        stored = cache.store(units[i], flags, pdf, inputs)
+        if i:
+            ph.frames[i] = time.perf_counter() - t0
+        return stored
+
+    failed = []
+    with ph.phase("latexmk"), ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as ex:
+        futs = {i: ex.submit(compile_unit, i) for i in todo}
+        for i, fut in futs.items():
+            try:
+                pdfs[i] = fut.result()
+            except SystemExit:
+                failed.append(i)
+    if failed:
+        names = ", ".join("タイトル" if i == 0 else f"frame {i}" for i in failed)
+        print(f"❌ コンパイル失敗: {names}", file=sys.stderr)
+        sys.exit(1)
+
+    # --- 連結 & 配置 ---
+    with ph.phase("merge"):
+        main_tex = build_dir / "main.tex"
+        main_tex.write_text(build_slides.render_main_tex(course, ho, tech), encoding="utf-8")
+        merged = pdftools.merge_pdfs(pdfs, build_dir / "main.pdf")
+    with ph.phase("publish"):
+        pub = publish.Publisher(app_dir)
+        how = pub.put(main_tex, "main.tex")
+        print("main.texを配置しました" + publish.describe(how))
+        final_pdf = app_dir / f"{build_slides.output_stem(course, ho, tech)}.pdf"
+        how = pub.put(merged, final_pdf.name)
+        print("✅ 出力:", final_pdf, publish.describe(how))
+    ph.pdf_size = final_pdf.stat().st_size
+    return final_pdf
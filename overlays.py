@@ -0,0 +1,170 @@
+# overlays.py — 発表用 PDF（pr）のオーバーレイを畳んでハンドアウト（ho）を切り出す
+#
+# pr と ho の違いは \mypause が \pause になるかどうかだけなので、オーバーレイが
+# \mypause からしか生まれない授業なら、ho は pr の各フレームの最後のページを並べたものと同じ。
+# 切り出すときだけ pr に「ページ.フレーム番号.オーバーレイ番号」のページラベルを入れてコンパイルし、
+# qpdf で読んでオーバーレイ番号が振り出しに戻る直前のページ（= フレームの最後のページ）だけを残す。
+# 配置する pr・ho からはこのラベルを外す（ビューアの表示は通常どおりのページ番号になる）。
+# 本文に \pause・オーバーレイ指定（\only<2> / \item<+-> / [<+->] など）・\ifmypausemode が
+# あると ho にもオーバーレイや違いが残るので、切り出さずに通常どおりコンパイルする。
+# 結果は pr の sha256 ごとに .cache/ho/ に置く。
+from __future__ import annotations
+from pathlib import Path
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import buildcache
+import pdftools
+
+VERSION = 2
+
+# 「ページ.フレーム番号.オーバーレイ番号」のページラベル（hyperref が \thepage から作る）。
+# noframenumbering のフレームはフレーム番号が進まないので、ページ番号を前に付けて
+# hyperref のページアンカー（page.<\thepage>）が重複しないようにする
+PAGE_LABELS = (r"\makeatletter\AtBeginDocument{\renewcommand{\thepage}"
+               r"{\arabic{page}.\arabic{framenumber}.\number\beamer@slideinframe}}\makeatother")
+
+_VERBATIM = re.compile(r"\\begin\{(minted|verbatim|Verbatim|lstlisting|comment)\*?\}.*?\\end\{\1\*?\}",
+                       re.DOTALL)
+_COMMENT = re.compile(r"(?<!\\)%.*")
+_MODE_DEPENDENT = [
+    (re.compile(r"\\(?:ifmypausemode|mypausemode(?:true|false))\b"), r"\ifmypausemode"),
+    (re.compile(r"\\pause\b"), r"\pause"),
+    (re.compile(r"\\[A-Za-z]+\*?[ \t]*<[^<>\n]*>"), "オーバーレイ指定"),
+    (re.compile(r"\\begin\{[^}]*\}[ \t]*(?:\[[^\]\n]*\])?[ \t]*<"), "オーバーレイ指定"),
+    (re.compile(r"\[<[^\]\n]*>\]"), "オーバーレイ指定"),
+]
+
+def mode_dependent(body: str) -> str | None:
+    """pr の切り出しでは ho と同じにならない理由（無ければ None）。"""
+    text = _COMMENT.sub("", _VERBATIM.sub("", body))
+    for pat, reason in _MODE_DEPENDENT:
+        m = pat.search(text)
+        if m:
+            return f"{reason}: {m.group(0).strip()}"
+    return None
+
+def page_labels(pdf: Path) -> list[str] | None:
+    """各ページのラベル（/PageLabels が無いか、qpdf が無い・読めない PDF なら None）。"""
+    qpdf = shutil.which("qpdf")
+    if not qpdf:
+        return None
+    try:
+        res = subprocess.run([qpdf, "--json", "--json-key=pages", "--json-key=pagelabels", str(pdf)],
+                             capture_output=True, text=True, timeout=120)
+    except subprocess.TimeoutExpired:
+        return None
+    # qpdf は警告のみのとき 3 を返す
+    if res.returncode not in (0, 3):
+        return None
+    try:
+        data = json.loads(res.stdout)
+    except ValueError:
+        return None
+    n = len(data.get("pages", []))
+    ranges = sorted(data.get("pagelabels") or [], key=lambda r: r["index"])
+    if not n or not ranges:
+        return None
+    labels = []
+    for k, r in enumerate(ranges):
+        end = ranges[k + 1]["index"] if k + 1 < len(ranges) else n
+        lab = r.get("label") or {}
+        prefix = lab.get("/P", "")
+        # JSON v2 では文字列に "u:" が付く
+        prefix = prefix[2:] if prefix.startswith("u:") else prefix
+        for i in range(r["index"], end):
+            num = str(lab.get("/St", 1) + i - r["index"]) if lab.get("/S") == "/D" else ""
+            labels.append(prefix + num)
+    return labels if len(labels) == n else None
+
+def frame_overlay(label: str) -> tuple[int, int] | None:
+    """ページラベルの (フレーム番号, オーバーレイ番号)。想定の形でなければ None。
+
+    「ページ.フレーム.オーバーレイ」と、以前の「フレーム.オーバーレイ」を読む。
+    """
+    try:
+        nums = [int(x) for x in label.split(".")]
+    except ValueError:
+        return None
+    return (nums[-2], nums[-1]) if len(nums) in (2, 3) else None
+
+def last_overlays(labels: list[str]) -> list[int] | None:
+    """各フレームの最後のページ番号（1始まり）。ラベルが想定の形でなければ None。"""
+    keys = [frame_overlay(lab) for lab in labels]
+    if None in keys:
+        return None
+    keep = []
+    for i, (frame, overlay) in enumerate(keys):
+        nxt = keys[i + 1] if i + 1 < len(keys) else None
+        # 次のページでフレームが変わるかオーバーレイ番号が戻れば、ここがフレームの最後
+        if nxt is None or nxt[0] != frame or nxt[1] <= overlay:
+            keep.append(i + 1)
+    return keep
+
+def _ranges(pages: list[int]) -> str:
+    out, start = [], None
+    for i, p in enumerate(pages):
+        if start is None:
+            start = p
+        if i + 1 == len(pages) or pages[i + 1] != p + 1:
+            out.append(str(start) if start == p else f"{start}-{p}")
+            start = None
+    return ",".join(out)
+
+def derive_handout(pr_pdf: Path, root: Path) -> Path | None:
+    """pr_pdf から ho 相当の PDF（キャッシュ内のパス）を作る。qpdf が無いかページラベルが読めなければ None。"""
+    d = root / ".cache" / "ho"
+    d.mkdir(parents=True, exist_ok=True)
+    out = d / f"{buildcache.sha256_file(pr_pdf)[:32]}-v{VERSION}.pdf"
+    if out.exists():
+        print("♻ ハンドアウト切り出し済み")
+        return out
+    qpdf = shutil.which("qpdf")
+    if not qpdf:
+        print("⚠ qpdf が見つからないため、ハンドアウトは切り出せません", file=sys.stderr)
+        return None
+    labels = page_labels(pr_pdf)
+    keep = last_overlays(labels) if labels else None
+    if not keep:
+        print("⚠ ページラベルが読めないため、ハンドアウトは切り出せません", file=sys.stderr)
+        return None
+    tmp = d / f".{out.stem}.{os.getpid()}.pdf"
+    try:
+        pdftools.run_tool([qpdf, "--empty", "--remove-page-labels", "--pages", str(pr_pdf), _ranges(keep),
+                           "--", str(tmp)])
+        os.replace(tmp, out)
+    finally:
+        tmp.unlink(missing_ok=True)
+    print(f"✂ ハンドアウトを切り出しました（{len(labels)} → {len(keep)} ページ）")
+    return out
+
+def strip_labels(pdf: Path, root: Path) -> Path:
+    """pdf からページラベルを外したもの（キャッシュ内のパス）。外せなければ pdf をそのまま返す。"""
+    d = root / ".cache" / "ho"
+    d.mkdir(parents=True, exist_ok=True)
+    out = d / f"{buildcache.sha256_file(pdf)[:32]}-v{VERSION}-nolabels.pdf"
+    if out.exists():
+        return out
+    qpdf = shutil.which("qpdf")
+    if not qpdf:
+        print("⚠ qpdf が見つからないため、pr のページラベルを外せません", file=sys.stderr)
+        return pdf
+    tmp = d / f".{out.stem}.{os.getpid()}.pdf"
+    try:
+        try:
+            res = subprocess.run([qpdf, str(pdf), "--remove-page-labels", str(tmp)],
+                                 capture_output=True, text=True, timeout=120)
+        except subprocess.TimeoutExpired:
+            res = None
+        # qpdf は警告のみのとき 3 を返す
+        if res is None or res.returncode not in (0, 3) or not tmp.exists():
+            print("⚠ pr のページラベルを外せませんでした（そのまま配置します）", file=sys.stderr)
+            return pdf
+        os.replace(tmp, out)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return out
@@ -0,0 +1,179 @@
+# pdfopt.py — 配布用 PDF の後処理（オブジェクトストリーム圧縮・重複除去・線形化）
+#
+#   python pdfopt.py 配布.pdf ... [-j N] [--gs]    # 指定 PDF をその場で最適化
+#   build_slides.py / batch_build.py の --optimize  # ビルド結果を配置する前に最適化
+#
+# qpdf で圧縮ストリームの作り直し・オブジェクトストリーム化・線形化（Web 表示用、
+# 先頭ページがすぐ出る）を行う。--gs（または BUILD_SLIDES_PDF_GS=1）なら先に
+# Ghostscript の pdfwrite で重複画像の共有とフォントのサブセット化もする。
+# pdffonts があれば埋め込まれていない・サブセットでないフォントを警告する。
+# 結果は入力 PDF の sha256 ごとに .cache/pdfopt/ に置き、同じ PDF は処理し直さない。
+# 合計が上限を超えたら fmtcache と同じく最後に使った時刻の古い順に消す。
+# 最適化で大きくなった場合は元の PDF をそのまま使う。
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import buildcache
+import pdftools
+
+VERSION = 1         # 処理内容を変えたら上げる（キャッシュキーに入る）
+DEFAULT_MAX_BYTES = 1024 ** 3      # 最適化済み PDF の合計の上限（既定 1GiB）
+IN_USE_S = 3600                    # これより最近使った PDF は上限を超えても消さない
+
+def cache_dir(root: Path) -> Path:
+    return root / ".cache" / "pdfopt"
+
+def use_gs() -> bool:
+    return os.environ.get("BUILD_SLIDES_PDF_GS") == "1"
+
+def _size(n: int) -> str:
+    return f"{n / 1024:.1f} KiB" if n < 1024 ** 2 else f"{n / 1024 ** 2:.1f} MiB"
+
+def _ghostscript(src: Path, dst: Path) -> None:
+    gs = pdftools.require("gs")
+    pdftools.run_tool([gs, "-q", "-dNOPAUSE", "-dBATCH", "-dSAFER", "-sDEVICE=pdfwrite",
+                       "-dDetectDuplicateImages=true", "-dSubsetFonts=true", "-dCompressFonts=true",
+                       "-dAutoRotatePages=/None", "-dPassThroughJPEGImages=true",
+                       f"-sOutputFile={dst}", str(src)], timeout_s=300)
+
+def _qpdf(src: Path, dst: Path) -> None:
+    qpdf = pdftools.require("qpdf")
+    pdftools.run_tool([qpdf, "--object-streams=generate", "--compress-streams=y",
+                       "--recompress-flate", "--compression-level=9", "--linearize",
+                       str(src), str(dst)])
+
+def check_fonts(pdf: Path) -> list[str]:
+    """埋め込みなし・サブセットでないフォントの名前（pdffonts が無ければ空）。"""
+    exe = shutil.which("pdffonts")
+    if not exe:
+        return []
+    try:
+        res = subprocess.run([exe, str(pdf)], capture_output=True, text=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        return []
+    bad = []
+    # name type encoding emb sub uni object ID（名前・種別は空白を含みうるので後ろから読む）
+    for line in res.stdout.splitlines()[2:]:
+        cols = line.split()
+        if len(cols) >= 7 and (cols[-5] != "yes" or cols[-4] != "yes"):
+            bad.append(f"{cols[0]}（{'埋め込みなし' if cols[-5] != 'yes' else 'サブセットなし'}）")
+    return bad
+
+def evict(root: Path, max_bytes: int = DEFAULT_MAX_BYTES, keep: Path | None = None) -> None:
+    """最適化済み PDF の合計が max_bytes を超えていたら、最後に使った時刻（mtime）の古い順に消す。
+
+    結果のハッシュで引くための別名はハードリンクなので、同じ実体は1回だけ数える。
+    """
+    pdfs, links, sizes = [], {}, {}
+    for p in cache_dir(root).glob("*.pdf"):
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        ino = (st.st_dev, st.st_ino)
+        pdfs.append((st.st_mtime, st.st_size, ino, p))
+        links[ino] = links.get(ino, 0) + 1
+        sizes[ino] = st.st_size
+    total = sum(sizes.values())
+    try:
+        keep_ino = (keep.stat().st_dev, keep.stat().st_ino) if keep else None
+    except FileNotFoundError:
+        keep_ino = None
+    now = time.time()
+    for mtime, size, ino, p in sorted(pdfs):
+        if total <= max_bytes:
+            break
+        # 他のビルドが配置しようとしているかもしれないものは残す
+        if ino == keep_ino or now - mtime < IN_USE_S:
+            continue
+        p.unlink(missing_ok=True)
+        links[ino] -= 1
+        if not links[ino]:
+            total -= size
+
+def optimize(pdf: Path, root: Path, gs: bool | None = None) -> Path:
+    """pdf を最適化したもの（キャッシュ内のパス）を返す。元のファイルは変えない。"""
+    gs = use_gs() if gs is None else gs
+    d = cache_dir(root)
+    d.mkdir(parents=True, exist_ok=True)
+    sha = buildcache.sha256_file(pdf)
+    out = d / f"{sha[:32]}-v{VERSION}{'-gs' if gs else ''}.pdf"
+    before = pdf.stat().st_size
+    if out.exists():
+        try:
+            os.utime(out)       # 追い出しの順番用に使った時刻を記録する
+        except OSError:
+            pass
+        print(f"♻ PDF 最適化済み: {_size(before)} → {_size(out.stat().st_size)}")
+        return out
+
+    tmp_gs = d / f".{out.stem}.{os.getpid()}.gs.pdf"
+    tmp = d / f".{out.stem}.{os.getpid()}.pdf"
+    try:
+        work = pdf
+        if gs:
+            _ghostscript(pdf, tmp_gs)
+            work = tmp_gs
+        _qpdf(work, tmp)
+        if tmp.stat().st_size >= before:
+            # 小さくならなければ元のまま（同じ PDF は次回も処理しないよう記録だけする）
+            shutil.copyfile(pdf, tmp)
+        os.replace(tmp, out)
+        # 最適化済みの PDF をもう一度渡されても処理し直さないよう、結果のハッシュでも引けるようにする
+        alias = d / f"{buildcache.sha256_file(out)[:32]}-v{VERSION}{'-gs' if gs else ''}.pdf"
+        if not alias.exists():
+            try:
+                os.link(out, alias)
+            except OSError:
+                shutil.copyfile(out, alias)
+    finally:
+        tmp_gs.unlink(missing_ok=True)
+        tmp.unlink(missing_ok=True)
+    evict(root, keep=out)
+
+    after = out.stat().st_size
+    print(f"📦 PDF 最適化: {_size(before)} → {_size(after)}（{(after - before) / before:+.0%}）")
+    for f in check_fonts(out):
+        print(f"⚠ フォント: {f}")
+    return out
+
+def optimize_in_place(pdf: str, gs: bool) -> tuple[str, int, int]:
+    """プロセスプール用: pdf を最適化版で置き換えて (名前, 前, 後) を返す。"""
+    p = Path(pdf)
+    before = p.stat().st_size
+    out = optimize(p, Path(__file__).parent, gs)
+    tmp = p.with_suffix(f".tmp{os.getpid()}.pdf")
+    shutil.copyfile(out, tmp)
+    os.replace(tmp, p)
+    return pdf, before, p.stat().st_size
+
+def main():
+    ap = argparse.ArgumentParser(description="配布用 PDF の最適化")
+    ap.add_argument("pdfs", nargs="+", help="最適化する PDF（その場で置き換える）")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="並列数")
+    ap.add_argument("--gs", action="store_true", help="Ghostscript で画像の重複除去・フォントのサブセット化も行う")
+    args = ap.parse_args()
+
+    missing = [p for p in args.pdfs if not Path(p).is_file()]
+    if missing:
+        print(f"❌ PDF がありません: {', '.join(missing)}", file=sys.stderr)
+        sys.exit(1)
+    total_before = total_after = 0
+    with ProcessPoolExecutor(max_workers=max(1, args.jobs)) as ex:
+        futs = [ex.submit(optimize_in_place, p, args.gs or use_gs()) for p in args.pdfs]
+        for fut in as_completed(futs):
+            name, before, after = fut.result()
+            total_before += before
+            total_after += after
+            print(f"✅ {name}: {_size(before)} → {_size(after)}")
+    print(f"合計: {_size(total_before)} → {_size(total_after)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# pdftools.py — 外部コマンド（qpdf）による PDF 操作
+from __future__ import annotations
+from pathlib import Path
+import os
+import shutil
+import subprocess
+import sys
+
+def require(tool: str) -> str:
+    exe = shutil.which(tool)
+    if not exe:
+        print(f"❌ {tool} が見つかりません（PATH を確認してください）", file=sys.stderr)
+        sys.exit(1)
+    return exe
+
+def run_tool(cmd: list[str], timeout_s: int = 120) -> subprocess.CompletedProcess:
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout_s)
+    except subprocess.TimeoutExpired:
+        print(f"❌ タイムアウトしました（{timeout_s}秒）: {cmd[0]}", file=sys.stderr)
+        sys.exit(1)
+    # qpdf は警告のみのとき 3 を返す
+    if res.returncode not in (0, 3):
+        print(f"❌ {cmd[0]} 失敗\n{res.stderr[-3000:]}", file=sys.stderr)
+        sys.exit(1)
+    return res
+
+def merge_pdfs(inputs: list[Path], out_pdf: Path) -> Path:
+    """inputs を順に連結して out_pdf に書き出す（書き込みは一時ファイル経由）。"""
+    qpdf = require("qpdf")
+    tmp = out_pdf.with_suffix(f".tmp{os.getpid()}.pdf")
+    run_tool([qpdf, "--empty", "--pages", *[str(p) for p in inputs], "--", str(tmp)])
+    os.replace(tmp, out_pdf)
+    return out_pdf
+
+def to_png(pdf: Path, out_dir: Path, prefix: str, dpi: int = 96) -> list[Path]:
+    """pdf の全ページを out_dir/prefix-N.png に書き出す（前回の prefix-*.png は消す）。"""
+    exe = require("pdftoppm")
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for p in out_dir.glob(f"{prefix}-*.png"):
+        p.unlink()
+    run_tool([exe, "-png", "-r", str(dpi), str(pdf), str(out_dir / prefix)])
+    # ページ数の桁に合わせてゼロ埋めされるので名前順がページ順
+    return sorted(out_dir.glob(f"{prefix}-*.png"))
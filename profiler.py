@@ -0,0 +1,144 @@
+# profiler.py — ビルドの段階ごとの入れ子スパンを記録し、Chrome のトレース形式で書き出す
+#
+#   python build_slides.py 2030302 07 --profile [trace.json]
+#   python batch_build.py 2030302 --profile [trace.json]   # ワーカーごとに pid を分けて1本にまとめる
+#
+# 書き出した JSON は chrome://tracing や Perfetto（ui.perfetto.dev）で開ける。
+# buildjournal.Phases の段階（load / render / cache / fmt / latexmk / publish ...）は
+# 自動でスパンになり、latexmk はパスごとの子スパンを持つ。
+#
+# プログラムから使う場合:
+#   profiler.add_hook(fn)              # スパンが閉じるたびに fn(event) を呼ぶ（記録の有無に関係なく）
+#   with profiler.span("名前", key=値): ...
+#   profiler.enable() / profiler.events() / profiler.export_chrome(path) / profiler.summary()
+#   executor.submit(profiler.carry(fn), ...)   # スレッドに入れ子の深さを引き継ぐ
+from __future__ import annotations
+from contextlib import contextmanager
+from pathlib import Path
+import json
+import os
+import threading
+import time
+
+_enabled = False
+_events: list[dict] = []
+_hooks: list = []
+_mu = threading.Lock()
+_local = threading.local()
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+def enabled() -> bool:
+    return _enabled
+
+def reset() -> None:
+    with _mu:
+        _events.clear()
+
+def add_hook(fn) -> None:
+    _hooks.append(fn)
+
+def remove_hook(fn) -> None:
+    if fn in _hooks:
+        _hooks.remove(fn)
+
+def events() -> list[dict]:
+    with _mu:
+        return list(_events)
+
+def _stack() -> list[str]:
+    st = getattr(_local, "stack", None)
+    if st is None:
+        st = _local.stack = []
+    return st
+
+def carry(fn):
+    """fn を別スレッドで呼ぶとき、呼び出し元のスパンの入れ子を引き継がせる。"""
+    parent = list(_stack())
+
+    def run(*args, **kwargs):
+        saved = getattr(_local, "stack", None)
+        _local.stack = list(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.stack = saved
+    return run
+
+def record(name: str, start: float, seconds: float, cat: str = "build", **args) -> None:
+    """開始時刻（time.time() の秒）と所要秒数からスパンを1件記録する。"""
+    if not (_enabled or _hooks):
+        return
+    ev = {"name": name, "cat": cat, "ph": "X", "ts": int(start * 1e6), "dur": int(seconds * 1e6),
+          "pid": os.getpid(), "tid": threading.get_native_id(), "depth": len(_stack())}
+    if args:
+        ev["args"] = args
+    if _enabled:
+        with _mu:
+            _events.append(ev)
+    for fn in list(_hooks):
+        fn(ev)
+
+@contextmanager
+def span(name: str, cat: str = "build", **args):
+    """with ブロックを1つのスパンとして記録する（無効なら何もしない）。"""
+    if not (_enabled or _hooks):
+        yield
+        return
+    st = _stack()
+    wall, t = time.time(), time.perf_counter()
+    st.append(name)
+    try:
+        yield
+    finally:
+        st.pop()
+        record(name, wall, time.perf_counter() - t, cat, **args)
+
+def export_chrome(path: Path, evs: list[dict] | None = None, names: dict[int, str] | None = None) -> None:
+    """Chrome の trace-event 形式（JSON Object Format）で書き出す。names は pid → 表示名。"""
+    evs = events() if evs is None else evs
+    out = [{k: v for k, v in e.items() if k != "depth"} for e in evs]
+    for pid, label in (names or {}).items():
+        out.append({"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": label}})
+    tmp = Path(path).with_name(f".{Path(path).name}.tmp{os.getpid()}")
+    tmp.write_text(json.dumps({"traceEvents": out, "displayTimeUnit": "ms"}, ensure_ascii=False),
+                   encoding="utf-8")
+    os.replace(tmp, path)
+
+def summary(evs: list[dict] | None = None, level: int | None = None) -> str:
+    """最上位スパン（1つだけならその子）の合計時間を名前ごとに1行にまとめる。
+
+    level を指定すればその深さのスパンを集計する（batch の各ジョブの段階を合算するなど）。
+    """
+    evs = events() if evs is None else evs
+    if not evs:
+        return "⏱ 記録なし"
+    top = min(e["depth"] for e in evs)
+    roots = [e for e in evs if e["depth"] == top]
+    total = sum(e["dur"] for e in roots) / 1e6
+    if level is None:
+        level = top + 1 if len({e["name"] for e in roots}) == 1 else top
+    parts: dict[str, float] = {}
+    for e in sorted(evs, key=lambda e: e["ts"]):
+        if e["depth"] == level:
+            parts[e["name"]] = parts.get(e["name"], 0.0) + e["dur"] / 1e6
+    body = " · ".join(f"{k} {v:.2f}s" for k, v in parts.items())
+    return f"⏱ {total:.2f}s" + (f"  {body}" if body else "")
+
+@contextmanager
+def session(path: Path, name: str = "build"):
+    """記録を有効にして with ブロック全体を name のスパンで包み、抜けるときに書き出す。"""
+    enable()
+    try:
+        with span(name):
+            yield
+    finally:
+        export_chrome(path)
+        print(summary())
+        print(f"📈 トレース: {path}")
@@ -0,0 +1,144 @@
+# publish.py — ビルド結果を授業ディレクトリへ配置する（変更なしは書かない・途中状態を見せない）
+#
+# 配置先と中身（sha256）が同じなら何もしない（LMS 連携が無駄に再アップロードしない）。
+# 書くときは同じディレクトリの一時ファイルに作ってから os.replace するので、読み手が
+# 書きかけの PDF を拾うことはない。一時ファイルは reflink（FICLONE、CoW な FS）→
+# ハードリンク（.cache 内の書き換えられないファイルからだけ）→ コピーの順で作る。
+# build/main.pdf は次のビルドでその場で上書きされるのでハードリンクしない。
+#
+# 授業ディレクトリの .published.json に配置したファイルの一覧を持つ。
+#   {"version": 1, "seq": 通し番号, "files": {名前: {"sha256", "size", "mtime_ns", "seq", "published_at"}}}
+# 下流の同期は前回見た seq より大きいファイルだけ取りに行けばよい。
+from __future__ import annotations
+from datetime import datetime
+from pathlib import Path
+import errno
+import json
+import os
+import shutil
+
+try:
+    import fcntl
+except ImportError:  # Windows では排他・reflink なし
+    fcntl = None
+
+import buildcache
+
+MANIFEST_NAME = ".published.json"
+FICLONE = 0x40049409    # linux/fs.h
+
+ROOT = Path(__file__).parent
+
+def is_immutable(p: Path) -> bool:
+    """.cache 内のファイル（内容アドレスで、書き換えずに置き換えるもの）か。"""
+    try:
+        p.resolve().relative_to((ROOT / ".cache").resolve())
+        return True
+    except ValueError:
+        return False
+
+def _reflink(src: Path, dst: Path) -> bool:
+    if fcntl is None or not hasattr(fcntl, "ioctl"):
+        return False
+    try:
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), FICLONE, fs.fileno())
+        return True
+    except OSError as e:
+        dst.unlink(missing_ok=True)
+        if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS,
+                       errno.EPERM):
+            return False
+        raise
+
+def describe(how: str | None) -> str:
+    return "（変更なし）" if how is None else f"（{how}）"
+
+def _stage(src: Path, tmp: Path) -> str:
+    """src の中身を tmp に用意し、使った方法を返す。"""
+    if _reflink(src, tmp):
+        return "reflink"
+    if is_immutable(src):
+        try:
+            os.link(src, tmp)
+            return "hardlink"
+        except OSError:
+            pass
+    shutil.copyfile(src, tmp)
+    return "copy"
+
+class Publisher:
+    """1つの授業ディレクトリへの配置と .published.json の更新。"""
+
+    def __init__(self, app_dir: Path):
+        self.app_dir = app_dir
+        self.path = app_dir / MANIFEST_NAME
+
+    def _read(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {"version": 1, "seq": 0, "files": {}}
+
+    def _write(self, man: dict) -> None:
+        tmp = self.path.with_name(f"{self.path.name}.tmp{os.getpid()}")
+        tmp.write_text(json.dumps(man, ensure_ascii=False, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+    def known_sha(self, name: str) -> str | None:
+        """配置済みの name の sha256（記録と大きさ・mtime が一致するときだけ。読み直さない）。"""
+        ent = self._read()["files"].get(name)
+        try:
+            st = (self.app_dir / name).stat()
+        except FileNotFoundError:
+            return None
+        if ent and (ent["size"], ent["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+            return ent["sha256"]
+        return None
+
+    def put(self, src: Path, name: str) -> str | None:
+        """src を app_dir/name に配置し、使った方法（reflink/hardlink/copy）を返す。
+
+        中身が変わらず書かなかったら None。
+        """
+        dst = self.app_dir / name
+        sha = buildcache.sha256_file(src)
+        with open(self.app_dir / ".published.lock", "w") as lockf:
+            if fcntl:
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+            man = self._read()
+            ent = man["files"].get(name)
+            try:
+                st = dst.stat()
+            except FileNotFoundError:
+                st = None
+            if st is not None:
+                if ent and (ent["size"], ent["mtime_ns"]) == (st.st_size, st.st_mtime_ns):
+                    same = ent["sha256"] == sha
+                else:
+                    # 記録が無い・手で置き換えられた → 配置先を読んで比べる
+                    same = st.st_size == src.stat().st_size and buildcache.sha256_file(dst) == sha
+                if same:
+                    if not ent or ent["sha256"] != sha or ent["mtime_ns"] != st.st_mtime_ns:
+                        man["files"][name] = self._entry(man, sha, st, ent)
+                        self._write(man)
+                    return None
+
+            tmp = self.app_dir / f".{name}.tmp{os.getpid()}"
+            tmp.unlink(missing_ok=True)
+            try:
+                how = _stage(src, tmp)
+                os.replace(tmp, dst)
+            finally:
+                tmp.unlink(missing_ok=True)
+            man["seq"] += 1
+            man["files"][name] = self._entry(man, sha, dst.stat(), None)
+            self._write(man)
+            return how
+
+    @staticmethod
+    def _entry(man: dict, sha: str, st: os.stat_result, old: dict | None) -> dict:
+        return {"sha256": sha, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                "seq": old["seq"] if old and old["sha256"] == sha else man["seq"],
+                "published_at": (old["published_at"] if old and old["sha256"] == sha
+                                 else datetime.now().strftime("%Y-%m-%d %H:%M:%S"))}
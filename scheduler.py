@@ -0,0 +1,116 @@
+# scheduler.py — batch_build のジョブ順序決め（過去のビルド時間から長いものを先に）
+#
+# 各ジョブの所要時間を buildjournal の成功記録（同じ授業・同じバリアントの中央値、
+# 無ければ別バリアントの中央値）から見積もり、記録の無い授業は content.tex の
+# フレーム数 × フレームあたりの秒数（記録のある授業から求める）で見積もる。
+# 長いものから順に、並列数とメモリの予算に収まる範囲で開始する（LPT スケジューリング）。
+# 見積もりからの予測終了時間も出すので、実績と比べて見積もりの当たり具合がわかる。
+from __future__ import annotations
+from collections import defaultdict
+from pathlib import Path
+import heapq
+import statistics
+
+import buildjournal
+import framescan
+import slideinfo
+
+DEFAULT_PER_FRAME_S = 0.15  # 記録が1件も無いときのフレームあたりの秒数
+BASE_S = 2.0                # 1回のビルドの固定分（latexmk の起動など）
+BASE_MEM_MB = 400           # lualatex 1プロセスのおおよその常駐量
+MEM_PER_FRAME_MB = 2
+
+def load_history(path: Path = buildjournal.JOURNAL_PATH) -> dict:
+    """(科目, 授業, バリアント) → 成功ビルドの所要秒数のリスト。"""
+    recs, _ = buildjournal.read_records(path)
+    hist = defaultdict(list)
+    for r in recs:
+        # --page・--draft のビルドは全体の見積もりには使わない
+        flags = r.get("flags") or {}
+        if r.get("outcome") == "ok" and not flags.get("page") and not flags.get("draft"):
+            hist[(r["subject"], r["course"], r["variant"])].append(r["total"])
+    return hist
+
+def count_frames(subject: str, course: str) -> int:
+    p = Path(__file__).parent.parent / slideinfo.slidedir(subject, course) / "content.tex"
+    try:
+        return len(framescan.frame_positions(p.read_text(encoding="utf-8")))
+    except (OSError, UnicodeDecodeError):
+        return 0
+
+def estimate(jobs: list[dict], hist: dict) -> None:
+    """各ジョブに "cost"（秒）・"mem"（MB）・"source"（見積もりの根拠）を入れる。"""
+    by_course = defaultdict(list)
+    for (subj, course, _), ts in hist.items():
+        by_course[(subj, course)].extend(ts)
+    for j in jobs:
+        j["frames"] = count_frames(j["subject"], j["course"])
+
+    # フレームあたりの秒数は記録のある授業から求める
+    pairs = [(statistics.median(by_course[(j["subject"], j["course"])]), j["frames"])
+             for j in jobs if by_course.get((j["subject"], j["course"])) and j["frames"]]
+    per_frame = (sum(max(0.0, t - BASE_S) for t, _ in pairs) / sum(n for _, n in pairs)
+                 if pairs else DEFAULT_PER_FRAME_S)
+
+    for j in jobs:
+        same = hist.get((j["subject"], j["course"], j["variant"]))
+        other = by_course.get((j["subject"], j["course"]))
+        if same:
+            j["cost"], j["source"] = statistics.median(same), "記録"
+        elif other:
+            j["cost"], j["source"] = statistics.median(other), "記録(別バリアント)"
+        else:
+            j["cost"], j["source"] = BASE_S + per_frame * j["frames"], f"{j['frames']}フレーム"
+        j["mem"] = BASE_MEM_MB + MEM_PER_FRAME_MB * j["frames"]
+
+def order(jobs: list[dict]) -> list[dict]:
+    return sorted(jobs, key=lambda j: j["cost"], reverse=True)
+
+def simulate(costs: list[float], workers: int) -> float:
+    """costs をこの順に空いたワーカーへ割り当てたときの全体の終了時間。"""
+    free = [0.0] * max(1, workers)
+    for c in costs:
+        t = heapq.heappop(free)
+        heapq.heappush(free, t + c)
+    return max(free)
+
+def mem_available_mb() -> int | None:
+    """/proc/meminfo の MemAvailable（Linux 以外は None）。"""
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+class Dispatcher:
+    """jobs の順（通常は order() の長いもの順）に、並列数とメモリ予算に収まるジョブを取り出す。"""
+
+    def __init__(self, jobs: list[dict], workers: int, mem_budget_mb: int | None):
+        self.pending = list(jobs)
+        self.workers = max(1, workers)
+        self.budget = mem_budget_mb
+        self.running = 0
+        self.mem = 0
+
+    def take(self) -> list[dict]:
+        out = []
+        while self.pending and self.running < self.workers:
+            pick = None
+            for k, j in enumerate(self.pending):
+                # 予算を超える場合はより小さいジョブで埋める（何も動いていなければ必ず1つ出す）
+                if self.budget is None or self.mem + j["mem"] <= self.budget or self.running == 0:
+                    pick = self.pending.pop(k)
+                    break
+            if pick is None:
+                break
+            self.running += 1
+            self.mem += pick["mem"]
+            out.append(pick)
+        return out
+
+    def done(self, job: dict) -> None:
+        self.running -= 1
+        self.mem -= job["mem"]
@@ -1,71 +1,277 @@
 from datetime import datetime
 from pathlib import Path
 import json
+import os
+import sqlite3
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows では排他なし
+    fcntl = None
 
 build_slide = Path(__file__).parent
-def readslidejson():
-    filename = build_slide / "slideinfo.json"
+JSON_PATH = build_slide / "slideinfo.json"
+# slideinfo.db があれば SQLite を使う（python slideinfo.py to-sqlite で作成）
+DB_PATH = build_slide / "slideinfo.db"
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def _bump(entry, dt):
+    if entry['count'] > 0:
+        entry['update_at'] = dt
+    else:
+        entry['created_at'] = dt
+    entry['count'] += 1
+
+class SlideInfo:
+    """slideinfo.json をプロセス内で1回だけ読み、参照はメモリから返す。
+
+    更新はロックファイルで排他し、ディスク上の最新内容に反映してから
+    一時ファイル＋rename で置き換える（途中で落ちても壊れたファイルを残さない）。
+    """
+
+    def __init__(self, path=JSON_PATH):
+        self.path = Path(path)
+        self._sdic = None
+        self._mu = threading.Lock()
+
+    def data(self):
+        if self._sdic is None:
+            with self._mu:
+                if self._sdic is None:
+                    self._sdic = self._read()
+        return self._sdic
+
+    def reload(self):
+        self._sdic = None
+        return self.data()
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write(self, sdic):
+        tmp = self.path.with_name(f".{self.path.name}.tmp{os.getpid()}")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(sdic, f, ensure_ascii=False, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def _locked(self, fn):
+        # fn(最新の辞書) で書き換えて保存する
+        with self._mu, open(self.path.with_name(self.path.name + ".lock"), 'w') as lockf:
+            if fcntl:
+                fcntl.flock(lockf, fcntl.LOCK_EX)
+            sdic = self._read()
+            fn(sdic)
+            self._write(sdic)
+            self._sdic = sdic
+
+    def save(self, sdic):
+        self._locked(lambda cur: (cur.clear(), cur.update(sdic)))
+
+    def subjects(self):
+        return list(self.data().keys())
+
+    def courses(self, subject):
+        # 'dir' 以外のキーが授業番号
+        return [k for k in self.data()[subject] if k != 'dir']
+
+    def dir(self, subject):
+        return self.data()[subject]['dir']
+
+    def title(self, subject, course):
+        return self.data()[subject][course]['title']
+
+    def update(self, subject, course, dt=None):
+        dt = dt or _now()
+
+        def bump(sdic):
+            if subject not in sdic:
+                raise KeyError(f"Key '{subject}' not found in slideinfo.json")
+            if course not in sdic[subject]:
+                raise KeyError(f"course Key '{course}' not found in slideinfo.json")
+            _bump(sdic[subject][course], dt)
+        self._locked(bump)
+
+    def update_many(self, items):
+        # [(subject, course, dt), ...] を1回の書き込みで反映する（未登録の授業は飛ばす）
+        def bump(sdic):
+            for subject, course, dt in items:
+                if course in sdic.get(subject, {}) and course != 'dir':
+                    _bump(sdic[subject][course], dt)
+                else:
+                    print(f'** ({subject} {course}) は存在しません **')
+        self._locked(bump)
 
-    with open(filename, 'r', encoding='utf-8') as f:
-        # json.load() を使ってファイルオブジェクトから直接辞書を読み込む
-        sdic = json.load(f)
-    return sdic
+class SqliteSlideInfo:
+    """大規模な科目一覧向けの SQLite 版。更新は UPDATE 1文なので排他は SQLite に任せる。"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS subjects (subject TEXT PRIMARY KEY, dir TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS courses (
+        subject TEXT NOT NULL, course TEXT NOT NULL, title TEXT,
+        count INTEGER NOT NULL DEFAULT 0, created_at TEXT, update_at TEXT,
+        PRIMARY KEY (subject, course));
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = Path(path)
+        self._local = threading.local()
+
+    def _db(self):
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            db.executescript(self.SCHEMA)
+            self._local.db = db
+        return db
+
+    def data(self):
+        # JSON 版と同じ形の辞書を返す
+        db = self._db()
+        sdic = {s: {'dir': d} for s, d in db.execute("SELECT subject, dir FROM subjects ORDER BY subject")}
+        rows = db.execute("SELECT subject, course, title, count, created_at, update_at "
+                          "FROM courses ORDER BY subject, course")
+        for s, c, title, count, created, updated in rows:
+            entry = {'count': count, 'created_at': created, 'update_at': updated}
+            if title is not None:
+                entry['title'] = title
+            sdic.setdefault(s, {'dir': ''})[c] = entry
+        return sdic
+
+    def reload(self):
+        return self.data()
+
+    def save(self, sdic):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.execute("DELETE FROM courses")
+            db.execute("DELETE FROM subjects")
+            for s, v in sdic.items():
+                db.execute("INSERT INTO subjects VALUES (?, ?)", (s, v.get('dir', '')))
+                for c, e in v.items():
+                    if c == 'dir':
+                        continue
+                    db.execute("INSERT INTO courses VALUES (?, ?, ?, ?, ?, ?)",
+                               (s, c, e.get('title'), e.get('count', 0),
+                                e.get('created_at'), e.get('update_at')))
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+    def subjects(self):
+        return [r[0] for r in self._db().execute("SELECT subject FROM subjects ORDER BY subject")]
+
+    def courses(self, subject):
+        rows = self._db().execute("SELECT course FROM courses WHERE subject=? ORDER BY course", (subject,))
+        return [r[0] for r in rows]
+
+    def dir(self, subject):
+        r = self._db().execute("SELECT dir FROM subjects WHERE subject=?", (subject,)).fetchone()
+        if r is None:
+            raise KeyError(subject)
+        return r[0]
+
+    def title(self, subject, course):
+        r = self._db().execute("SELECT title FROM courses WHERE subject=? AND course=?",
+                               (subject, course)).fetchone()
+        if r is None or r[0] is None:
+            raise KeyError(course)
+        return r[0]
+
+    def update(self, subject, course, dt=None):
+        dt = dt or _now()
+        db = self._db()
+        if db.execute("SELECT 1 FROM subjects WHERE subject=?", (subject,)).fetchone() is None:
+            raise KeyError(f"Key '{subject}' not found in slideinfo.db")
+        cur = db.execute(
+            "UPDATE courses SET "
+            " created_at = CASE WHEN count > 0 THEN created_at ELSE ? END,"
+            " update_at = CASE WHEN count > 0 THEN ? ELSE update_at END,"
+            " count = count + 1 "
+            "WHERE subject=? AND course=?", (dt, dt, subject, course))
+        if cur.rowcount == 0:
+            raise KeyError(f"course Key '{course}' not found in slideinfo.db")
+
+    def update_many(self, items):
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            for subject, course, dt in items:
+                try:
+                    self.update(subject, course, dt)
+                except KeyError:
+                    print(f'** ({subject} {course}) は存在しません **')
+            db.execute("COMMIT")
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+_repo = None
+_repo_mu = threading.Lock()
+
+def repository():
+    """プロセスで共有するリポジトリ（slideinfo.db があれば SQLite 版）。"""
+    global _repo
+    if _repo is None:
+        with _repo_mu:
+            if _repo is None:
+                _repo = SqliteSlideInfo() if DB_PATH.exists() else SlideInfo()
+    return _repo
+
+def readslidejson():
+    return repository().data()
 
 def outputslidejson(sdic):
-    # ファイルを開いて辞書をJSON形式で書き出す
-    # 'w' モードでファイルを開く（ファイルが存在しない場合は新規作成、存在する場合は上書き）
-    filename = build_slide / "slideinfo.json"
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(sdic, f, ensure_ascii=False, indent=4)
+    repository().save(sdic)
 
 def slidedir(subject,course):
-    sdic = readslidejson()
     # 1. subject の存在チェック
     try:
-        _ = sdic[subject] # 値は必要ないが、アクセスを試みる
-        return f"{sdic[subject]['dir']}/{course}"
+        return f"{repository().dir(subject)}/{course}"
     except KeyError:
         print(f'** ({subject}) は存在しません **')
         return None
 
 def slidetitle(subject,course):
-    sdic = readslidejson()
     # 1. subject の存在チェック
     try:
-        _ = sdic.get(subject) # 値は必要ないが、アクセスを試みる
-        return sdic[subject][course]['title']
+        return repository().title(subject, course)
     except KeyError:
         print(f'** ({subject}) にtitleが存在しません **')
         return 'unknownTitle'
 
 def slideinfoupdate(subject,course):
-    sdic = readslidejson()
-    dt=datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-    if subject not in sdic:
-        raise KeyError(f"Key '{subject}' not found in slideinfo.json")   
-    if course not in sdic[subject]:
-        raise KeyError(f"course Key '{course}' not found in slideinfo.json")
-    
-    if sdic[subject][course]['count']>0:
-        sdic[subject][course]['update_at']=dt
-    else:
-        sdic[subject][course]['created_at']=dt
-    sdic[subject][course]['count']+=1
-    
-    # ファイルを開いて辞書をJSON形式で書き出す
-    outputslidejson(sdic)
+    repository().update(subject, course)
 
 def slide_getdir(subject):
-    sdic = readslidejson()
-    return sdic[subject]['dir']
+    return repository().dir(subject)
+
+def slide_subjects():
+    return repository().subjects()
+
+def slide_courses(subject):
+    return repository().courses(subject)
 
 
 if __name__ == '__main__':
+    if sys.argv[1:] == ['to-sqlite']:
+        # slideinfo.json の内容で slideinfo.db を作る（以後は SQLite 版が使われる）
+        SqliteSlideInfo().save(SlideInfo().data())
+        print(f'✅ {DB_PATH} を作成しました')
+        sys.exit(0)
+
     wdir=slidedir('1020801','04')
     if not wdir:
         print('error')
     else:
         print(wdir)
 
-    print(slidetitle('1020801','05'))
\ No newline at end of file
+    print(slidetitle('1020801','05'))
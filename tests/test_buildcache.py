@@ -0,0 +1,85 @@
+# test_buildcache.py — buildcache のキー・index・LRU 追い出し
+from __future__ import annotations
+from pathlib import Path
+import json
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import buildcache
+
+TEX = "\\documentclass{beamer}\n\\begin{document}\n\\end{document}\n"
+FLAGS = {"ho": False, "tech": False, "page": ""}
+
+def make_pdf(path: Path, data: bytes) -> Path:
+    path.write_bytes(data)
+    return path
+
+def test_base_key_depends_on_text_and_flags():
+    key = buildcache.BuildCache.base_key
+    assert key(TEX, FLAGS) == key(TEX, dict(reversed(FLAGS.items())))   # フラグの順番には依らない
+    assert key(TEX, FLAGS) != key(TEX + "%", FLAGS)
+    assert key(TEX, FLAGS) != key(TEX, {**FLAGS, "ho": True})
+
+def test_full_key_depends_on_dependency_digests():
+    full = buildcache.BuildCache.full_key
+    assert full("b", {"x": "1", "y": "2"}) == full("b", {"y": "2", "x": "1"})
+    assert full("b", {"x": "1"}) != full("b", {"x": "2"})
+    assert full("b", {}) != full("c", {})
+
+def test_hit_until_input_changes(tmp_path):
+    cache = buildcache.BuildCache(tmp_path / "cache")
+    dep = tmp_path / "fig.tex"
+    dep.write_text("A", encoding="utf-8")
+    pdf = make_pdf(tmp_path / "main.pdf", b"%PDF-1")
+    assert cache.lookup(TEX, FLAGS) is None
+    blob = cache.store(TEX, FLAGS, pdf, [dep])
+    assert cache.lookup(TEX, FLAGS) == blob
+    assert cache.lookup(TEX, {**FLAGS, "tech": True}) is None
+    # 入力ファイルが変われば外れる（サイズを変えて mtime の記憶を確実に無効にする）
+    dep.write_text("AB", encoding="utf-8")
+    assert cache.lookup(TEX, FLAGS) is None
+
+def test_index_is_shared_and_merged(tmp_path):
+    d = tmp_path / "cache"
+    a, b = buildcache.BuildCache(d), buildcache.BuildCache(d)
+    a.store(TEX, FLAGS, make_pdf(tmp_path / "a.pdf", b"A"), [])
+    # b は古い index を持ったまま書くが、a のエントリは消さない
+    b.store(TEX + "%b", FLAGS, make_pdf(tmp_path / "b.pdf", b"B"), [])
+    idx = json.loads((d / buildcache.INDEX_NAME).read_text(encoding="utf-8"))
+    assert len(idx["entries"]) == 2
+    assert buildcache.BuildCache(d).lookup(TEX, FLAGS) is not None
+
+def test_missing_blob_drops_entry(tmp_path):
+    cache = buildcache.BuildCache(tmp_path / "cache")
+    blob = cache.store(TEX, FLAGS, make_pdf(tmp_path / "a.pdf", b"A"), [])
+    blob.unlink()
+    assert cache.lookup(TEX, FLAGS) is None
+    assert buildcache.BuildCache(tmp_path / "cache")._index["entries"] == {}
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = buildcache.BuildCache(tmp_path / "cache", max_bytes=250)
+    texs = [f"{TEX}%{k}" for k in range(3)]
+    for k, tex in enumerate(texs[:2]):
+        cache.store(tex, FLAGS, make_pdf(tmp_path / f"{k}.pdf", bytes([k]) * 100), [])
+        time.sleep(0.01)
+    assert cache.lookup(texs[0], FLAGS) is not None      # 0 を使ったので 1 が一番古い
+    time.sleep(0.01)
+    cache.store(texs[2], FLAGS, make_pdf(tmp_path / "2.pdf", b"\x02" * 100), [])
+    assert cache.lookup(texs[1], FLAGS) is None
+    assert cache.lookup(texs[0], FLAGS) is not None
+    assert cache.lookup(texs[2], FLAGS) is not None
+    assert cache.total_bytes() <= 250
+    assert len(list((tmp_path / "cache").glob("*.pdf"))) == 2
+
+def test_restore_replaces_old_blob(tmp_path):
+    # 同じ main.tex を入力が変わってから入れ直すと、使われなくなった古い PDF は消える
+    cache = buildcache.BuildCache(tmp_path / "cache")
+    dep = tmp_path / "fig.tex"
+    dep.write_text("A", encoding="utf-8")
+    old = cache.store(TEX, FLAGS, make_pdf(tmp_path / "a.pdf", b"A"), [dep])
+    dep.write_text("AB", encoding="utf-8")
+    new = cache.store(TEX, FLAGS, make_pdf(tmp_path / "b.pdf", b"B"), [dep])
+    assert old != new and not old.exists()
+    assert cache.lookup(TEX, FLAGS) == new
+    assert cache.total_bytes() == 1
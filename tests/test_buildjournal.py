@@ -0,0 +1,89 @@
+# test_buildjournal.py — buildlog.jsonl の追記・集計（stats）と slideinfo への反映（sync）
+from __future__ import annotations
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import buildjournal
+import slideinfo
+
+def rec(course: str, total: float, outcome: str = "ok", ts: str = "2026-04-01 10:00:00",
+        **flags) -> dict:
+    return {"ts": ts, "subject": "2021901", "course": course, "variant": "pr",
+            "flags": {"ho": False, "tech": False, "page": "", **flags},
+            "phases": {"latexmk": total * 0.8, "load": total * 0.2}, "total": total,
+            "passes": 2, "pdf_size": 1000, "outcome": outcome}
+
+@pytest.fixture
+def journal(tmp_path, monkeypatch):
+    path = tmp_path / "buildlog.jsonl"
+    read = buildjournal.read_records
+    monkeypatch.setattr(buildjournal, "read_records", lambda p=path, start=0: read(p, start))
+    monkeypatch.setattr(buildjournal, "SYNCED_PATH", tmp_path / "buildlog.jsonl.synced")
+    info = tmp_path / "slideinfo.json"
+    info.write_text(json.dumps({"2021901": {
+        "dir": "2021901.科目",
+        "01": {"title": "一", "count": 0, "created_at": "", "update_at": ""},
+        "02": {"title": "二", "count": 3, "created_at": "2025-01-01 00:00:00", "update_at": ""},
+    }}, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(slideinfo, "_repo", slideinfo.SlideInfo(info))
+    return path
+
+def test_read_records_skips_partial_last_line(journal):
+    buildjournal.append(rec("01", 1.0), journal)
+    with open(journal, "ab") as f:
+        f.write(b'{"ts": "2026')      # 書きかけ
+    recs, end = buildjournal.read_records(journal)
+    assert len(recs) == 1 and end == journal.read_bytes().index(b'{"ts": "2026')
+
+def test_track_records_outcome(journal, monkeypatch):
+    append = buildjournal.append
+    monkeypatch.setattr(buildjournal, "append", lambda r, path=journal: append(r, path))
+    with buildjournal.track("2021901", "01", "pr", {"page": ""}) as ph:
+        ph.add_passes(2)
+    with pytest.raises(SystemExit):
+        with buildjournal.track("2021901", "01", "pr", {"page": ""}):
+            sys.exit(1)
+    recs, _ = buildjournal.read_records(journal)
+    assert [(r["outcome"], r["passes"]) for r in recs] == [("ok", 2), ("fail", 0)]
+
+def test_percentile_and_summarize():
+    v = [1.0, 2.0, 3.0, 4.0, 10.0]
+    assert buildjournal.percentile(v, 50) == 3.0
+    assert buildjournal.percentile(v, 95) == 10.0
+    assert buildjournal.summarize([rec("01", t) for t in (3.0, 1.0, 2.0)]) == {
+        "n": 3, "p50": 2.0, "p95": 3.0, "max": 3.0}
+
+def test_stats_lists_slowest_courses(journal, capsys):
+    for t in (1.0, 2.0, 3.0):
+        buildjournal.append(rec("01", t), journal)
+    buildjournal.append(rec("02", 9.0), journal)
+    buildjournal.append(rec("02", 99.0, outcome="fail"), journal)
+    buildjournal.stats([], top=1)
+    out = capsys.readouterr().out
+    assert "成功 4 / 失敗 1" in out
+    slow = out.split("遅い授業")[1]
+    assert "2021901 02  p50=9.0s" in slow and "2021901 01" not in slow
+
+def test_sync_counts_only_published_builds_once(journal, capsys):
+    buildjournal.append(rec("01", 1.0, ts="2026-04-01 10:00:00"), journal)
+    buildjournal.append(rec("01", 1.0, outcome="fail"), journal)
+    buildjournal.append(rec("01", 1.0, draft=True), journal)
+    buildjournal.append(rec("01", 1.0, page="3"), journal)
+    buildjournal.append(rec("02", 1.0, ts="2026-04-02 10:00:00"), journal)
+    buildjournal.sync()
+    assert "2 件を slideinfo に反映しました" in capsys.readouterr().out
+    data = slideinfo.repository().reload()["2021901"]
+    assert (data["01"]["count"], data["01"]["created_at"]) == (1, "2026-04-01 10:00:00")
+    assert (data["02"]["count"], data["02"]["update_at"]) == (4, "2026-04-02 10:00:00")
+
+    # 反映済みの位置から先だけを読む
+    buildjournal.sync()
+    assert "0 件" in capsys.readouterr().out
+    buildjournal.append(rec("01", 1.0, ts="2026-04-03 10:00:00"), journal)
+    buildjournal.sync()
+    data = slideinfo.repository().reload()["2021901"]
+    assert (data["01"]["count"], data["01"]["update_at"]) == (2, "2026-04-03 10:00:00")
@@ -0,0 +1,82 @@
+# test_frameindex.py — .frameindex.json の作成・再利用と --page の指定
+from __future__ import annotations
+from pathlib import Path
+import argparse
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import frameindex
+
+CONTENT = "\n".join([
+    "% 前置き",
+    "\\begin{frame}{はじめに}\\label{intro}",
+    "あ",
+    "\\end{frame}",
+    "\\begin{frame}[label=arr]{配列とリスト}",
+    "い",
+    "\\end{frame}",
+    "\\againframe{intro}",
+    "\\begin{frame}{まとめ}\\label{summary}",
+    "う",
+    "\\end{frame}",
+    "",
+])
+
+@pytest.fixture
+def content(tmp_path):
+    p = tmp_path / "content.tex"
+    p.write_text(CONTENT, encoding="utf-8")
+    return p
+
+def test_build_index_uses_byte_offsets(content):
+    data = content.read_bytes()
+    idx = frameindex.load_index(content)
+    assert [(f["n"], f["label"], f["title"]) for f in idx["frames"]] == [
+        (1, "intro", "はじめに"), (2, "arr", "配列とリスト"), (3, "summary", "まとめ")]
+    f = idx["frames"][1]
+    assert data[f["start"]:f["end"]].decode("utf-8") == "\\begin{frame}[label=arr]{配列とリスト}\nい\n\\end{frame}"
+
+def test_index_is_reused_and_rebuilt(content, monkeypatch):
+    frameindex.load_index(content)
+    assert frameindex.index_path(content).exists()
+    calls = []
+    monkeypatch.setattr(frameindex, "build_index", lambda data: calls.append(data) or {})
+    frameindex.load_index(content)
+    assert calls == []      # mtime・サイズが同じなら読み直さない
+    st = content.stat()
+    os.utime(content, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    frameindex.load_index(content)
+    assert calls == []      # mtime だけ変わっても内容が同じなら作り直さない
+    monkeypatch.undo()
+    content.write_text(CONTENT.replace("まとめ", "おわりに"), encoding="utf-8")
+    assert frameindex.load_index(content)["frames"][2]["title"] == "おわりに"
+
+@pytest.mark.parametrize("spec, pages", [
+    ("2", (2, 2)),
+    ("label:summary", (3, 3)),
+    ("label:intro..label:arr", (1, 2)),
+    ("2..label:summary", (2, 3)),
+    ("title:配列", (2, 2)),
+    ("リスト", (2, 2)),
+    ("3..1", (3, 3)),
+])
+def test_resolve_page_spec(content, spec, pages):
+    assert frameindex.resolve_page_spec(spec, frameindex.load_index(content)) == pages
+
+@pytest.mark.parametrize("spec", ["label:none", "title:存在しない"])
+def test_resolve_page_spec_errors(content, spec):
+    with pytest.raises(argparse.ArgumentTypeError):
+        frameindex.resolve_page_spec(spec, frameindex.load_index(content))
+
+def test_extract_and_line_segments(content):
+    data = content.read_bytes()
+    idx = frameindex.load_index(content)
+    body = frameindex.extract(data, idx, 2, 3)
+    assert body.startswith("\\begin{frame}[label=arr]") and body.endswith("う\n\\end{frame}")
+    segs = frameindex.line_segments(data, idx, 2, 3)
+    assert segs == [(1, 5), (5, 9)]
+    lines = body.split("\n")
+    assert lines[segs[1][0] - 1] == CONTENT.split("\n")[segs[1][1] - 1]
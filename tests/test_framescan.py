@@ -0,0 +1,70 @@
+# test_framescan.py — framescan のフレーム検出（コメント・verbatim・\againframe・オプション）
+from __future__ import annotations
+from pathlib import Path
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bench_slides
+import framescan
+
+def titles(tex: str) -> list[str]:
+    return [f.title for f in framescan.scan_frames(tex)]
+
+def test_plain_frames_and_positions():
+    tex = "\\begin{frame}{A}\n\\label{a}\nx\n\\end{frame}\n\\begin{frame}[t]{B}y\\end{frame}\n"
+    frames = framescan.scan_frames(tex)
+    assert [(f.title, f.label) for f in frames] == [("A", "a"), ("B", "")]
+    assert framescan.frame_positions(tex) == [(f.start, f.end) for f in frames]
+    assert tex[frames[1].start:frames[1].end] == "\\begin{frame}[t]{B}y\\end{frame}"
+
+def test_commented_frames_are_ignored():
+    tex = "\n".join([
+        "% \\begin{frame}{旧}",
+        "% \\end{frame}",
+        "\\begin{frame}{A} 50\\% % \\end{frame} はコメント",
+        "\\end{frame}",
+        "x \\\\% \\begin{frame}{改行の後ろはコメント}",
+    ])
+    assert titles(tex) == ["A"]
+    assert framescan.frame_positions(tex) == [(tex.index("\\begin{frame}{A}"), tex.rindex("\\end{frame}") + 11)]
+
+def test_end_frame_inside_minted_and_verb():
+    tex = "\n".join([
+        "\\begin{frame}[fragile]{コード}",
+        "\\begin{minted}{latex}",
+        "\\end{frame}",
+        "\\begin{frame}{偽}",
+        "\\end{minted}",
+        "\\verb|\\end{frame}|",
+        "\\end{frame}",
+    ])
+    frames = framescan.scan_frames(tex)
+    assert [f.title for f in frames] == ["コード"]
+    assert frames[0].end == len(tex)
+
+def test_againframe():
+    tex = "\\begin{frame}[label=intro]{A}x\\end{frame}\n\\againframe<2>{intro}\n% \\againframe{old}\n"
+    frames = framescan.scan_frames(tex)
+    assert [(f.again, f.label) for f in frames] == [(False, "intro"), (True, "intro")]
+    assert framescan.frame_positions(tex) == [(frames[0].start, frames[0].end)]
+
+def test_fragile_and_label_options():
+    tex = ("\\begin{frame}[fragile=singleslide, label=code]{A}x\\end{frame}"
+           "\\begin{frame}[allowframebreaks]<2->{B}\\label{b}y\\end{frame}"
+           "\\begin{frame}\\frametitle{C}z\\end{frame}")
+    frames = framescan.scan_frames(tex)
+    assert [(f.title, f.label, f.fragile) for f in frames] == [
+        ("A", "code", True), ("B", "b", False), ("C", "", False)]
+    assert frames[0].options == "fragile=singleslide, label=code"
+
+def test_unclosed_frame_is_skipped():
+    tex = "\\begin{frame}{書きかけ}\n本文\n\\begin{frame}{A}x\\end{frame}\n"
+    assert titles(tex) == ["A"]
+
+def test_matches_legacy_on_synthetic_decks():
+    for tex in (bench_slides.synthetic_deck(30), bench_slides.one_line_deck(30),
+                bench_slides.one_line_deck(30, escaped_pct=True)):
+        assert framescan.frame_positions(tex) == bench_slides.legacy_frame_positions(tex)
+    # 書きかけ・コメントアウトしたフレームは legacy と違って数えない
+    tex = bench_slides.synthetic_deck(30, commented_every=10, unclosed=3)
+    assert len(framescan.frame_positions(tex)) == 30
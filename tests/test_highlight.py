@@ -0,0 +1,77 @@
+# test_highlight.py — minted の前処理（行数を保つこと・キャッシュ・minted のまま残す場合）
+from __future__ import annotations
+from pathlib import Path
+import sys
+
+import pytest
+
+pytest.importorskip("pygments")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import highlight
+
+MAIN = "\n".join([
+    "\\documentclass{beamer}",
+    "\\usepackage[cache=false]{minted}",
+    "\\setminted{",
+    "  fontsize=\\small,",
+    "  autogobble,",
+    "}",
+    "\\newcommand{\\codedir}{../code/}",
+    "\\begin{document}",
+    "\\begin{frame}[fragile]{A}",
+    "\\begin{minted}[linenos]{python}",
+    "def f(x):",
+    "    return x  # 100%",
+    "\\end{minted}",
+    "MARK-1",
+    "\\inputminted{c}{\\codedir hello.c}",
+    "% \\begin{minted}{c}",
+    "% \\end{minted}",
+    "MARK-2",
+    "\\end{frame}",
+    "\\end{document}",
+    "",
+])
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.delenv("BUILD_SLIDES_MINTED", raising=False)
+    r = tmp_path / "build_slide"
+    (r / "build").mkdir(parents=True)
+    (tmp_path / "code").mkdir()
+    (tmp_path / "code" / "hello.c").write_text("int main(void)\n{\n  return 0;\n}\n", encoding="utf-8")
+    return r
+
+def test_prerender_preserves_line_numbers(root):
+    out = highlight.prerender(MAIN, root)
+    src, dst = MAIN.split("\n"), out.split("\n")
+    assert len(dst) == len(src)
+    for mark in ("MARK-1", "MARK-2", "\\end{document}", "\\begin{frame}[fragile]{A}"):
+        assert dst.index(mark) == src.index(mark)
+    assert "\\usepackage{fvextra}" in dst[1]
+    assert dst[2].startswith("\\fvset{fontsize=\\small")    # autogobble は Verbatim に無いので落ちる
+    assert dst[12].startswith("\\input{../.cache/pyg/")       # ブロックの最後の行に \input を置く
+    assert dst[14].startswith("\\input{../.cache/pyg/")       # \inputminted もその行で置き換わる
+    assert dst[15:17] == src[15:17]                           # コメント中の minted はそのまま
+    assert not highlight.needs_shell_escape(out)
+
+def test_prerender_caches_by_content(root):
+    highlight.prerender(MAIN, root)
+    d = highlight.cache_dir(root)
+    before = {p.name: p.stat().st_mtime_ns for p in d.iterdir()}
+    assert len([n for n in before if not n.startswith("style-")]) == 2
+    assert highlight.prerender(MAIN, root) == highlight.prerender(MAIN, root)
+    assert {p.name: p.stat().st_mtime_ns for p in d.iterdir()} == before
+    highlight.prerender(MAIN.replace("return x", "return -x"), root)
+    assert len(list(d.iterdir())) == len(before) + 1
+
+def test_keeps_minted_when_something_is_left(root):
+    tex = MAIN.replace("MARK-1", "\\mintinline{c}{int x;}")
+    out = highlight.prerender(tex, root)
+    assert len(out.split("\n")) == len(tex.split("\n"))
+    assert "\\usepackage[cache=false]{minted}" in out and "\\setminted{" in out
+    assert highlight.needs_shell_escape(out)
+
+def test_disabled_by_environment(root, monkeypatch):
+    monkeypatch.setenv("BUILD_SLIDES_MINTED", "1")
+    assert highlight.prerender(MAIN, root) == MAIN
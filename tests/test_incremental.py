@@ -0,0 +1,88 @@
+# test_incremental.py — --incremental のフレーム単位への分割と連結（擬似 latexmk・qpdf の砂場で実行）
+from __future__ import annotations
+from pathlib import Path
+import os
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bench_slides
+import incremental
+
+# 擬似 qpdf: --empty --pages a.pdf b.pdf ... -- out.pdf を単純なバイト列の連結にする
+STUB_QPDF = """#!/usr/bin/env python3
+import sys
+args = sys.argv[1:]
+ins = args[args.index("--pages") + 1:args.index("--")]
+with open(args[-1], "wb") as out:
+    for p in ins:
+        out.write(open(p, "rb").read())
+"""
+
+def test_split_units_attaches_text_between_frames_to_next_frame():
+    body = "\n".join([
+        r"\section{A}",
+        r"\begin{frame}{1}x\end{frame}",
+        r"\teacherframe{t}",
+        r"% \begin{frame}{old}\end{frame}",
+        r"\begin{frame}{2}y\end{frame}",
+        r"\appendix",
+        r"\end{document}",
+    ])
+    units = incremental.split_units(body)
+    assert len(units) == 2
+    assert units[0] == "\\section{A}\n\\begin{frame}{1}x\\end{frame}"
+    assert units[1].startswith("\n\\teacherframe{t}\n% \\begin{frame}{old}")
+    assert units[1].endswith("\\begin{frame}{2}y\\end{frame}\n\\appendix")  # 最後のフレームの後ろは最後の単位へ
+    assert "\\end{document}" not in units[1]
+
+def test_split_units_without_frames():
+    assert incremental.split_units("\\section{A}\n\\end{document}\n") == []
+
+def test_counter_fixup():
+    fix = incremental.counter_fixup(3, 10)
+    assert r"\setcounter{framenumber}{2}" in fix
+    assert r"\setcounter{myframenum}{2}" in fix
+    assert r"\def\inserttotalframenumber{10}" in fix
+
+@pytest.fixture(scope="module")
+def sandbox(tmp_path_factory):
+    base = tmp_path_factory.mktemp("incremental")
+    sb = bench_slides.make_sandbox(base, subjects=1, courses=1, e2e_courses=1, frames=5, images=2)
+    sb["app_dir"] = base / f"{sb['subject']}.ベンチ科目0" / sb["courses"][0]
+    (sb["bin"] / "qpdf").write_text(STUB_QPDF, encoding="utf-8")
+    (sb["bin"] / "qpdf").chmod(0o755)
+    return sb
+
+def run_incremental(sb: dict) -> subprocess.CompletedProcess:
+    env = {**os.environ, "PATH": os.pathsep.join([str(sb["bin"]), os.environ.get("PATH", "")]),
+           "BENCH_LATEX_LATENCY": "0"}
+    res = subprocess.run([sys.executable, str(sb["root"] / "build_slides.py"), sb["subject"],
+                          sb["courses"][0], "--no-daemon", "--no-fmt", "--incremental"],
+                         cwd=sb["root"], env=env, capture_output=True, text=True, timeout=300)
+    assert res.returncode == 0, res.stdout[-2000:] + res.stderr[-2000:]
+    return res
+
+def test_merges_units_in_order_and_recompiles_only_edited_frames(sandbox):
+    res = run_incremental(sandbox)
+    assert "フレーム単位: 5 枚（タイトル除く） / 再コンパイル: 6" in res.stdout
+    build_dir = next(sandbox["root"].glob("build-*-inc"))
+    units = [build_dir / f"unit-{i:03d}.pdf" for i in range(6)]
+    merged = (sandbox["app_dir"] / "01_合成1_pr.pdf").read_bytes()
+    assert merged == b"".join(p.read_bytes() for p in units)
+
+    res = run_incremental(sandbox)
+    assert "再コンパイル: 0" in res.stdout
+
+    before = [p.stat().st_mtime_ns for p in units]
+    content = sandbox["app_dir"] / "content.tex"
+    content.write_text(content.read_text(encoding="utf-8").replace("項目 3-0", "項目 3-0 改"),
+                       encoding="utf-8")
+    res = run_incremental(sandbox)
+    assert "再コンパイル: 1" in res.stdout
+    changed = [i for i, p in enumerate(units) if p.stat().st_mtime_ns != before[i]]
+    assert changed == [3]
+    merged = (sandbox["app_dir"] / "01_合成1_pr.pdf").read_bytes()
+    assert merged == b"".join(p.read_bytes() for p in units)
@@ -0,0 +1,83 @@
+# test_publish.py — 配置（中身が同じなら書かない）と .published.json の記録
+from __future__ import annotations
+from pathlib import Path
+import json
+import os
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import buildcache
+import publish
+
+def manifest(app_dir: Path) -> dict:
+    return json.loads((app_dir / publish.MANIFEST_NAME).read_text(encoding="utf-8"))
+
+def make(path: Path, data: bytes) -> Path:
+    path.write_bytes(data)
+    return path
+
+def test_put_skips_unchanged_content(tmp_path):
+    app = tmp_path / "01"
+    app.mkdir()
+    pub = publish.Publisher(app)
+    src = make(tmp_path / "a.pdf", b"%PDF v1")
+    assert pub.put(src, "01_x.pdf") in ("reflink", "hardlink", "copy")
+    st = (app / "01_x.pdf").stat()
+    # 同じ中身なら書かない（mtime も変わらない）
+    assert pub.put(make(tmp_path / "b.pdf", b"%PDF v1"), "01_x.pdf") is None
+    assert (app / "01_x.pdf").stat().st_mtime_ns == st.st_mtime_ns
+    assert pub.put(make(tmp_path / "c.pdf", b"%PDF v2"), "01_x.pdf") is not None
+    assert (app / "01_x.pdf").read_bytes() == b"%PDF v2"
+    assert not [p for p in app.iterdir() if ".tmp" in p.name]
+
+def test_manifest_records_sha_and_sequence(tmp_path):
+    app = tmp_path / "01"
+    app.mkdir()
+    pub = publish.Publisher(app)
+    pub.put(make(tmp_path / "a.pdf", b"A"), "x.pdf")
+    pub.put(make(tmp_path / "m.tex", b"M"), "main.tex")
+    pub.put(make(tmp_path / "a2.pdf", b"A"), "x.pdf")       # 変更なしは seq を進めない
+    man = manifest(app)
+    assert man["seq"] == 2
+    assert man["files"]["x.pdf"]["seq"] == 1 and man["files"]["main.tex"]["seq"] == 2
+    assert man["files"]["x.pdf"]["sha256"] == buildcache.sha256_bytes(b"A")
+    assert pub.known_sha("x.pdf") == buildcache.sha256_bytes(b"A")
+    pub.put(make(tmp_path / "b.pdf", b"B"), "x.pdf")
+    assert manifest(app)["files"]["x.pdf"]["seq"] == 3
+
+def test_hand_replaced_file_is_compared_by_content(tmp_path):
+    app = tmp_path / "01"
+    app.mkdir()
+    pub = publish.Publisher(app)
+    pub.put(make(tmp_path / "a.pdf", b"A"), "x.pdf")
+    # 手で同じ中身に置き直された（mtime が変わった）→ 読んで比べ、書かずに記録だけ直す
+    make(app / "x.pdf", b"A")
+    os.utime(app / "x.pdf", ns=(0, 10 ** 9))
+    assert pub.known_sha("x.pdf") is None
+    assert pub.put(make(tmp_path / "a2.pdf", b"A"), "x.pdf") is None
+    assert manifest(app)["files"]["x.pdf"]["mtime_ns"] == 10 ** 9
+    assert manifest(app)["seq"] == 1
+    # 手で違う中身にされていれば書き直す
+    make(app / "x.pdf", b"Z")
+    assert pub.put(make(tmp_path / "a3.pdf", b"A"), "x.pdf") is not None
+    assert (app / "x.pdf").read_bytes() == b"A"
+
+def test_missing_destination_is_rewritten(tmp_path):
+    app = tmp_path / "01"
+    app.mkdir()
+    pub = publish.Publisher(app)
+    src = make(tmp_path / "a.pdf", b"A")
+    pub.put(src, "x.pdf")
+    (app / "x.pdf").unlink()
+    assert pub.known_sha("x.pdf") is None
+    assert pub.put(src, "x.pdf") is not None
+    assert (app / "x.pdf").read_bytes() == b"A"
+
+def test_build_outputs_are_not_hardlinked(tmp_path):
+    # .cache の外（build/main.pdf など）は次のビルドで上書きされるのでリンクしない
+    app = tmp_path / "01"
+    app.mkdir()
+    src = make(tmp_path / "main.pdf", b"A")
+    how = publish.Publisher(app).put(src, "x.pdf")
+    assert how in ("reflink", "copy")
+    assert (app / "x.pdf").stat().st_ino != src.stat().st_ino
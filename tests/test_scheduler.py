@@ -0,0 +1,60 @@
+# test_scheduler.py — batch_build のジョブ順序（所要時間の見積もり・LPT・メモリ予算）
+from __future__ import annotations
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import buildjournal
+import scheduler
+
+def job(course: str, variant: str = "pr", **kw) -> dict:
+    return {"subject": "2021901", "course": course, "variant": variant, **kw}
+
+def rec(course: str, total: float, variant: str = "pr", outcome: str = "ok", **flags) -> dict:
+    return {"ts": "2026-04-01 10:00:00", "subject": "2021901", "course": course, "variant": variant,
+            "flags": flags, "phases": {}, "total": total, "passes": 2, "pdf_size": 0, "outcome": outcome}
+
+def test_load_history_uses_only_full_successful_builds(tmp_path):
+    path = tmp_path / "buildlog.jsonl"
+    for r in [rec("01", 10.0), rec("01", 12.0), rec("01", 99.0, outcome="fail"),
+              rec("01", 1.0, page="3"), rec("01", 1.0, draft=True), rec("02", 5.0, variant="ho")]:
+        buildjournal.append(r, path)
+    hist = scheduler.load_history(path)
+    assert dict(hist) == {("2021901", "01", "pr"): [10.0, 12.0], ("2021901", "02", "ho"): [5.0]}
+
+def test_estimate_sources(monkeypatch):
+    frames = {"01": 10, "02": 20, "03": 30}
+    monkeypatch.setattr(scheduler, "count_frames", lambda s, c: frames[c])
+    hist = {("2021901", "01", "pr"): [4.0, 6.0, 20.0], ("2021901", "02", "ho"): [8.0]}
+    jobs = [job("01"), job("02"), job("03")]
+    scheduler.estimate(jobs, hist)
+    assert (jobs[0]["cost"], jobs[0]["source"]) == (6.0, "記録")
+    assert (jobs[1]["cost"], jobs[1]["source"]) == (8.0, "記録(別バリアント)")
+    # 記録の無い授業はフレームあたりの秒数（(6-2)+(8-2) 秒 / 30 フレーム）から見積もる
+    assert jobs[2]["source"] == "30フレーム"
+    assert jobs[2]["cost"] == pytest.approx(scheduler.BASE_S + 10.0 / 30 * 30)
+    assert jobs[2]["mem"] == scheduler.BASE_MEM_MB + scheduler.MEM_PER_FRAME_MB * 30
+
+def test_order_is_longest_first_and_beats_naive_order():
+    jobs = [job(f"{k:02d}", cost=c) for k, c in enumerate([2, 3, 9, 1, 4, 8, 2, 7], 1)]
+    lpt = scheduler.order(jobs)
+    assert [j["cost"] for j in lpt] == sorted((j["cost"] for j in jobs), reverse=True)
+    assert scheduler.simulate([j["cost"] for j in lpt], 3) == 13
+    assert scheduler.simulate([j["cost"] for j in reversed(lpt)], 3) == 15
+    assert scheduler.simulate([5.0, 1.0], 0) == 6.0      # 並列数 0 でも 1 として扱う
+
+def test_dispatcher_respects_workers_and_memory_budget():
+    jobs = [job("01", mem=600), job("02", mem=500), job("03", mem=300), job("04", mem=200)]
+    d = scheduler.Dispatcher(jobs, workers=3, mem_budget_mb=1000)
+    first = d.take()
+    # 02 は予算を超えるので、後ろの小さいジョブで埋める
+    assert [j["course"] for j in first] == ["01", "03"]
+    d.done(first[0])
+    assert [j["course"] for j in d.take()] == ["02", "04"]
+    assert d.take() == []
+
+def test_dispatcher_always_runs_one_job():
+    d = scheduler.Dispatcher([job("01", mem=5000)], workers=2, mem_budget_mb=1000)
+    assert [j["course"] for j in d.take()] == ["01"]
@@ -0,0 +1,88 @@
+# test_texlog.py — latexmk 出力の解釈と main.tex → content.tex の行番号の読み替え
+from __future__ import annotations
+from pathlib import Path
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import build_slides
+import frameindex
+import texlog
+
+CONTENT = "\n".join([
+    "% 前置き",
+    "\\begin{frame}{一}",
+    "  a1",
+    "\\end{frame}",
+    "",
+    "\\begin{frame}{二}",
+    "  b1",
+    "  b2",
+    "\\end{frame}",
+    "\\begin{frame}{三}",
+    "  c1",
+    "\\end{frame}",
+    "\\end{document}",
+    "",
+])
+TEMPL = "\\documentclass{beamer}\n%@@pausemode@@\n%@@teachermode@@\n\\begin{document}\n"
+
+def main_tex(body: str) -> str:
+    course = {"templ": TEMPL, "tagdir": "t", "stitle": "s", "root": Path("."), "body": body}
+    return build_slides.render_main_tex(course, False, False, prerender=False)
+
+def check_all_lines(tex: str, to_content) -> int:
+    # 本文の空でない各行が content.tex の同じ内容の行に読み替わる（本文より前は None）。
+    # 読み替えた行数を返す
+    lines, src = tex.split("\n"), CONTENT.split("\n")
+    mapped = 0
+    for n, line in enumerate(lines, 1):
+        c = to_content(n)
+        if c is None or not line:
+            continue
+        assert src[c - 1] == line, (n, c)
+        mapped += 1
+    assert to_content(1) is None
+    return mapped
+
+def test_whole_content_maps_line_for_line():
+    body = CONTENT.rstrip()
+    tex = main_tex(body)
+    nonblank = sum(1 for line in body.split("\n") if line)
+    assert check_all_lines(tex, texlog.line_mapper(tex, body, [(1, 1)])) == nonblank
+
+@pytest.mark.parametrize("fp, tp", [(1, 1), (2, 3), (1, 3)])
+def test_page_range_maps_through_segments(fp, tp):
+    data = CONTENT.encode("utf-8")
+    idx = frameindex.build_index(data)
+    body = frameindex.extract(data, idx, fp, tp).rstrip()
+    tex = main_tex(body)
+    to_content = texlog.line_mapper(tex, body, frameindex.line_segments(data, idx, fp, tp))
+    assert check_all_lines(tex, to_content) == sum(1 for line in body.split("\n") if line)
+
+def test_no_segments_maps_nothing():
+    assert texlog.line_mapper("x\n", "", [(1, 1)])(1) is None
+
+def test_monitor_collects_errors_passes_and_pages():
+    mon = texlog.LatexmkMonitor()
+    events = [mon.feed(line) for line in [
+        "Latexmk: Run number 1 of rule 'lualatex'",
+        "[1] [2{/usr/share/texmf/pdftex.map}] [3",
+        "./main.tex:12: Undefined control sequence.",
+        "<recently read> \\foo",
+        "l.12 \\foo",
+        "! Emergency stop.",
+    ]]
+    mon.finish()
+    assert events[:2] == ["pass", "page"] and events[4] == "error"
+    assert mon.passes == 1 and mon.page == 3 and mon.failed
+    assert mon.diagnostics[0] == texlog.Diagnostic("./main.tex", 12, "Undefined control sequence.", "l.12 \\foo")
+    assert mon.diagnostics[1].message == "Emergency stop."
+
+def test_format_diagnostic_uses_content_line():
+    d = texlog.Diagnostic("./main.tex", 12, "Undefined control sequence.", "l.12 \\foo")
+    out = texlog.format_diagnostic(d, lambda n: n - 5)
+    assert out == "content.tex:7 (main.tex:12): Undefined control sequence.\n    l.12 \\foo"
+    assert texlog.format_diagnostic(d._replace(file="x.sty"), lambda n: 1).startswith("x.sty:12:")
+    assert texlog.format_diagnostic(texlog.Diagnostic("", 0, "m", "")) == "(位置不明): m"
@@ -0,0 +1,97 @@
+# test_variants.py — build_slides --variants の組み合わせ（擬似 latexmk の砂場で実行）
+from __future__ import annotations
+from pathlib import Path
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+import bench_slides
+
+# build_variants が ho の作り方を決めたときに出すメッセージ
+DERIVE_MARKS = ("ハンドアウト: pr から切り出します", "ハンドアウト: 別にコンパイルします")
+
+# 擬似 qpdf: --json は「ページ.フレーム.オーバーレイ」のラベルを 4 ページ分返し、
+# それ以外（--pages での切り出し・--remove-page-labels）は入力をそのまま出力に写す
+STUB_QPDF = """#!/usr/bin/env python3
+import json, shutil, sys
+args = sys.argv[1:]
+if "--json" in args:
+    labels = ["1.0.1", "2.1.1", "3.1.2", "4.2.1"]
+    print(json.dumps({"pages": [{} for _ in labels],
+                      "pagelabels": [{"index": i, "label": {"/P": "u:" + lab}} for i, lab in enumerate(labels)]}))
+elif "--pages" in args:
+    shutil.copyfile(args[args.index("--pages") + 1], args[-1])
+else:
+    files = [a for a in args if not a.startswith("-")]
+    shutil.copyfile(files[0], files[-1])
+"""
+
+@pytest.fixture(scope="module")
+def sandbox(tmp_path_factory):
+    base = tmp_path_factory.mktemp("variants")
+    sb = bench_slides.make_sandbox(base, subjects=1, courses=1, e2e_courses=1, frames=6, images=2)
+    sb["app_dir"] = base / f"{sb['subject']}.ベンチ科目0" / sb["courses"][0]
+    qpdf_bin = base / "qpdf-bin"
+    qpdf_bin.mkdir()
+    (qpdf_bin / "qpdf").write_text(STUB_QPDF, encoding="utf-8")
+    (qpdf_bin / "qpdf").chmod(0o755)
+    sb["qpdf_bin"] = qpdf_bin
+    return sb
+
+def run_variants(sb: dict, variants: str, qpdf: bool = False) -> subprocess.CompletedProcess:
+    path = [str(sb["bin"])] + ([str(sb["qpdf_bin"])] if qpdf else []) + [os.environ.get("PATH", "")]
+    env = {**os.environ, "PATH": os.pathsep.join(path), "BENCH_LATEX_LATENCY": "0"}
+    return subprocess.run([sys.executable, str(sb["root"] / "build_slides.py"), sb["subject"],
+                           sb["courses"][0], "--no-daemon", "--no-fmt", "--no-cache",
+                           "--variants", variants],
+                          cwd=sb["root"], env=env, capture_output=True, text=True, timeout=300)
+
+def outputs(sb: dict) -> set[str]:
+    return {p.name for p in sb["app_dir"].glob("*.pdf")}
+
+def clear_outputs(sb: dict) -> None:
+    for p in sb["app_dir"].glob("*.pdf"):
+        p.unlink()
+    for d in sb["root"].glob("build-*"):
+        shutil.rmtree(d)
+
+@pytest.mark.parametrize("variants, stems", [
+    ("tech", {"01_合成1_tech.pdf"}),
+    ("pr,tech", {"01_合成1_pr.pdf", "01_合成1_tech.pdf"}),
+    ("pr", {"01_合成1_pr.pdf"}),
+])
+def test_variants_without_ho_do_not_derive(sandbox, variants, stems):
+    clear_outputs(sandbox)
+    res = run_variants(sandbox, variants, qpdf=True)
+    assert res.returncode == 0, res.stdout[-2000:] + res.stderr[-2000:]
+    assert outputs(sandbox) == stems
+    log = res.stdout + res.stderr
+    assert not any(m in log for m in DERIVE_MARKS), log[-2000:]
+    # 切り出さないビルドにはページラベルを入れない
+    main_tex = (sandbox["app_dir"] / "main.tex").read_text(encoding="utf-8")
+    assert "beamer@slideinframe" not in main_tex
+
+def test_pr_ho_without_qpdf_compiles_ho(sandbox):
+    # qpdf が無ければ切り出さずに ho もコンパイルし、pr にページラベルは入れない
+    clear_outputs(sandbox)
+    res = run_variants(sandbox, "pr,ho")
+    assert res.returncode == 0, res.stdout[-2000:] + res.stderr[-2000:]
+    assert "ハンドアウト: 別にコンパイルします（qpdf が見つかりません）" in res.stdout
+    assert outputs(sandbox) == {"01_合成1_pr.pdf", "01_合成1.pdf"}
+    assert "beamer@slideinframe" not in (sandbox["app_dir"] / "main.tex").read_text(encoding="utf-8")
+
+def test_ho_first_publishes_main_tex_of_compiled_pr(sandbox):
+    # ho を先に書いても、切り出したときは ho の main.tex は無いので pr のものを配置する
+    clear_outputs(sandbox)
+    res = run_variants(sandbox, "ho,pr", qpdf=True)
+    assert res.returncode == 0, res.stdout[-2000:] + res.stderr[-2000:]
+    assert "ハンドアウト: pr から切り出します" in res.stdout
+    assert outputs(sandbox) == {"01_合成1_pr.pdf", "01_合成1.pdf"}
+    ho_dirs = list(sandbox["root"].glob("build-*-ho"))
+    assert not any((d / "main.tex").exists() for d in ho_dirs)
+    main_tex = (sandbox["app_dir"] / "main.tex").read_text(encoding="utf-8")
+    assert r"\mypausemodetrue" in main_tex and "beamer@slideinframe" in main_tex
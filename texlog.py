@@ -0,0 +1,119 @@
+# texlog.py — latexmk / LuaLaTeX の出力を1行ずつ解釈する
+#
+# -file-line-error 形式（./main.tex:120: Undefined control sequence.）と "! ..." 形式の
+# エラーを構造化し、パス番号・出力中のページ番号を追う。main.tex の行番号は
+# content.tex の行番号に読み替えて表示できる。
+from __future__ import annotations
+from bisect import bisect_right
+from typing import NamedTuple
+import re
+
+_FILE_LINE = re.compile(r"^(.*?\.(?:tex|sty|cls|ltx|def|cfg|fd)):(\d+): (.*)$")
+_BANG = re.compile(r"^! (.*)$")
+_CONTEXT = re.compile(r"^l\.(\d+) ?(.*)$")
+_RUN = re.compile(r"Run number (\d+) of rule '(?:lua|pdf|xe)?latex")
+_PAGE = re.compile(r"\[(\d+)(?=[\]{<\s]|$)")
+CONTEXT_LINES = 8       # エラーの後に拾う行数（l.NNN が来ればそこで打ち切り）
+
+class Diagnostic(NamedTuple):
+    file: str
+    line: int           # 0 は行番号なし
+    message: str
+    context: str        # l.NNN の行（あれば）
+
+class LatexmkMonitor:
+    """latexmk の出力を1行ずつ渡すと、進捗とエラーを集める。"""
+
+    def __init__(self):
+        self.passes = 0
+        self.page = 0
+        self.diagnostics: list[Diagnostic] = []
+        self.tail: list[str] = []           # エラーが拾えなかったとき用の末尾
+        self._pending: Diagnostic | None = None
+        self._after = 0
+
+    def feed(self, line: str) -> str | None:
+        """行を解釈し、"pass" / "page" / "error" のいずれか（何もなければ None）を返す。"""
+        self.tail.append(line)
+        if len(self.tail) > 60:
+            del self.tail[:20]
+
+        if self._pending:
+            m = _CONTEXT.match(line)
+            self._after += 1
+            if m or self._after >= CONTEXT_LINES:
+                d = self._pending
+                if m:
+                    d = d._replace(context=line.strip(), line=d.line or int(m.group(1)))
+                self.diagnostics.append(d)
+                self._pending = None
+                return "error"
+            return None
+
+        m = _RUN.search(line)
+        if m:
+            self.passes += 1
+            self.page = 0
+            return "pass"
+        m = _FILE_LINE.match(line)
+        if m:
+            self._pending = Diagnostic(m.group(1), int(m.group(2)), m.group(3).strip(), "")
+            self._after = 0
+            return None
+        m = _BANG.match(line)
+        if m:
+            self._pending = Diagnostic("", 0, m.group(1).strip(), "")
+            self._after = 0
+            return None
+        pages = _PAGE.findall(line)
+        if pages:
+            self.page = max(self.page, int(pages[-1]))
+            return "page"
+        return None
+
+    def finish(self) -> None:
+        # 文脈行を待っている途中で出力が終わった場合
+        if self._pending:
+            self.diagnostics.append(self._pending)
+            self._pending = None
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.diagnostics)
+
+def line_mapper(tex_text: str, body: str, segments: list[tuple[int, int]]):
+    """main.tex の行番号 → content.tex の行番号 の関数を返す。
+
+    本文は main.tex の末尾（必要なら \\end{document} が1行続く）にあるので、行数から
+    開始行を求める（highlight の置き換えは行数を保つので本文が書き換わっていてもよい）。
+    segments は [(本文中の開始行, content.tex の開始行), ...]（どちらも 1 始まり）。
+    本文より前（テンプレートのヘッダ部分）の行は None。
+    """
+    if not body or not segments:
+        return lambda n: None
+    total = tex_text.count("\n")
+    trailer = 0 if body.endswith(r"\end{document}") else 1
+    body_end = total - trailer
+    body_start = body_end - body.count("\n")
+    starts = [s for s, _ in segments]
+
+    def to_content(n: int) -> int | None:
+        if not body_start <= n <= body_end:
+            return None
+        b = n - body_start + 1
+        k = bisect_right(starts, b) - 1
+        if k < 0:
+            return None
+        return segments[k][1] + (b - segments[k][0])
+    return to_content
+
+def format_diagnostic(d: Diagnostic, to_content=None, content_name: str = "content.tex") -> str:
+    where = f"{d.file}:{d.line}" if d.file else "(位置不明)"
+    if to_content and d.file.endswith("main.tex") and d.line:
+        n = to_content(d.line)
+        if n:
+            where = f"{content_name}:{n} (main.tex:{d.line})"
+    out = f"{where}: {d.message}"
+    if d.context:
+        out += f"\n    {d.context}"
+    return out
@@ -0,0 +1,275 @@
+# thumbnails.py — 配置済み PDF のフレームごとのサムネイルと、科目ごとの静的 HTML 索引
+#
+#   python thumbnails.py 2021901 [...] [--all] [-j N] [--width 240]
+#   python batch_build.py 2021901 --index      # ビルドのあとに同じ処理をする
+#
+# 各授業の配置済み PDF（ハンドアウト、無ければ _pr）から、フレームごとに1ページ（pr はページラベルで
+# 各フレームの最後のオーバーレイ）を pdftoppm で縮小画像にする。画像は (PDF の sha256, ページ) ごとに
+# .cache/thumbs/ に置き、変わっていない PDF のページは描き直さない。PDF の sha256 は
+# .published.json の記録を使い、ページラベルから選んだページも sha256 ごとに覚えておくので、
+# 変わっていない授業は PDF を読みもしない。描画はページ範囲ごとにスレッドプールで並列に行う。
+# 科目ディレクトリに index.html と thumbs/（キャッシュからのハードリンク）を書く。
+# ページラベル・ページ数は qpdf（無ければ pdfinfo）で読む。ページラベルの無いハンドアウトは
+# 1ページ1フレームとみなし、ページラベルの無い _pr や読めない PDF はその授業のサムネイルを省く。
+# 授業は slideinfo.json の順に並べ、フレームのタイトルは frameindex（フレームスキャン）から取る。
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from urllib.parse import quote
+import argparse
+import html
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+import buildcache
+import frameindex
+import handout
+import overlays
+import pdftools
+import publish
+import slideinfo
+
+ROOT = Path(__file__).parent
+DEFAULT_WIDTH = 240
+CHUNK = 16          # pdftoppm 1回で描くページ数の上限
+THUMBS_DIR = "thumbs"
+INDEX_NAME = "index.html"
+
+def cache_dir(root: Path = ROOT) -> Path:
+    return root / ".cache" / "thumbs"
+
+def thumb_name(sha: str, page: int, width: int) -> str:
+    return f"{sha[:32]}-p{page}-w{width}.png"
+
+def pdf_sha(pdf: Path) -> str:
+    return publish.Publisher(pdf.parent).known_sha(pdf.name) or buildcache.sha256_file(pdf)
+
+def page_count(pdf: Path) -> int | None:
+    """ページ数。qpdf、無ければ pdfinfo で読む（どちらも無いか読めなければ None）。"""
+    qpdf, pdfinfo = shutil.which("qpdf"), shutil.which("pdfinfo")
+    if qpdf:
+        cmd = [qpdf, "--show-npages", str(pdf)]
+    elif pdfinfo:
+        cmd = [pdfinfo, str(pdf)]
+    else:
+        return None
+    try:
+        res = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+    except subprocess.TimeoutExpired:
+        return None
+    # qpdf は数だけ、pdfinfo は「Pages:  N」の行。qpdf は警告のみのとき 3 を返す
+    m = re.search(r"^(?:Pages:\s*)?(\d+)\s*$", res.stdout, re.MULTILINE)
+    return int(m.group(1)) if m and res.returncode in (0, 3) else None
+
+def frame_pages(pdf: Path, sha: str, ho: bool) -> list[tuple[int, int]] | None:
+    """(ページ, フレーム番号) のリスト。フレーム番号 0 はタイトル。
+
+    ページラベルから選んだものだけ sha ごとに覚えておく。ページラベルが無ければ、ハンドアウト（ho）
+    は1ページ1フレームとみなし、pr やページ数も読めない（qpdf・pdfinfo が無いなど）ときは None。
+    """
+    memo = cache_dir() / f"{sha[:32]}.frames.json"   # 以前の版は代替の割り当ても覚えていたので名前を変えた
+    try:
+        return [tuple(x) for x in json.loads(memo.read_text(encoding="utf-8"))]
+    except (FileNotFoundError, ValueError):
+        pass
+    labels = overlays.page_labels(pdf)
+    keep = overlays.last_overlays(labels) if labels else None
+    if not keep:
+        # ページラベルの無い古いハンドアウトは1ページ1フレーム（先頭はタイトル）とみなす。
+        # qpdf が後から入ればラベルを読めるかもしれないので覚えておかない
+        n = page_count(pdf) if ho else None
+        return None if n is None else [(p, p - 1) for p in range(1, n + 1)]
+    pages = [(p, overlays.frame_overlay(labels[p - 1])[0]) for p in keep]
+    memo.parent.mkdir(parents=True, exist_ok=True)
+    tmp = memo.with_name(f".{memo.name}.tmp{os.getpid()}")
+    tmp.write_text(json.dumps(pages), encoding="utf-8")
+    os.replace(tmp, memo)
+    return pages
+
+def _chunks(pages: list[int]) -> list[tuple[int, int]]:
+    """連続したページを CHUNK 枚までの (最初, 最後) にまとめる。"""
+    out = []
+    for p in sorted(pages):
+        if out and p == out[-1][1] + 1 and p - out[-1][0] < CHUNK:
+            out[-1] = (out[-1][0], p)
+        else:
+            out.append((p, p))
+    return out
+
+def render(pdf: Path, sha: str, first: int, last: int, width: int) -> int:
+    """first～last ページを描いてキャッシュに置き、枚数を返す。"""
+    exe = pdftools.require("pdftoppm")
+    d = cache_dir()
+    work = Path(tempfile.mkdtemp(prefix="work-", dir=d))
+    try:
+        pdftools.run_tool([exe, "-png", "-f", str(first), "-l", str(last),
+                           "-scale-to-x", str(width), "-scale-to-y", "-1", str(pdf), str(work / "p")])
+        n = 0
+        for f in work.glob("p-*.png"):
+            page = int(f.stem.rsplit("-", 1)[1])
+            os.replace(f, d / thumb_name(sha, page, width))
+            n += 1
+        return n
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+_MACRO = re.compile(r"\\[A-Za-z]+\*?|\\.")
+
+def plain_title(title: str) -> str:
+    """フレームタイトルから TeX のコマンドと波括弧を除く。"""
+    return " ".join(_MACRO.sub(" ", title).replace("{", "").replace("}", "").replace("~", " ").split())
+
+def collect(subject: str, width: int) -> dict:
+    """科目の授業ごとの元 PDF・ページ・タイトル。"""
+    subj_dir = ROOT.parent / slideinfo.slide_getdir(subject)
+    courses = []
+    for c in slideinfo.slide_courses(subject):
+        ent = {"course": c, "title": slideinfo.slidetitle(subject, c), "pdf": None, "pages": []}
+        courses.append(ent)
+        src = handout.source_pdf(subject, c, "auto")
+        if src is None:
+            continue
+        sha = pdf_sha(src)
+        ho = not src.stem.endswith("_pr")
+        pages = frame_pages(src, sha, ho)
+        ent["pdf"] = src
+        ent["sha"] = sha
+        if pages is None:
+            need = "qpdf か pdfinfo" if ho else "ページラベルと qpdf"
+            print(f"⚠ フレームのページを決められないためサムネイルを作りません（{need}が必要です）: {src.name}",
+                  file=sys.stderr)
+            continue
+        content = src.parent / "content.tex"
+        titles = {}
+        if content.exists():
+            titles = {f["n"]: f["title"] for f in frameindex.load_index(content)["frames"]}
+        ent["pages"] = [{"page": p, "frame": n,
+                         "title": "タイトル" if n == 0 else plain_title(titles.get(n, "")),
+                         "thumb": thumb_name(sha, p, width)}
+                        for p, n in pages]
+    return {"subject": subject, "dir": subj_dir, "courses": courses}
+
+def render_missing(catalogs: list[dict], width: int, jobs: int) -> None:
+    """キャッシュに無いサムネイルだけをスレッドプールで描く。"""
+    d = cache_dir()
+    todo, seen = [], set()
+    for cat in catalogs:
+        for c in cat["courses"]:
+            if not c["pages"] or c["sha"] in seen:
+                continue    # 同じ PDF（別科目から参照など）は1回だけ描く
+            seen.add(c["sha"])
+            missing = [x["page"] for x in c["pages"] if not (d / x["thumb"]).exists()]
+            todo += [(c["pdf"], c["sha"], a, b) for a, b in _chunks(missing)]
+    if not todo:
+        print("♻ サムネイルはすべてキャッシュ済みです")
+        return
+    # pdftoppm はサブプロセスなのでスレッドで十分並列になる
+    done = 0
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as ex:
+        futs = {ex.submit(render, pdf, sha, a, b, width): (pdf, a, b) for pdf, sha, a, b in todo}
+        for fut in as_completed(futs):
+            pdf, a, b = futs[fut]
+            try:
+                done += fut.result()
+            except SystemExit:
+                print(f"⚠ サムネイルを作れません: {pdf.name} p.{a}-{b}", file=sys.stderr)
+    print(f"🖼 サムネイルを {done} 枚作りました")
+
+def _link(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def page_html(cat: dict) -> str:
+    title = html.escape(cat["dir"].name)
+    out = ["<!DOCTYPE html>", '<html lang="ja">', "<head>", '<meta charset="utf-8">',
+           f"<title>{title}</title>",
+           "<style>",
+           "body{font-family:sans-serif;margin:1.5em}",
+           "h2{border-bottom:1px solid #ccc;padding-bottom:.2em}",
+           ".grid{display:flex;flex-wrap:wrap;gap:12px}",
+           ".grid a{width:%dpx;text-decoration:none;color:#333;font-size:12px}" % cat["width"],
+           ".grid img{width:100%;border:1px solid #ccc}",
+           ".none{color:#999}",
+           "</style>", "</head>", "<body>", f"<h1>{title}</h1>"]
+    for c in cat["courses"]:
+        out.append(f'<h2 id="c{html.escape(c["course"])}">{html.escape(c["course"])} '
+                   f'{html.escape(c["title"])}</h2>')
+        if c["pdf"] is None:
+            out.append('<p class="none">未ビルド</p>')
+            continue
+        href = quote(f"{c['course']}/{c['pdf'].name}")
+        if not c["pages"]:
+            out.append(f'<p class="none"><a href="{href}">{html.escape(c["pdf"].name)}</a>'
+                       "（サムネイルなし）</p>")
+            continue
+        out.append('<div class="grid">')
+        for x in c["pages"]:
+            label = f"{x['frame']}. {x['title']}" if x["frame"] else x["title"]
+            out.append(f'<a href="{href}#page={x["page"]}" title="{html.escape(label)}">'
+                       f'<img src="{THUMBS_DIR}/{x["thumb"]}" loading="lazy" alt="">'
+                       f"<div>{html.escape(label)}</div></a>")
+        out.append("</div>")
+    out += ["</body>", "</html>"]
+    return "\n".join(out) + "\n"
+
+def write_index(cat: dict) -> Path:
+    """科目ディレクトリの thumbs/ を揃えて index.html を書く（変わらなければ書かない）。"""
+    d = cache_dir()
+    tdir = cat["dir"] / THUMBS_DIR
+    tdir.mkdir(exist_ok=True)
+    want = {x["thumb"] for c in cat["courses"] for x in c["pages"] if (d / x["thumb"]).exists()}
+    for f in tdir.iterdir():
+        if f.name not in want:
+            f.unlink()
+    for name in want - {f.name for f in tdir.iterdir()}:
+        _link(d / name, tdir / name)
+
+    path = cat["dir"] / INDEX_NAME
+    text = page_html(cat)
+    try:
+        if path.read_text(encoding="utf-8") == text:
+            return path
+    except FileNotFoundError:
+        pass
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+    return path
+
+def refresh(subjects: list[str], jobs: int = os.cpu_count() or 1, width: int = DEFAULT_WIDTH) -> list[Path]:
+    """subjects のサムネイルを更新して各科目の index.html のパスを返す。"""
+    cache_dir().mkdir(parents=True, exist_ok=True)
+    catalogs = [{**collect(s, width), "width": width} for s in subjects]
+    render_missing(catalogs, width, jobs)
+    paths = []
+    for cat in catalogs:
+        paths.append(write_index(cat))
+        print(f"✅ 索引: {paths[-1]}")
+    return paths
+
+def main():
+    ap = argparse.ArgumentParser(description="配置済みスライドのサムネイルと科目ごとの索引 HTML")
+    ap.add_argument("subjects", nargs="*", help="科目コード（複数可）")
+    ap.add_argument("--all", action="store_true", help="slideinfo.json の全科目")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count() or 1, help="並列数")
+    ap.add_argument("--width", type=int, default=DEFAULT_WIDTH, help="サムネイルの幅（px）")
+    args = ap.parse_args()
+
+    subjects = slideinfo.slide_subjects() if args.all else args.subjects
+    if not subjects:
+        ap.error("科目コードか --all を指定してください")
+    unknown = [s for s in subjects if s not in slideinfo.slide_subjects()]
+    if unknown:
+        print(f"❌ slideinfo.json に存在しない科目: {', '.join(unknown)}", file=sys.stderr)
+        sys.exit(1)
+    refresh(subjects, args.jobs, args.width)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# watch.py — content.tex・images/・templates/ を監視して保存のたびに再ビルドする（--watch）
+#
+# 変更検知は inotify（ctypes 経由、Linux）、使えなければ stat のポーリング。
+# 連続した保存はまとめ（デバウンス）、content.tex の変更は編集箇所を含むフレームだけを
+# --page 指定で子プロセスにビルドさせる。ビルド中に次の変更が来たら子プロセスの
+# プロセスグループごと止めて新しいビルドに置き換える。
+#   Enter / f … 全体を再ビルド    q … 終了
+from __future__ import annotations
+from pathlib import Path
+import ctypes
+import ctypes.util
+import os
+import queue
+import re
+import select
+import signal
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import framescan
+import slideinfo
+
+DEBOUNCE_S = 0.3
+POLL_S = 0.5
+FULL = "full"       # 全体ビルドの指定
+
+# ----------------- 変更検知 -----------------
+IN_MODIFY, IN_ATTRIB, IN_CLOSE_WRITE = 0x2, 0x4, 0x8
+IN_MOVED_FROM, IN_MOVED_TO, IN_CREATE, IN_DELETE = 0x40, 0x80, 0x100, 0x200
+_EVENT = struct.Struct("iIII")
+
+class InotifyWatcher:
+    """ディレクトリ単位で inotify を張る（エディタの置き換え保存も拾えるように）。"""
+
+    MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_ATTRIB | IN_MODIFY
+
+    def __init__(self, dirs: dict[Path, object]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.wds: dict[int, tuple[Path, object]] = {}
+        for d, accept in dirs.items():
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(d), self.MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"inotify_add_watch {d}")
+            self.wds[wd] = (d, accept)
+
+    def wait(self, timeout: float) -> set[Path]:
+        r, _, _ = select.select([self.fd], [], [], timeout)
+        if not r:
+            return set()
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        changed = set()
+        i = 0
+        while i + _EVENT.size <= len(buf):
+            wd, mask, _cookie, n = _EVENT.unpack_from(buf, i)
+            name = buf[i + _EVENT.size:i + _EVENT.size + n].rstrip(b"\0")
+            i += _EVENT.size + n
+            if wd in self.wds and name:
+                d, accept = self.wds[wd]
+                p = d / os.fsdecode(name)
+                if accept(p):
+                    changed.add(p)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+class PollWatcher:
+    """inotify が使えない環境向け。POLL_S ごとに stat を取り直して比べる。"""
+
+    def __init__(self, dirs: dict[Path, object]):
+        self.dirs = dirs
+        self.snap = self._snapshot()
+
+    def _snapshot(self) -> dict[Path, tuple[int, int]]:
+        snap = {}
+        for d, accept in self.dirs.items():
+            try:
+                with os.scandir(d) as it:
+                    for e in it:
+                        p = Path(e.path)
+                        if e.is_file() and accept(p):
+                            st = e.stat()
+                            snap[p] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                pass
+        return snap
+
+    def wait(self, timeout: float) -> set[Path]:
+        time.sleep(min(timeout, POLL_S))
+        new = self._snapshot()
+        changed = {p for p in new.keys() | self.snap.keys() if new.get(p) != self.snap.get(p)}
+        self.snap = new
+        return changed
+
+    def close(self) -> None:
+        pass
+
+def make_watcher(dirs: dict[Path, object]):
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(dirs)
+        except OSError as e:
+            print(f"⚠ inotify が使えません（{e}）。ポーリングで監視します。")
+    return PollWatcher(dirs)
+
+# ----------------- 再ビルド範囲 -----------------
+def edited_range(old: str, new: str) -> tuple[int, int] | None:
+    """old → new で変わった箇所を含むフレーム番号の範囲。変化がなければ None。"""
+    if old == new:
+        return None
+    n = min(len(old), len(new))
+    a = 0
+    while a < n and old[a] == new[a]:
+        a += 1
+    s = 0
+    while s < n - a and old[-1 - s] == new[-1 - s]:
+        s += 1
+    b = max(a + 1, len(new) - s)   # new 側の変更区間 [a, b)
+
+    pos = framescan.frame_positions(new)
+    if not pos:
+        return None
+    hit = [k for k, (st, en) in enumerate(pos, 1) if st < b and en > a]
+    if not hit:
+        # フレームの外（\section など）を編集した → 直後のフレーム
+        nxt = [k for k, (st, _) in enumerate(pos, 1) if st >= a]
+        k = nxt[0] if nxt else len(pos)
+        return k, k
+    return hit[0], hit[-1]
+
+_GRAPHICS = re.compile(r"\\includegraphics\s*(?:\[[^\]]*\])?\s*\{([^}]*)\}")
+
+def frames_using(tex: str, names: set[str]) -> tuple[int, int] | None:
+    """\\includegraphics でその画像（拡張子省略も含む）を参照しているフレームの範囲。"""
+    stems = {Path(n).stem for n in names}
+    hit = []
+    for k, (st, en) in enumerate(framescan.frame_positions(tex), 1):
+        for m in _GRAPHICS.finditer(tex, st, en):
+            ref = Path(m.group(1).strip())
+            if ref.name in names or ref.stem in stems:
+                hit.append(k)
+                break
+    return (hit[0], hit[-1]) if hit else None
+
+def merge_range(a: tuple[int, int] | None, b: tuple[int, int] | None) -> tuple[int, int] | None:
+    if a is None or b is None:
+        return a or b
+    return min(a[0], b[0]), max(a[1], b[1])
+
+# ----------------- ビルドの起動・中断 -----------------
+def start_build(base_cmd: list[str], page: str) -> subprocess.Popen:
+    cmd = base_cmd + (["--page", page] if page else [])
+    print(f"\n▶ ビルド開始: {'frame ' + page if page else '全体'}")
+    # 子の latexmk ごと止められるよう新しいセッション（プロセスグループ）で起動する
+    return subprocess.Popen(cmd, start_new_session=(os.name == "posix"))
+
+def cancel_build(proc: subprocess.Popen) -> None:
+    if proc.poll() is not None:
+        return
+    print("⏹ 実行中のビルドを中断します")
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGTERM)
+        else:
+            proc.terminate()
+        proc.wait(timeout=5)
+    except subprocess.TimeoutExpired:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+        proc.wait()
+    except ProcessLookupError:
+        pass
+
+def _read_commands(q: queue.Queue) -> None:
+    # 標準入力が閉じても（バックグラウンド実行など）監視は続ける。終了は q か Ctrl-C
+    for line in sys.stdin:
+        q.put(line.strip().lower())
+
+def watch(subj_code: str, tdir_name: str, page: str = "", extra_args: list[str] | None = None) -> None:
+    tagdir = slideinfo.slidedir(subj_code, tdir_name)
+    if not tagdir:
+        print("❌ 対象ディレクトリが解決できません", file=sys.stderr)
+        sys.exit(1)
+    root = Path(__file__).parent
+    app_dir = root.parent / tagdir
+    content_path = app_dir / "content.tex"
+    if not content_path.exists():
+        print(f"❌ content.tex が見つかりません: {content_path}", file=sys.stderr)
+        sys.exit(1)
+
+    # app_dir にはビルド結果（PDF・main.tex・索引）も書かれるので content.tex だけを見る
+    dirs = {app_dir: lambda p: p.name == "content.tex",
+            root / "templates": lambda p: not p.name.startswith(".")}
+    images = app_dir / "images"
+    if images.is_dir():
+        dirs[images] = lambda p: not p.name.startswith(".")
+    watcher = make_watcher(dirs)
+    print(f"👀 監視中（{type(watcher).__name__}）: " + ", ".join(str(d) for d in dirs))
+    print("   Enter / f: 全体を再ビルド  q: 終了")
+
+    base_cmd = [sys.executable, str(root / "build_slides.py"), subj_code, tdir_name, *(extra_args or [])]
+    cmds: queue.Queue = queue.Queue()
+    threading.Thread(target=_read_commands, args=(cmds,), daemon=True).start()
+
+    text = content_path.read_text(encoding="utf-8")
+    proc = start_build(base_cmd, page)
+    running = FULL if not page else None    # 実行中のビルドの範囲（--page の初回は合成しない）
+    reported = False
+    try:
+        while True:
+            changed = watcher.wait(POLL_S)
+            if changed:
+                # デバウンス: 静かになるまで変更を集める
+                while more := watcher.wait(DEBOUNCE_S):
+                    changed |= more
+
+            if proc and proc.poll() is not None and not reported:
+                print("✅ 再ビルド完了" if proc.returncode == 0 else "❌ 再ビルド失敗（保存し直すと再実行します）")
+                reported = True
+
+            want = None             # None: 何もしない / FULL: 全体 / (a, b): フレーム範囲
+            try:
+                c = cmds.get_nowait()
+                if c == "q":
+                    break
+                if c in ("", "f"):
+                    want = FULL
+            except queue.Empty:
+                pass
+
+            if want is None and changed:
+                names = sorted(p.name for p in changed)
+                print(f"\n✏ 変更: {', '.join(names)}")
+                if any(p.parent == root / "templates" for p in changed):
+                    want = FULL
+                else:
+                    try:
+                        new = content_path.read_text(encoding="utf-8")
+                    except (FileNotFoundError, UnicodeDecodeError):
+                        continue    # 保存途中。次のイベントで読み直す
+                    rng = edited_range(text, new) if content_path in changed else None
+                    img = {p.name for p in changed if p.parent == images}
+                    if img:
+                        rng = merge_range(rng, frames_using(new, img))
+                    text = new
+                    if rng is None:
+                        print("   ビルド対象のフレームはありません")
+                        continue
+                    want = rng
+
+            if want is not None:
+                if proc and proc.poll() is None:
+                    cancel_build(proc)
+                    # 中断したビルドの範囲も作り直す（全体ビルドを中断したなら全体）
+                    want = FULL if FULL in (want, running) else merge_range(want, running)
+                running = want
+                proc = start_build(base_cmd, "" if want is FULL else f"{want[0]}-{want[1]}")
+                reported = False
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if proc:
+            cancel_build(proc)
+        watcher.close()